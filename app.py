@@ -1,13 +1,32 @@
 import dash
-from dash import Input, Output, State, html, dcc, ALL
+from dash import ClientsideFunction, Input, Output, Patch, State, html, dcc, ALL, ctx, no_update
+from dash.exceptions import PreventUpdate
 import dash_leaflet as dl
 import dash_bootstrap_components as dbc
 import random
+import math
 import plotly.graph_objs as go
-from collections import deque
-import cv2
-from flask import Response
+import numpy as np
+from flask import Response, jsonify, request
 import threading
+import time
+import os
+import shutil
+from frame_broadcaster import FrameBroadcaster, StreamSettings
+from frame_gate import FrameGate
+from hazard_detection import DNNDetector, FireColorDetector, HazardDetectionWorker
+from video_sources import open_video_source
+from vitals_store import VitalsStore
+from vitals_alerts import VitalsAnomalyEngine
+from serial_ingestion import SerialIngestor, parse_source_spec
+from marker_store import MarkerStore
+from location_feed import LocationFeed
+from event_broker import EventBroker, Publisher, format_event
+from chat_store import ChatStore
+from chat_responder import ChatResponderPool, EchoResponder
+from incident_history import IncidentHistory, IncidentReplay, parse_time_range
+from state_backend import LocalState, SharedState, SharedVitalsStore, StateServer, parse_address
+from metrics import MetricsRegistry, SamplingProfiler, instrument_callbacks
 
 # Colores de la paleta
 palette = {
@@ -18,37 +37,169 @@ palette = {
     "secondary": "#EDF25E",
 }
 
-# Inicializar las colas para los signos vitales
-heart_rate_queue = deque(maxlen=10)  # Nivel cardíaco
-oxygen_level_queue = deque(maxlen=10)  # Nivel de oxígeno
-temperature_queue = deque(maxlen=10)  # Temperatura corporal
-blood_pressure_queue = deque(maxlen=10)  # Presión arterial
+# Estado compartido entre procesos del servidor. Con ELEMENTEDGE_STATE=shared
+# (p. ej. con varios procesos de Gunicorn) el primer proceso que ocupa
+# ELEMENTEDGE_STATE_ADDRESS es el principal: corre la ingesta, la cámara y los
+# eventos, y atiende a los demás por un socket local; los signos vitales se
+# comparten en memoria compartida. Ver state_backend.py.
+STATE_MODE = os.environ.get("ELEMENTEDGE_STATE", "local")
+STATE_ADDRESS = parse_address(os.environ.get("ELEMENTEDGE_STATE_ADDRESS", "127.0.0.1:8765"))
+# El socket recibe objetos serializados con pickle: la clave es obligatoria
+# en modo compartido y no tiene valor por defecto
+STATE_KEY = os.environ.get("ELEMENTEDGE_STATE_KEY", "").encode("utf-8")
+if STATE_MODE == "shared" and not STATE_KEY:
+    raise RuntimeError("Set ELEMENTEDGE_STATE_KEY to a secret shared by the server processes")
+
+# Protocolo de los sensores serie y muestras por segundo de cada responder.
+# Los marcos binarios permiten 10-50 Hz (sensor_simulation.ino); la capacidad
+# del almacén sale de esta tasa para conservar siempre VITALS_RETENTION segundos.
+SERIAL_PROTOCOL = os.environ.get("ELEMENTEDGE_SERIAL_PROTOCOL", "text")
+VITALS_SAMPLE_RATE = float(
+    os.environ.get("ELEMENTEDGE_VITALS_SAMPLE_RATE", "20" if SERIAL_PROTOCOL == "binary" else "1")
+)
+VITALS_RETENTION = 2 * 3600
+
+# En modo compartido la memoria compartida se reserva para toda la flota
+# (ELEMENTEDGE_SHARED_RESPONDERS) y solo guarda los últimos minutos: la
+# dashboard lee ventanas cortas y el historial del incidente guarda el resto
+SHARED_RESPONDERS = int(os.environ.get("ELEMENTEDGE_SHARED_RESPONDERS", "256"))
+SHARED_VITALS_RETENTION = float(os.environ.get("ELEMENTEDGE_SHARED_VITALS_RETENTION", "240"))
+
+# Almacén de series de tiempo de signos vitales por responder
+if STATE_MODE == "shared":
+    shared_vitals_size = SharedVitalsStore.segment_size(
+        SHARED_VITALS_RETENTION, VITALS_SAMPLE_RATE, max_responders=SHARED_RESPONDERS
+    )
+    # Linux reserva la memoria compartida en /dev/shm, que en un contenedor suele tener 64 MiB
+    if os.path.isdir("/dev/shm") and shared_vitals_size > shutil.disk_usage("/dev/shm").total:
+        raise RuntimeError(
+            f"The shared vitals store needs {shared_vitals_size / 2**20:.0f} MiB but /dev/shm has "
+            f"{shutil.disk_usage('/dev/shm').total / 2**20:.0f} MiB; lower ELEMENTEDGE_SHARED_RESPONDERS "
+            f"or ELEMENTEDGE_SHARED_VITALS_RETENTION"
+        )
+    vitals_store = SharedVitalsStore(
+        os.environ.get("ELEMENTEDGE_STATE_NAME", "elementedge_vitals"),
+        retention_seconds=SHARED_VITALS_RETENTION,
+        sample_rate=VITALS_SAMPLE_RATE,
+        max_responders=SHARED_RESPONDERS,
+    )
+else:
+    vitals_store = VitalsStore(retention_seconds=VITALS_RETENTION, sample_rate=VITALS_SAMPLE_RATE)
+
+# Detección de anomalías en los signos vitales de todos los responders
+vitals_engine = VitalsAnomalyEngine()
+
+# Copia de las alertas activas del proceso principal, en los procesos secundarios
+remote_alerts = {}
+
+# Alertas activas de un responder: lista de (señal, tipo)
+def responder_alerts(responder_id):
+    if state.role == "worker":
+        return remote_alerts.get(responder_id, [])
+    return vitals_engine.active_alerts(responder_id)
+
+# Responders con datos simulados (uno por marcador del mapa) y el que se
+# muestra en el panel hasta que se selecciona otro
+SIMULATED_RESPONDERS = [f"responder_{i}" for i in range(10)]
+DEFAULT_RESPONDER = SIMULATED_RESPONDERS[0]
 
 # Función para generar valores simulados
 def generate_random_value(min_value, max_value):
     return random.uniform(min_value, max_value)
 
-# Inicializar los datos con valores aleatorios
-for _ in range(10):
-    heart_rate_queue.append(generate_random_value(60, 100))  # Pulsaciones por minuto
-    oxygen_level_queue.append(generate_random_value(90, 100))  # Porcentaje de oxígeno
-    temperature_queue.append(generate_random_value(36, 37.5))  # Temperatura en °C
-    blood_pressure_queue.append(generate_random_value(110, 130))  # Presión sistólica
+# Genera una lectura simulada de todos los signos vitales
+def generate_vital_readings():
+    return {
+        "heart_rate": generate_random_value(60, 100),  # Pulsaciones por minuto
+        "oxygen_level": generate_random_value(90, 100),  # Porcentaje de oxígeno
+        "temperature": generate_random_value(36, 37.5),  # Temperatura en °C
+        "blood_pressure": generate_random_value(110, 130),  # Presión sistólica
+    }
 
+# Simula una lectura por segundo de cada responder en segundo plano, independiente
+# de cuántos clientes haya. Antes completa los últimos 10 segundos de los
+# responders que aún no tienen datos.
+def simulate_vital_signs(interval=1.0):
+    start_time = time.time() - 10
+    missing = [responder_id for responder_id in SIMULATED_RESPONDERS if responder_id not in vitals_store]
+    vitals_store.append_batch(
+        (responder_id, start_time + i, generate_vital_readings()) for i in range(10) for responder_id in missing
+    )
+    while True:
+        time.sleep(interval)
+        now = time.time()
+        vitals_store.append_batch(
+            (responder_id, now, generate_vital_readings()) for responder_id in SIMULATED_RESPONDERS
+        )
 
-# Crear la aplicación Dash
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+# Con ELEMENTEDGE_SERIAL_PORTS="responder_1=/dev/ttyACM0,..." se leen los sensores
+# reales (sensor_simulation.ino); sin la variable se usan datos simulados.
+# ELEMENTEDGE_SERIAL_PROTOCOL=binary activa el formato binario compacto.
+serial_sources = parse_source_spec(os.environ.get("ELEMENTEDGE_SERIAL_PORTS", ""), protocol=SERIAL_PROTOCOL)
+# Con ELEMENTEDGE_REPLAY="inicio[,fin]" el tablero reproduce un incidente
+# guardado en lugar de leer sensores o simular (ver la sección del historial)
+REPLAY_RANGE = os.environ.get("ELEMENTEDGE_REPLAY")
+serial_ingestor = None
+if serial_sources and not REPLAY_RANGE:
+    DEFAULT_RESPONDER = serial_sources[0].responder_id
+    serial_ingestor = SerialIngestor(vitals_store, serial_sources)
 
-# Inicializar una cola para los signos vitales (últimos 10 segundos)
-vital_signs_queue = deque(maxlen=10)
+# Número de muestras visibles en cada gráfico (últimos 10 segundos)
+VITALS_WINDOW = 10
 
-# Generar signos vitales iniciales
-def generate_vital_sign():
-    return random.uniform(60, 100)
+# Construye una sola vez la figura de una señal con todo su estilo; los datos
+# llegan después de forma incremental mediante extendData
+def build_vital_figure(trace, title):
+    fig = go.Figure(trace)
+    fig.update_layout(
+        title=title,
+        margin=dict(l=10, r=10, t=30, b=10),
+        xaxis_title="Time (Last 10 seconds)",
+        yaxis_title=title.split(" ")[0],
+        plot_bgcolor=palette["background"],
+        paper_bgcolor=palette["background"],
+        font=dict(color=palette["highlight"]),
+        xaxis=dict(showgrid=False, color=palette["secondary"], type="date"),
+        yaxis=dict(showgrid=True, gridcolor=palette["border"], color=palette["secondary"]),
+    )
+    return fig
 
-# Actualizar la cola de signos vitales con datos iniciales
-for _ in range(10):
-    vital_signs_queue.append(generate_vital_sign())
+vital_figures = {
+    "heart_rate": build_vital_figure(
+        go.Scatter(
+            x=[], y=[],
+            mode="lines+markers",
+            line=dict(color=palette["highlight"], width=2),
+            marker=dict(size=8, color=palette["secondary"], symbol="circle"),
+        ),
+        "Heart Rate (BPM)",
+    ),
+    "oxygen_level": build_vital_figure(
+        go.Bar(x=[], y=[], marker_color=palette["area"]),
+        "Oxygen Level (%)",
+    ),
+    "temperature": build_vital_figure(
+        go.Scatter(
+            x=[], y=[],
+            fill="tozeroy",
+            line=dict(color=palette["border"], width=2),
+            fillcolor=palette["secondary"],
+        ),
+        "Temperature (°C)",
+    ),
+    "blood_pressure": build_vital_figure(
+        go.Scatter(
+            x=[], y=[],
+            mode="lines",
+            line=dict(color=palette["area"], width=2),
+        ),
+        "Blood Pressure (Systolic)",
+    ),
+}
+
+
+# Crear la aplicación Dash
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 
 # Datos iniciales de los marcadores
 markers = [
@@ -57,10 +208,14 @@ markers = [
         "type": random.choice(["Fire", "Rescued", "Firefighter"]),
         "name": random.choice(["John Doe", "Jane Smith", "Alex Johnson", "Chris Lee", "Taylor Brown"]),
         "location": (34.0522 + random.uniform(-0.03, 0.03), -118.2437 + random.uniform(-0.03, 0.03)),
+        "responder": responder_id,
     }
-    for i in range(10)
+    for i, responder_id in enumerate(SIMULATED_RESPONDERS)
 ]
 
+# Marcador de cada responder, para señalar sus alertas en el mapa
+responder_markers = {marker["responder"]: marker["id"] for marker in markers}
+
 # Asignar colores a los tipos de marcadores
 marker_colors = {
     "Fire": "#ECF22E",
@@ -74,375 +229,1022 @@ icon_urls = {
     "Rescued": "https://arbeyaragon.github.io/ElementEdge/person_danger.png",
     "Firefighter": "https://arbeyaragon.github.io/ElementEdge/fireworker.png",
 }
+selected_icon_url = "https://arbeyaragon.github.io/ElementEdge/fireworker_selected.png"
 
-# Configurar captura de video
-camera = cv2.VideoCapture(0)
+# Vista inicial del mapa
+MAP_CENTER = (34.0522, -118.2437)
+MAP_ZOOM = 13
 
-def generate_frames():
-    while True:
-        success, frame = camera.read()
-        if not success:
-            break
-        else:
-            _, buffer = cv2.imencode('.jpg', frame)
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+# Almacén de marcadores con índice espacial; el mapa solo recibe los de la vista actual
+marker_store = MarkerStore(markers)
+
+# Posiciones GPS en vivo: se reciben en /api/locations y se aplican dos veces por segundo
+location_feed = LocationFeed(marker_store, apply_interval=0.5)
+
+# Ícono de un marcador según su tipo, destacado si está seleccionado y
+# resaltado (assets/alerts.css) si su responder tiene alertas activas. Sin
+# marcador (p. ej. uno ya retirado) queda el ícono por defecto de Leaflet
+def marker_icon(marker, selected=False):
+    if selected:
+        icon = dict(iconUrl=selected_icon_url, iconSize=[40, 40], iconAnchor=[20, 20])
+    elif marker is None:
+        return None
+    else:
+        icon = dict(iconUrl=icon_urls[marker["type"]], iconSize=[30, 30], iconAnchor=[15, 15])
+    if marker is not None and responder_alerts(marker.get("responder")):
+        icon["className"] = "marker-alert"
+    return icon
+
+def render_marker(marker, selected=False):
+    return dl.Marker(
+        id={"type": "marker", "index": marker["id"]},
+        position=marker["location"],
+        children=[
+            dl.Tooltip(marker["type"]),
+            dl.Popup(f"{marker['name']} ({marker['type']})"),
+        ],
+        icon=marker_icon(marker, selected),
+    )
+
+# Un grupo de marcadores se dibuja como un círculo con el total y el desglose por tipo
+def render_cluster(cluster):
+    summary = ", ".join(f"{count} {marker_type}" for marker_type, count in sorted(cluster["types"].items()))
+    return dl.CircleMarker(
+        id={"type": "cluster", "index": cluster["id"]},
+        center=cluster["location"],
+        radius=min(40, 10 + 3 * math.log2(cluster["count"])),
+        color=palette["background"],
+        fillColor=palette["highlight"],
+        fillOpacity=0.8,
+        children=[dl.Tooltip(f"{cluster['count']} markers: {summary}")],
+    )
+
+# Límites aproximados de la vista para un centro y un zoom (teselas de 256 px),
+# usados antes de que el mapa informe sus límites reales
+def view_bounds(center, zoom, width_px=1200, height_px=800):
+    degrees_per_pixel = 360.0 / (256 * 2 ** zoom)
+    half_lat = height_px / 2 * degrees_per_pixel
+    half_lon = width_px / 2 * degrees_per_pixel
+    return [[center[0] - half_lat, center[1] - half_lon], [center[0] + half_lat, center[1] + half_lon]]
+
+# Componentes de los marcadores y grupos visibles para unos límites y un zoom
+def render_visible_markers(bounds, zoom, selected_id=None):
+    visible, clusters = marker_store.query(bounds, zoom)
+    return (
+        [render_marker(marker, marker["id"] == selected_id) for marker in visible]
+        + [render_cluster(cluster) for cluster in clusters]
+    )
+
+# Configurar captura de video: la cámara, o un video grabado o la escena de
+# prueba con ELEMENTEDGE_VIDEO_SOURCE=<ruta> / synthetic
+VIDEO_SOURCE = os.environ.get("ELEMENTEDGE_VIDEO_SOURCE", "0")
+# Segundos sin clientes de /video_feed tras los que se libera la cámara
+CAMERA_IDLE_TIMEOUT = float(os.environ.get("ELEMENTEDGE_CAMERA_IDLE_TIMEOUT", "30"))
+
+# Un solo hilo lee y codifica la cámara; todos los clientes comparten sus cuadros.
+# Solo se codifican los cuadros en que cambió la escena, con un latido cada 2 s.
+# La cámara se abre con el primer cliente, no al importar el módulo, para que
+# varios procesos del servidor no compitan por el dispositivo.
+frame_broadcaster = FrameBroadcaster(
+    buffer_size=8,
+    gate=FrameGate(threshold=0.005, max_interval=2.0),
+    open_capture=lambda: open_video_source(VIDEO_SOURCE),
+    idle_timeout=CAMERA_IDLE_TIMEOUT,
+)
+
+# Los parámetros opcionales de la URL limitan ancho, calidad y cuadros por segundo,
+# p. ej. /video_feed?width=480&quality=60&fps=5&adaptive=1
+def generate_frames(settings=None):
+    for frame in state.stream("video", settings or StreamSettings()):
+        yield (b'--frame\r\n'
+               b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
 
 @app.server.route('/video_feed')
 def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    settings = StreamSettings.from_query(request.args)
+    return Response(generate_frames(settings), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+# Recibe lotes de posiciones: [{"id": "marker_1", "lat": 34.05, "lon": -118.24, "timestamp": 1700000000.0}, ...]
+@app.server.route('/api/locations', methods=['POST'])
+def receive_locations():
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get("updates")
+    if not isinstance(payload, list):
+        return jsonify(error="Expected a list of {id, lat, lon} updates"), 400
+    accepted, rejected = state.call("locations", payload)
+    return jsonify(accepted=accepted, rejected=rejected), 202
+
+# Directorio para los datos que deben sobrevivir a un reinicio
+DATA_DIR = os.environ.get("ELEMENTEDGE_DATA_DIR", "data")
+
+# Historial de chat por sesión del navegador, acotado y guardado en disco.
+# Solo lo abre el proceso principal (open_stores); los demás se lo piden
+chat_store = None
+
+# Los canales de chat los genera el navegador; solo se aceptan ids cortos y simples
+def valid_channel(channel):
+    return bool(channel) and len(channel) <= 64 and channel.replace("-", "").replace("_", "").isalnum()
+
+# Devuelve una página de mensajes anteriores de un canal: /api/chat/<canal>?before=<id>&limit=50
+@app.server.route('/api/chat/<channel>')
+def chat_page(channel):
+    if not valid_channel(channel):
+        return jsonify(error="Invalid channel"), 400
+    before = request.args.get("before", type=int)
+    limit = request.args.get("limit", type=int)
+    return jsonify(state.call("chat_page", channel, before, limit))
+
+# Historial persistente del incidente (signos vitales y posiciones) con
+# resúmenes de 1 s, 10 s y 1 min para consultar rangos largos. Se escribe por
+# lotes una vez por segundo; durante una reproducción no se graba de nuevo.
+# ELEMENTEDGE_REPLAY_SPEED acelera o frena la reproducción (1 = tiempo real).
+# Como el chat, solo lo abre el proceso principal.
+incident_history = None
+incident_replay = None
+history_publisher = Publisher(interval=1.0)
+
+if REPLAY_RANGE:
+    replay_start, replay_end = parse_time_range(REPLAY_RANGE)
+else:
+    @history_publisher.add
+    def record_history():
+        incident_history.sync(vitals_store, location_feed)
+
+# Abre el chat y el historial en el proceso principal, antes de atender a los demás
+def open_stores():
+    global chat_store, incident_history, incident_replay
+    chat_store = ChatStore(os.path.join(DATA_DIR, "chat.jsonl"), retention=500, page_size=50)
+    incident_history = IncidentHistory(os.path.join(DATA_DIR, "history.sqlite3"))
+    if REPLAY_RANGE:
+        incident_replay = IncidentReplay(
+            incident_history,
+            vitals_store,
+            location_feed,
+            start=replay_start,
+            end=replay_end,
+            speed=float(os.environ.get("ELEMENTEDGE_REPLAY_SPEED", "1")),
+        )
+    metrics.counter("history_samples_written_total", "Vitals samples written to the incident history", lambda: incident_history.written)
+    metrics.summary("history_write_seconds", "Time per incident history write transaction", incident_history.write_seconds)
+    metrics.summary("history_query_seconds", "Time per incident history range query", incident_history.query_seconds)
+    metrics.summary("chat_write_seconds", "Time to store a chat message", chat_store.write_seconds)
+
+# Serie guardada de una señal: /api/history/<responder>/<señal>?start=<epoch>&end=<epoch>&points=500.
+# Por defecto la última hora; los rangos largos se responden con los resúmenes.
+@app.server.route('/api/history/<responder_id>/<signal>')
+def history_series(responder_id, signal):
+    if signal not in vitals_store.signals:
+        return jsonify(error="Unknown signal"), 404
+    end = request.args.get("end", type=float, default=time.time())
+    start = request.args.get("start", type=float, default=end - 3600)
+    points = min(max(request.args.get("points", type=int, default=500), 1), 5000)
+    resolution, times, mean, minimum, maximum = state.call("history", responder_id, signal, start, end, points)
+    return jsonify(
+        resolution=resolution,
+        t=(times * 1000).tolist(),
+        mean=mean.tolist(),
+        min=minimum.tolist(),
+        max=maximum.tolist(),
+    )
+
+# Canal de eventos en vivo (Server-Sent Events). Un solo hilo publica las
+# novedades de signos vitales y posiciones; cada evento se serializa una vez y
+# se entrega a todos los navegadores conectados, que lo aplican en el cliente.
+event_broker = EventBroker()
+live_publisher = Publisher(interval=0.25)
+
+# Agente del chat. Responde en un pool de hilos, fuera de los callbacks de
+# Dash; cada fragmento de la respuesta se envía al canal a medida que se genera
+# y la respuesta completa se guarda en el historial al terminar. Para usar otro
+# agente basta con pasar una subclase de chat_responder.Responder.
+def stream_chat_reply(chat_request, token):
+    event_broker.publish(
+        "chat_partial",
+        {"request": chat_request.request_id, "author": "Bot", "text": chat_request.reply},
+        channel=chat_request.channel,
+    )
+
+def deliver_chat_reply(chat_request):
+    if chat_request.error is not None:
+        text = "Sorry, I couldn't answer that. Please try again."
+    else:
+        text = chat_request.reply
+    message = chat_store.append(chat_request.channel, "Bot", text)
+    event_broker.publish("chat", [dict(message, request=chat_request.request_id)], channel=chat_request.channel)
+
+chat_responder = ChatResponderPool(
+    EchoResponder(),
+    workers=4,
+    per_channel_limit=1,
+    on_token=stream_chat_reply,
+    on_complete=deliver_chat_reply,
+)
+
+# Guarda un mensaje del usuario, lo envía solo a los suscriptores de su canal y
+# encola la respuesta del agente; un mensaje repetido mientras se responde el
+# anterior no se vuelve a encolar
+def submit_chat(channel, user_message):
+    history = chat_store.page(channel, limit=20)
+    message = chat_store.append(channel, "User", user_message)
+    event_broker.publish("chat", [message], channel=channel)
+    chat_responder.submit(channel, user_message, history)
+
+# Marca de tiempo de la última muestra publicada de cada responder
+vitals_published = {}
+# Versión de las posiciones ya publicadas
+positions_published = location_feed.version
+
+# Muestras de un responder en el formato de los eventos: tiempos en ms y una lista por señal
+def vitals_payload(times, values):
+    payload = {"t": (times * 1000).tolist()}
+    for row, signal in enumerate(vitals_store.signals):
+        payload[signal] = [None if value != value else value for value in values[row].tolist()]
+    return payload
+
+# Últimas muestras de todos los responders, enviadas a cada navegador al conectarse
+def vitals_snapshot():
+    snapshot = {}
+    for responder_id in vitals_store.responders():
+        times, values = vitals_store.window(responder_id, None, last=VITALS_WINDOW)
+        if len(times):
+            snapshot[responder_id] = vitals_payload(times, values)
+    return snapshot
+
+# Publica todas las muestras nuevas desde la última publicación, no solo las
+# últimas VITALS_WINDOW: a 20 Hz o tras una pausa llegan más entre dos ciclos
+@live_publisher.add
+def publish_vitals():
+    updates = {}
+    for responder_id in vitals_store.responders():
+        after = vitals_published.get(responder_id)
+        times, values = vitals_store.window(
+            responder_id, None, last=VITALS_WINDOW if after is None else None, after=after
+        )
+        if len(times):
+            vitals_published[responder_id] = float(times[-1])
+            updates[responder_id] = vitals_payload(times, values)
+    if updates:
+        event_broker.publish("vitals", updates)
+
+@live_publisher.add
+def publish_positions():
+    global positions_published
+    positions_published, positions = location_feed.changes_since(positions_published)
+    if positions:
+        event_broker.publish("positions", positions)
+
+# Vista general de todos los responders: una mini gráfica del pulso de cada
+# uno, armada con una sola consulta al almacén y publicada cada 2 s
+OVERVIEW_SIGNAL = "heart_rate"
+OVERVIEW_SAMPLES = 60
+overview_publisher = Publisher(interval=2.0)
+
+# Nombre de un responder para mostrar: el de su marcador, si tiene
+def responder_label(responder_id):
+    marker = marker_store.get(responder_markers.get(responder_id))
+    return f"{marker['name']} ({responder_id})" if marker else responder_id
+
+# Mini gráficas SVG (como data URI) de varias series a la vez, una por fila de
+# `values`, cada una escalada a su propio rango; None para las series vacías
+def sparklines(values, height=20):
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    low = np.where(valid, values, np.inf).min(axis=1, keepdims=True)
+    high = np.where(valid, values, -np.inf).max(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore"):
+        y = np.rint(height - 1 - (filled - low) / np.maximum(high - low, 1e-6) * (height - 2))
+    width = values.shape[1]
+    color = palette["highlight"].replace("#", "%23")
+    images = []
+    for row_valid, row_y in zip(valid, y.astype(np.int64, copy=False).tolist()):
+        if not row_valid.any():
+            images.append(None)
+            continue
+        points = " ".join(f"{x},{row_y[x]}" for x in np.flatnonzero(row_valid).tolist())
+        images.append(
+            f"data:image/svg+xml;utf8,<svg xmlns='http://www.w3.org/2000/svg' width='{width}' height='{height}'>"
+            f"<polyline points='{points}' fill='none' stroke='{color}' stroke-width='1.5'/></svg>"
+        )
+    return images
+
+def responders_overview():
+    responder_ids, _, values = vitals_store.latest(OVERVIEW_SIGNAL, OVERVIEW_SAMPLES)
+    images = sparklines(values)
+    overview = []
+    for row, responder_id in enumerate(responder_ids):
+        valid = values[row][~np.isnan(values[row])]
+        overview.append({
+            "responder": responder_id,
+            "name": responder_label(responder_id),
+            "value": float(valid[-1]) if len(valid) else None,
+            "sparkline": images[row],
+            "alert": bool(responder_alerts(responder_id)),
+        })
+    return overview
+
+@overview_publisher.add
+def publish_overview():
+    if event_broker.subscribers:
+        event_broker.publish("overview", responders_overview())
+
+# Detección de peligros en la cámara. Un hilo aparte analiza los cuadros
+# reducidos (fuego por color, o el modelo de ELEMENTEDGE_HAZARD_MODEL con
+# OpenCV DNN) mientras la cámara está abierta; cada peligro nuevo aparece como
+# marcador en la ubicación de la cámara y genera una alerta, y el marcador se
+# retira si deja de detectarse.
+CAMERA_LOCATION = MAP_CENTER
+HAZARD_MARKER_TYPES = {"fire": "Fire", "smoke": "Fire", "person": "Rescued"}
+HAZARD_TTL = 30.0
+
+# Última vez que se detectó cada tipo de peligro
+hazards_seen = {}
+
+def build_hazard_detector():
+    model_path = os.environ.get("ELEMENTEDGE_HAZARD_MODEL")
+    if not model_path:
+        return FireColorDetector()
+    labels = os.environ.get("ELEMENTEDGE_HAZARD_LABELS", "background,fire,smoke,person").split(",")
+    return DNNDetector(model_path, labels, config_path=os.environ.get("ELEMENTEDGE_HAZARD_CONFIG"))
+
+def publish_hazards(frame, detections):
+    now = time.monotonic()
+    best = {}
+    for detection in detections:
+        if detection["label"] in HAZARD_MARKER_TYPES and detection["score"] > best.get(detection["label"], 0):
+            best[detection["label"]] = detection["score"]
+    for label, score in best.items():
+        marker_id = f"hazard_{label}"
+        if hazards_seen.get(label) is None:
+            marker = {
+                "id": marker_id,
+                "type": HAZARD_MARKER_TYPES[label],
+                "name": f"Detected {label}",
+                "location": CAMERA_LOCATION,
+            }
+            marker_store.add(marker)
+            event_broker.publish("markers", {"added": [marker_id], "markers": [marker]})
+            event_broker.publish("alert", {
+                "kind": "hazard",
+                "marker": marker_id,
+                "message": f"{label.capitalize()} detected by the camera ({score:.0%})",
+                "timestamp": time.time(),
+            })
+        hazards_seen[label] = now
+
+@live_publisher.add
+def expire_hazards():
+    now = time.monotonic()
+    expired = [label for label, seen in list(hazards_seen.items()) if now - seen > HAZARD_TTL]
+    for label in expired:
+        del hazards_seen[label]
+        if f"hazard_{label}" in marker_store:
+            marker_store.remove(f"hazard_{label}")
+    if expired:
+        event_broker.publish("markers", {"removed": [f"hazard_{label}" for label in expired]})
+
+# Por defecto la detección analiza los cuadros mientras algún cliente mira el
+# video, y la cámara se libera sin clientes; con ELEMENTEDGE_HAZARD_DETECTION=always
+# la mantiene abierta siempre, y con 0 se desactiva
+HAZARD_DETECTION = os.environ.get("ELEMENTEDGE_HAZARD_DETECTION", "viewers")
+
+# Se construye al arrancar los servicios, solo en el proceso principal
+hazard_worker = None
+
+def start_hazard_detection():
+    global hazard_worker
+    hazard_worker = HazardDetectionWorker(
+        frame_broadcaster,
+        build_hazard_detector(),
+        on_detections=publish_hazards,
+        input_width=320,
+        max_batch=8,
+        min_interval=0.2,
+        hold_capture=HAZARD_DETECTION == "always",
+    )
+    metrics.counter("hazard_frames_processed_total", "Frames analysed for hazards", lambda: hazard_worker.processed)
+    metrics.counter("hazard_frames_skipped_total", "Frames the hazard detector fell behind on", lambda: hazard_worker.skipped)
+    metrics.summary("hazard_latency_seconds", "Time from capture to hazard detection", hazard_worker.latencies)
+    hazard_worker.start()
+
+# Las anomalías de signos vitales se evalúan cada 50 ms en su propio hilo, para
+# detectar en menos de 100 ms; cada alerta nueva se publica y el marcador del
+# responder se redibuja resaltado mientras siga activa
+alert_publisher = Publisher(interval=0.05)
+
+@alert_publisher.add
+def detect_vital_anomalies():
+    events = vitals_engine.process_store(vitals_store)
+    for event in events:
+        if event["active"]:
+            event_broker.publish("alert", {
+                "kind": "vitals",
+                "responder": event["responder"],
+                "marker": responder_markers.get(event["responder"]),
+                "message": f"{event['responder']}: {event['message']}",
+                "timestamp": event["timestamp"],
+            })
+    changed = sorted({responder_markers[event["responder"]] for event in events if event["responder"] in responder_markers})
+    if changed:
+        # Incluye las alertas vigentes de cada responder afectado para los procesos secundarios
+        active = {event["responder"]: vitals_engine.active_alerts(event["responder"]) for event in events}
+        event_broker.publish("markers", {"alerts": changed, "active": active})
+
+
+@app.server.route('/events')
+def events():
+    channel = request.args.get("channel")
+    if not valid_channel(channel):
+        channel = None
+    subscription = event_broker.subscribe(channel)
+    initial = [format_event("vitals", vitals_snapshot()), format_event("overview", responders_overview())]
+    if channel is not None:
+        initial.append(format_event("chat", state.call("chat_page", channel, None, None)))
+    return Response(
+        subscription.stream(initial),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-# Historial de chat (lista inicial vacía)
-chat_history = []
 # Logo de la aplicación (puedes cambiar la URL por el logo que desees)
 logo_url = "https://arbeyaragon.github.io/ElementEdge/logo.png"
 
-# Layout actualizado con el Header
-app.layout = dbc.Container(
-    fluid=True,
-    style={
-        "background": "linear-gradient(135deg, #102026 20%, #5D7366 40%, #565902 60%, #ECF22E 80%, #EDF25E 100%)",
-        "backgroundSize": "400% 400%",
-        "animation": "gradientAnimation 15s ease infinite",
-    },
-    children=[
-        # Header de la aplicación
-        dbc.Row(
-            [
-                dbc.Col(
-                    html.Img(
-                        src=logo_url,
-                        style={"height": "60px", "marginRight": "15px"},
+# Layout con el Header. Se construye en cada carga de la página, y así cada
+# pestaña nueva recibe los marcadores actuales; se asigna en create_app porque
+# Dash lo construye una vez al asignarlo para validarlo
+def build_layout():
+    return dbc.Container(
+        fluid=True,
+        style={
+            "background": "linear-gradient(135deg, #102026 20%, #5D7366 40%, #565902 60%, #ECF22E 80%, #EDF25E 100%)",
+            "backgroundSize": "400% 400%",
+            "animation": "gradientAnimation 15s ease infinite",
+        },
+        children=[
+            # Header de la aplicación
+            dbc.Row(
+                [
+                    dbc.Col(
+                        html.Img(
+                            src=logo_url,
+                            style={"height": "60px", "marginRight": "15px"},
+                        ),
+                        width="auto",
+                    ),
+                    dbc.Col(
+                        html.Div(
+                            [
+                                html.H1(
+                                    "ElementEdge Monitoring",
+                                    style={"color": "#ECF22E", "marginBottom": "5px"},
+                                ),
+                                html.P(
+                                    "An application for monitoring vital signs, managing emergencies, and visualizing interactive maps.",
+                                    style={"color": "#EDF25E", "fontSize": "16px"},
+                                ),
+                            ]
+                        ),
                     ),
-                    width="auto",
-                ),
-                dbc.Col(
-                    html.Div(
+                ],
+                align="center",
+                style={
+                    "padding": "10px",
+                    "backgroundColor": "#5D7366",
+                    "borderBottom": f"2px solid {palette['border']}",
+                },
+            ),
+            # Contenido principal
+            dbc.Row(
+                [
+                    dbc.Col(
+                        html.Div(
+                            [
+                                dl.Map(
+                                    style={
+                                        "height": "80vh",
+                                        "border": f"2px solid #5D7366",
+                                        "background": "linear-gradient(135deg, #102026, #5D7366, #565902, #ECF22E, #EDF25E)",
+                                    },
+                                    id="map",
+                                    center=MAP_CENTER,
+                                    zoom=MAP_ZOOM,
+                                    children=[
+                                        dl.TileLayer(),
+                                        dl.LayerGroup(
+                                            id="marker-layer",
+                                            children=render_visible_markers(view_bounds(MAP_CENTER, MAP_ZOOM), MAP_ZOOM),
+                                        ),
+                                    ],
+                                ),
+                                html.Div(
+                                    [
+                                        html.Div(
+                                            [
+                                                html.Div(id="chat-messages"),
+                                                # Respuestas del agente mientras se generan
+                                                html.Div(id="chat-partial"),
+                                            ],
+                                            id="chat-history",
+                                            style={
+                                                "height": "300px",
+                                                "overflowY": "auto",
+                                                "padding": "10px",
+                                                "backgroundColor": "#5D7366",
+                                                "color": "#EDF25E",
+                                                "border": f"1px solid {palette['border']}",
+                                                "borderRadius": "5px",
+                                                "marginBottom": "10px",
+                                            },
+                                        ),
+                                        dbc.InputGroup(
+                                            [
+                                                dbc.Input(
+                                                    id="chat-input",
+                                                    placeholder="Type your message...",
+                                                    style={"backgroundColor": "#102026", "color": "#ECF22E"},
+                                                ),
+                                                dbc.Button(
+                                                    "Send",
+                                                    id="send-button",
+                                                    color="success",
+                                                    n_clicks=0,
+                                                    style={"backgroundColor": "#ECF22E", "color": "#102026"},
+                                                ),
+                                            ],
+                                            className="mb-3",
+                                        ),
+                                    ],
+                                    style={"marginTop": "10px"},
+                                ),
+                            ],
+                            style={"position": "relative"},
+                        ),
+                        width=8,
+                    ),
+                    dbc.Col(
                         [
-                            html.H1(
-                                "ElementEdge Monitoring",
-                                style={"color": "#ECF22E", "marginBottom": "5px"},
+                            html.H2("Details", style={"color": "#ECF22E"}),
+                            # Alertas recientes (peligros y signos vitales), las más nuevas primero
+                            html.Div(id="alerts", style={"marginBottom": "10px"}),
+                            html.Div(
+                                "Click on a marker to see details.",
+                                id="details",
+                                style={"marginBottom": "20px", "color": "#EDF25E"},
                             ),
-                            html.P(
-                                "An application for monitoring vital signs, managing emergencies, and visualizing interactive maps.",
-                                style={"color": "#EDF25E", "fontSize": "16px"},
+                            # Marcador seleccionado en esta sesión del navegador
+                            dcc.Store(id="selected-marker"),
+                            html.H5(
+                                f"Vitals: {responder_label(DEFAULT_RESPONDER)}",
+                                id="vitals-title",
+                                style={"color": "#ECF22E"},
                             ),
-                        ]
-                    ),
-                ),
-            ],
-            align="center",
-            style={
-                "padding": "10px",
-                "backgroundColor": "#5D7366",
-                "borderBottom": f"2px solid {palette['border']}",
-            },
-        ),
-        # Contenido principal
-        dbc.Row(
-            [
-                dbc.Col(
-                    html.Div(
-                        [
-                            dl.Map(
-                                style={
-                                    "height": "80vh",
-                                    "border": f"2px solid #5D7366",
-                                    "background": "linear-gradient(135deg, #102026, #5D7366, #565902, #ECF22E, #EDF25E)",
-                                },
-                                center=(34.0522, -118.2437),
-                                zoom=13,
-                                children=[
-                                    dl.TileLayer(),
-                                    dl.LayerGroup(
-                                        [
-                                            dl.Marker(
-                                                id={"type": "marker", "index": marker["id"]},
-                                                position=marker["location"],
-                                                children=[
-                                                    dl.Tooltip(marker["type"]),
-                                                    dl.Popup(f"{marker['name']} ({marker['type']})"),
-                                                ],
-                                                icon=dict(
-                                                    iconUrl=icon_urls[marker["type"]],
-                                                    iconSize=[30, 30],
-                                                    iconAnchor=[15, 15],
-                                                ),
-                                            )
-                                            for marker in markers
-                                        ]
+                            dbc.Row(
+                                [
+                                    dbc.Col(
+                                        dcc.Graph(
+                                            id="heart_rate_graph",
+                                            figure=vital_figures["heart_rate"],
+                                            config={"displayModeBar": False},
+                                            style={"height": "150px"},
+                                        ),
+                                        width=6,
+                                    ),
+                                    dbc.Col(
+                                        dcc.Graph(
+                                            id="oxygen_level_graph",
+                                            figure=vital_figures["oxygen_level"],
+                                            config={"displayModeBar": False},
+                                            style={"height": "150px"},
+                                        ),
+                                        width=6,
                                     ),
                                 ],
+                                style={"marginBottom": "10px"},
                             ),
-                            html.Div(
+                            dbc.Row(
                                 [
-                                    html.Div(
-                                        id="chat-history",
-                                        style={
-                                            "height": "300px",
-                                            "overflowY": "auto",
-                                            "padding": "10px",
-                                            "backgroundColor": "#5D7366",
-                                            "color": "#EDF25E",
-                                            "border": f"1px solid {palette['border']}",
-                                            "borderRadius": "5px",
-                                            "marginBottom": "10px",
-                                        },
+                                    dbc.Col(
+                                        dcc.Graph(
+                                            id="temperature_graph",
+                                            figure=vital_figures["temperature"],
+                                            config={"displayModeBar": False},
+                                            style={"height": "150px"},
+                                        ),
+                                        width=6,
                                     ),
-                                    dbc.InputGroup(
-                                        [
-                                            dbc.Input(
-                                                id="chat-input",
-                                                placeholder="Type your message...",
-                                                style={"backgroundColor": "#102026", "color": "#ECF22E"},
-                                            ),
-                                            dbc.Button(
-                                                "Send",
-                                                id="send-button",
-                                                color="success",
-                                                n_clicks=0,
-                                                style={"backgroundColor": "#ECF22E", "color": "#102026"},
-                                            ),
-                                        ],
-                                        className="mb-3",
+                                    dbc.Col(
+                                        dcc.Graph(
+                                            id="blood_pressure_graph",
+                                            figure=vital_figures["blood_pressure"],
+                                            config={"displayModeBar": False},
+                                            style={"height": "150px"},
+                                        ),
+                                        width=6,
                                     ),
                                 ],
-                                style={"marginTop": "10px"},
+                                style={"marginBottom": "10px"},
+                            ),
+                            # Pulso de todos los responders; un clic muestra sus gráficos
+                            html.Div(id="responder-overview", className="responder-overview"),
+                            html.Div(
+                                [
+                                    html.Img(
+                                        src="/video_feed",
+                                        style={"width": "100%", "border": "2px solid #5D7366"},
+                                    ),
+                                ],
+                                style={"marginTop": "20px"},
                             ),
                         ],
-                        style={"position": "relative"},
+                        width=4,
+                        style={
+                            "padding": "20px",
+                            "backgroundColor": "#565902",
+                            "height": "100vh",
+                            "display": "flex",
+                            "flexDirection": "column",
+                        },
                     ),
-                    width=8,
-                ),
-                dbc.Col(
-                    [
-                        html.H2("Details", style={"color": "#ECF22E"}),
-                        html.Div(
-                            id="details",
-                            style={"marginBottom": "20px", "color": "#EDF25E"},
-                        ),
-                        dbc.Row(
-                            [
-                                dbc.Col(
-                                    dcc.Graph(
-                                        id="heart_rate_graph",
-                                        config={"displayModeBar": False},
-                                        style={"height": "150px"},
-                                    ),
-                                    width=6,
-                                ),
-                                dbc.Col(
-                                    dcc.Graph(
-                                        id="oxygen_level_graph",
-                                        config={"displayModeBar": False},
-                                        style={"height": "150px"},
-                                    ),
-                                    width=6,
-                                ),
-                            ],
-                            style={"marginBottom": "10px"},
-                        ),
-                        dbc.Row(
-                            [
-                                dbc.Col(
-                                    dcc.Graph(
-                                        id="temperature_graph",
-                                        config={"displayModeBar": False},
-                                        style={"height": "150px"},
-                                    ),
-                                    width=6,
-                                ),
-                                dbc.Col(
-                                    dcc.Graph(
-                                        id="blood_pressure_graph",
-                                        config={"displayModeBar": False},
-                                        style={"height": "150px"},
-                                    ),
-                                    width=6,
-                                ),
-                            ],
-                            style={"marginBottom": "10px"},
-                        ),
-                        html.Div(
-                            [
-                                html.Img(
-                                    src="/video_feed",
-                                    style={"width": "100%", "border": "2px solid #5D7366"},
-                                ),
-                            ],
-                            style={"marginTop": "20px"},
-                        ),
-                    ],
-                    width=4,
-                    style={
-                        "padding": "20px",
-                        "backgroundColor": "#565902",
-                        "height": "100vh",
-                        "display": "flex",
-                        "flexDirection": "column",
-                    },
-                ),
-            ]
-        ),
-        dcc.Interval(
-            id="update_interval",
-            interval=1000,
-            n_intervals=0,
-        ),
-    ],
-)
+                ]
+            ),
+            # Los datos en vivo llegan por /events (assets/live_updates.js); este
+            # intervalo solo corre en el navegador para aplicar los eventos recibidos
+            # y no genera peticiones al servidor
+            dcc.Interval(
+                id="push_tick",
+                interval=250,
+                n_intervals=0,
+            ),
+            # Responder cuyos signos vitales se grafican y marca de tiempo (ms) de la
+            # última muestra que ya tienen los gráficos
+            dcc.Store(id="vitals-responder", data={"id": DEFAULT_RESPONDER, "after": 0}),
+            # Responder de la última celda pulsada en la vista general
+            dcc.Store(id="selected-responder"),
+            # Canal de chat de esta sesión del navegador
+            dcc.Store(id="chat-channel"),
+            # Cambia cuando se agregan o retiran marcadores, para redibujar la vista
+            dcc.Store(id="marker-refresh", data=0),
+        ],
+    )
 
 
-# Callback para manejar el chat
+# Callback para manejar el chat: guarda el mensaje en el canal de esta sesión,
+# lo envía solo a sus suscriptores y encola la respuesta del agente, que llega
+# después por el canal de eventos; el historial se actualiza en el navegador
+# agregando únicamente los mensajes nuevos
 @app.callback(
-    Output("chat-history", "children"),
+    Output("chat-input", "value"),
     [Input("send-button", "n_clicks")],
-    [State("chat-input", "value")],
+    [State("chat-input", "value"), State("chat-channel", "data")],
+    prevent_initial_call=True,
 )
-def update_chat(n_clicks, user_message):
-    global chat_history
+def update_chat(n_clicks, user_message, channel):
+    if not user_message or not valid_channel(channel):
+        raise PreventUpdate
 
-    if n_clicks > 0 and user_message:
-        # Simular una respuesta del chatbot
-        bot_response = f"Bot: You said '{user_message}'"
+    state.call("chat", channel, user_message)
+    return ""
 
-        # Actualizar el historial de mensajes
-        chat_history.append(f"User: {user_message}")
-        chat_history.append(bot_response)
 
-        # Construir el historial de chat como elementos de lista
-        chat_elements = [
-            html.Div(msg, style={"marginBottom": "5px"}) for msg in chat_history
-        ]
-        return chat_elements
+# Callbacks en el navegador (assets/live_updates.js) que aplican los eventos
+# recibidos: muestras nuevas con extendData, posiciones de los marcadores
+# visibles, mensajes nuevos del chat, respuestas en curso del agente, alertas
+# y avisos de marcadores agregados o retirados
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="vitals"),
+    [
+        Output("heart_rate_graph", "extendData"),
+        Output("oxygen_level_graph", "extendData"),
+        Output("temperature_graph", "extendData"),
+        Output("blood_pressure_graph", "extendData"),
+    ],
+    Input("push_tick", "n_intervals"),
+    State("vitals-responder", "data"),
+)
 
-    # Si no hay mensajes nuevos, mostrar el historial actual
-    return [html.Div(msg, style={"marginBottom": "5px"}) for msg in chat_history]
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="overview"),
+    Output("responder-overview", "children"),
+    Input("push_tick", "n_intervals"),
+    State("vitals-responder", "data"),
+)
 
+# Las celdas de la vista general se redibujan con cada evento, y Dash dispara
+# los callbacks de las entradas nuevas; por eso el clic se resuelve en el
+# navegador y al servidor solo llega el responder elegido
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="cellClick"),
+    Output("selected-responder", "data"),
+    Input({"type": "responder-cell", "index": ALL}, "n_clicks"),
+    prevent_initial_call=True,
+)
 
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="positions"),
+    Output({"type": "marker", "index": ALL}, "position"),
+    Input("push_tick", "n_intervals"),
+    State({"type": "marker", "index": ALL}, "id"),
+)
 
-# Callback para actualizar los gráficos
-@app.callback(
-    [
-        Output("heart_rate_graph", "figure"),
-        Output("oxygen_level_graph", "figure"),
-        Output("temperature_graph", "figure"),
-        Output("blood_pressure_graph", "figure"),
-    ],
-    Input("update_interval", "n_intervals"),
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="chat"),
+    Output("chat-messages", "children"),
+    Input("push_tick", "n_intervals"),
+    State("chat-messages", "children"),
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="partial"),
+    Output("chat-partial", "children"),
+    Input("push_tick", "n_intervals"),
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="alerts"),
+    Output("alerts", "children"),
+    Input("push_tick", "n_intervals"),
+    State("alerts", "children"),
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="markers"),
+    Output("marker-refresh", "data"),
+    Input("push_tick", "n_intervals"),
+    State("marker-refresh", "data"),
 )
-def update_vital_signs(n_intervals):
-    # Actualizar las colas con nuevos valores
-    heart_rate_queue.append(generate_random_value(60, 100))
-    oxygen_level_queue.append(generate_random_value(90, 100))
-    temperature_queue.append(generate_random_value(36, 37.5))
-    blood_pressure_queue.append(generate_random_value(110, 130))
-
-    # Crear gráficos para cada cola
-    heart_rate_fig = go.Figure(go.Scatter(
-        y=list(heart_rate_queue), 
-        mode="lines+markers",
-        line=dict(color=palette["highlight"], width=2),
-        marker=dict(size=8, color=palette["secondary"], symbol="circle"),
-    ))
-    oxygen_level_fig = go.Figure(go.Bar(
-        y=list(oxygen_level_queue), 
-        marker_color=palette["area"]
-    ))
-    temperature_fig = go.Figure(go.Scatter(
-        y=list(temperature_queue), 
-        fill="tozeroy", 
-        line=dict(color=palette["border"], width=2),
-        fillcolor=palette["secondary"],
-    ))
-    blood_pressure_fig = go.Figure(go.Scatter(
-        y=list(blood_pressure_queue), 
-        mode="lines", 
-        line=dict(color=palette["area"], width=2),
-    ))
-
-    # Configurar estilos de los gráficos
-    for fig, title in zip(
-        [heart_rate_fig, oxygen_level_fig, temperature_fig, blood_pressure_fig],
-        ["Heart Rate (BPM)", "Oxygen Level (%)", "Temperature (°C)", "Blood Pressure (Systolic)"],
-    ):
-        fig.update_layout(
-            title=title,
-            margin=dict(l=10, r=10, t=30, b=10),
-            xaxis_title="Time (Last 10 seconds)",
-            yaxis_title=title.split(" ")[0],
-            plot_bgcolor=palette["background"],
-            paper_bgcolor=palette["background"],
-            font=dict(color=palette["highlight"]),
-            xaxis=dict(showgrid=False, color=palette["secondary"]),
-            yaxis=dict(showgrid=True, gridcolor=palette["border"], color=palette["secondary"]),
-        )
 
-    return heart_rate_fig, oxygen_level_fig, temperature_fig, blood_pressure_fig
+# El navegador genera el canal de chat de su sesión y lo comparte con el servidor
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="channel"),
+    Output("chat-channel", "data"),
+    Input("chat-channel", "modified_timestamp"),
+    State("chat-channel", "data"),
+)
 
 
-# Añadir una variable global para el marcador seleccionado
-selected_marker_id = None
+# Callback para mostrar solo los marcadores de la vista actual del mapa,
+# agrupados cuando hay poco zoom o demasiados marcadores; se repite cuando se
+# agregan o retiran marcadores
+@app.callback(
+    Output("marker-layer", "children"),
+    Input("map", "bounds"),
+    Input("map", "zoom"),
+    Input("marker-refresh", "data"),
+    State("selected-marker", "data"),
+)
+def update_visible_markers(bounds, zoom, refresh, selected_id):
+    zoom = MAP_ZOOM if zoom is None else zoom
+    return render_visible_markers(bounds or view_bounds(MAP_CENTER, zoom), zoom, selected_id)
 
-# Callback para manejar la selección de un marcador y actualizar su apariencia
+# Callback para manejar la selección de un marcador: identifica el marcador
+# pulsado con triggered_id, lo busca en el índice del almacén y solo cambia los
+# íconos del marcador anterior y del nuevo; el resto recibe no_update
 @app.callback(
     Output({"type": "marker", "index": ALL}, "icon"),
+    Output("details", "children"),
+    Output("selected-marker", "data"),
     Input({"type": "marker", "index": ALL}, "n_clicks"),
-    State({"type": "marker", "index": ALL}, "id"),
+    State("selected-marker", "data"),
+    prevent_initial_call=True,
 )
-def update_marker_selection(n_clicks, ids):
-    global selected_marker_id
-    if not any(n_clicks):
-        return [dict(iconUrl=icon_urls[marker["type"]], iconSize=[30, 30], iconAnchor=[15, 15]) for marker in markers]
+def update_marker_selection(n_clicks, previous_id):
+    # Los marcadores recién dibujados al mover el mapa disparan el callback sin clics
+    if ctx.triggered_id is None or not ctx.triggered[0]["value"]:
+        raise PreventUpdate
 
-    clicked_index = n_clicks.index(1)
-    selected_marker_id = ids[clicked_index]["index"]
+    marker_id = ctx.triggered_id["index"]
+    marker = marker_store.get(marker_id)
+    # El marcador pulsado ya no existe (un peligro vencido o una copia atrasada)
+    if marker is None:
+        return [no_update] * len(n_clicks), "No details available.", None
+    icons = [no_update] * len(n_clicks)
+    for i, output in enumerate(ctx.outputs_list[0]):
+        visible_id = output["id"]["index"]
+        if visible_id == marker_id:
+            icons[i] = marker_icon(marker, selected=True)
+        elif visible_id == previous_id and marker_store.get(visible_id):
+            icons[i] = marker_icon(marker_store.get(visible_id))
 
-    # Actualizar los íconos según el marcador seleccionado
-    icons = []
-    for marker in markers:
-        if marker["id"] == selected_marker_id:
-            icons.append(
-                dict(
-                    iconUrl="https://arbeyaragon.github.io/ElementEdge/fireworker_selected.png",  # Ícono destacado
-                    iconSize=[40, 40],
-                    iconAnchor=[20, 20],
-                )
-            )
-        else:
-            icons.append(
-                dict(
-                    iconUrl=icon_urls[marker["type"]],
-                    iconSize=[30, 30],
-                    iconAnchor=[15, 15],
-                )
-            )
-    return icons
+    alerts = responder_alerts(marker.get("responder"))
+    details = html.Div(
+        [
+            html.H4(marker["name"], style={"color": "#ECF22E"}),
+            html.P(f"Role: {marker['type']}", style={"color": "#EDF25E"}),
+        ]
+        + [
+            html.P(f"Alert: {kind} {signal.replace('_', ' ')}", className="text-danger")
+            for signal, kind in alerts
+        ]
+    )
+    return icons, details, marker_id
 
-# Callback para mostrar detalles del marcador seleccionado
+# Cambios a la figura de una señal con las últimas muestras de un responder:
+# solo se reemplazan los datos de la traza, el estilo queda en el navegador
+def responder_vital_figure(responder_id, signal):
+    times, values = vitals_store.window(responder_id, signal, last=VITALS_WINDOW)
+    patch = Patch()
+    patch["data"][0]["x"] = (times * 1000).tolist()
+    patch["data"][0]["y"] = [None if value != value else value for value in values.tolist()]
+    return patch
+
+# Callback para cambiar el responder de los gráficos, al seleccionar su
+# marcador o su celda en la vista general: los gráficos se reemplazan con sus
+# últimas muestras y después siguen recibiendo solo las nuevas
 @app.callback(
-    Output("details", "children"),
-    Input({"type": "marker", "index": ALL}, "n_clicks"),
-    State({"type": "marker", "index": ALL}, "id"),
+    Output("vitals-responder", "data"),
+    Output("vitals-title", "children"),
+    Output("heart_rate_graph", "figure"),
+    Output("oxygen_level_graph", "figure"),
+    Output("temperature_graph", "figure"),
+    Output("blood_pressure_graph", "figure"),
+    Input("selected-marker", "data"),
+    Input("selected-responder", "data"),
+    prevent_initial_call=True,
 )
-def display_marker_details(n_clicks, ids):
-    global selected_marker_id
-    if not any(n_clicks):
-        return "Click on a marker to see details."
-
-    clicked_index = n_clicks.index(1)
-    selected_marker_id = ids[clicked_index]["index"]
-    marker = next((m for m in markers if m["id"] == selected_marker_id), None)
-    if marker:
-        return html.Div(
-            [
-                html.H4(marker["name"], style={"color": "#ECF22E"}),
-                html.P(f"Role: {marker['type']}", style={"color": "#EDF25E"}),
-            ]
+def update_vitals_responder(marker_id, cell_responder):
+    if ctx.triggered_id == "selected-marker":
+        marker = marker_store.get(marker_id)
+        responder_id = marker.get("responder") if marker else None
+    elif ctx.triggered_id == "selected-responder":
+        responder_id = cell_responder
+    else:
+        raise PreventUpdate
+    if responder_id is None or responder_id not in vitals_store:
+        raise PreventUpdate
+
+    times, _ = vitals_store.window(responder_id, None, last=VITALS_WINDOW)
+    after = float(times[-1]) * 1000 if len(times) else 0
+    figures = [responder_vital_figure(responder_id, signal) for signal in vitals_store.signals]
+    return ({"id": responder_id, "after": after}, f"Vitals: {responder_label(responder_id)}", *figures)
+
+# Métricas del proceso en formato de Prometheus en /metrics: duración de los
+# callbacks de Dash (se instrumentan en create_app), tiempos de captura y
+# codificación del video, cuadros descartados, colas y escrituras a disco. Se
+# leen de los contadores que ya llevan los servicios al pedir /metrics.
+metrics = MetricsRegistry()
+metrics.counter("video_frames_captured_total", "Frames read from the camera", lambda: frame_broadcaster.captured)
+metrics.counter("video_frames_gated_total", "Frames dropped by the scene-change gate", lambda: frame_broadcaster.gated)
+metrics.counter("video_frames_skipped_total", "Frames a /video_feed client fell behind on", lambda: frame_broadcaster.skipped)
+metrics.gauge("video_viewers", "Connected /video_feed clients", lambda: frame_broadcaster.viewers)
+metrics.summary("video_capture_seconds", "Time to read a frame from the camera", frame_broadcaster.capture_seconds)
+metrics.summary("video_encode_seconds", "Time to JPEG-encode a frame variant", frame_broadcaster.encode_seconds)
+metrics.counter("events_published_total", "Live events published", lambda: event_broker.published)
+metrics.counter("events_dropped_total", "Live events dropped for slow subscribers", event_broker.dropped)
+metrics.gauge("events_subscribers", "Connected /events subscribers and relays", lambda: event_broker.subscribers)
+metrics.gauge("events_queued", "Live events waiting to be sent", event_broker.queued)
+for publisher_name, publisher in (
+    ("live", live_publisher),
+    ("overview", overview_publisher),
+    ("alerts", alert_publisher),
+    ("history", history_publisher),
+):
+    for task_name, task_seconds in publisher.task_seconds.items():
+        metrics.summary(
+            "publisher_task_seconds", "Time spent in periodic publisher tasks", task_seconds,
+            publisher=publisher_name, task=task_name,
         )
-    return "No details available."
+metrics.counter("locations_received_total", "GPS positions accepted", lambda: location_feed.received)
+metrics.counter("locations_applied_total", "GPS positions applied to the map", lambda: location_feed.applied)
+metrics.gauge("locations_pending", "GPS positions waiting to be applied", lambda: location_feed.pending)
+metrics.counter("vitals_samples_processed_total", "Vitals samples checked for anomalies", lambda: vitals_engine.processed)
+metrics.counter("vitals_samples_dropped_total", "Vitals samples without room in the shared store", lambda: getattr(vitals_store, "dropped", 0))
+metrics.counter("chat_requests_total", "Chat messages sent to the agent", lambda: chat_responder.submitted)
+metrics.counter("chat_failures_total", "Chat replies that failed", lambda: chat_responder.failed)
+metrics.gauge("chat_pending", "Chat requests queued or being answered", lambda: chat_responder.pending)
+metrics.summary(
+    "chat_first_token_seconds", "Time from a chat message to the first token of its reply",
+    lambda: [
+        chat_request.first_token_at - chat_request.submitted_at
+        for chat_request in list(chat_responder.finished)
+        if chat_request.first_token_at is not None
+    ],
+)
+if serial_ingestor is not None:
+    metrics.counter("serial_records_total", "Records read from the serial sensors", lambda: serial_ingestor.records)
+
+@app.server.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# Perfilador por muestreo, solo con ELEMENTEDGE_PROFILER=1:
+# /debug/profile?seconds=10 devuelve las pilas en formato collapsed (flamegraph.pl, speedscope)
+PROFILER_ENABLED = os.environ.get("ELEMENTEDGE_PROFILER") == "1"
+profiler = SamplingProfiler()
+profiler_lock = threading.Lock()
+
+@app.server.route('/debug/profile')
+def profile():
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "Set ELEMENTEDGE_PROFILER=1 to enable the profiler"}), 404
+    seconds = min(max(request.args.get("seconds", 10, type=float), 0.1), 120.0)
+    if not profiler_lock.acquire(blocking=False):
+        return jsonify({"error": "A profile is already running"}), 409
+    try:
+        profiler.start()
+        time.sleep(seconds)
+        return Response(profiler.stop(), mimetype="text/plain")
+    finally:
+        profiler_lock.release()
+
+# Operaciones que el proceso principal ejecuta para todos los procesos: las que
+# modifican estado y el video, que necesita la única cámara
+state = LocalState(
+    handlers={
+        "chat": submit_chat,
+        "chat_page": lambda channel, before, limit: chat_store.page(channel, before=before, limit=limit),
+        "history": lambda *args: incident_history.query(*args),
+        "locations": location_feed.submit,
+        "markers": marker_store.all,
+        "alerts": vitals_engine.alerts,
+    },
+    streams={"video": frame_broadcaster.stream},
+)
+state_server = StateServer(STATE_ADDRESS, STATE_KEY, state, event_broker)
+
+# En un proceso secundario, mantiene al día las copias locales de los
+# marcadores y las alertas con los eventos que publica el principal
+def apply_shared_event(topic, data):
+    if topic == "positions":
+        for marker_id, location in data.items():
+            marker_store.move(marker_id, tuple(location))
+    elif topic == "markers":
+        for marker in data.get("markers", []):
+            marker_store.add(marker)
+        for marker_id in data.get("removed", []):
+            if marker_id in marker_store:
+                marker_store.remove(marker_id)
+        for responder_id, alerts in data.get("active", {}).items():
+            if alerts:
+                remote_alerts[responder_id] = alerts
+            else:
+                remote_alerts.pop(responder_id, None)
+
+# Al (re)conectarse al principal copia sus marcadores y alertas actuales
+def sync_shared_state():
+    markers = state.call("markers")
+    current = {marker["id"] for marker in markers}
+    for marker in marker_store.all():
+        if marker["id"] not in current:
+            marker_store.remove(marker["id"])
+    for marker in markers:
+        marker_store.add(marker)
+    remote_alerts.clear()
+    remote_alerts.update(state.call("alerts"))
+
+# Hilos en segundo plano de la aplicación (sensores o simulación, posiciones,
+# historial o reproducción, detección de peligros y eventos en vivo). Importar
+# el módulo no arranca nada; se arrancan una sola vez por proceso al crear la
+# aplicación, p. ej. en cada proceso de Gunicorn, y solo en el proceso principal.
+services_started = False
+services_lock = threading.Lock()
+
+def start_services():
+    if REPLAY_RANGE:
+        incident_replay.start()
+    elif serial_ingestor is not None:
+        serial_ingestor.start()
+    else:
+        threading.Thread(target=simulate_vital_signs, name="vitals-simulation", daemon=True).start()
+    location_feed.start()
+    if not REPLAY_RANGE:
+        history_publisher.start()
+    if HAZARD_DETECTION != "0":
+        start_hazard_detection()
+    alert_publisher.start()
+    live_publisher.start()
+    overview_publisher.start()
+
+# Fábrica de la aplicación: arranca los servicios (o se conecta al proceso
+# principal si ya hay uno) y devuelve la app de Dash
+def create_app():
+    global services_started, state
+    with services_lock:
+        if services_started:
+            return app
+        services_started = True
+        if STATE_MODE == "shared" and not state_server.listen():
+            state = SharedState(
+                STATE_ADDRESS,
+                STATE_KEY,
+                event_broker,
+                on_event=apply_shared_event,
+                on_connect=sync_shared_state,
+            )
+            state.start()
+        app.layout = build_layout
+        instrument_callbacks(app, metrics)
+        if state.role == "worker":
+            return app
+        open_stores()
+        if STATE_MODE == "shared":
+            state_server.start()
+    start_services()
+    return app
+
+# Aplicación WSGI para Gunicorn: gunicorn "app:create_server()"
+def create_server():
+    return create_app().server
 
 if __name__ == "__main__":
-    app.run_server(debug=True)
+    create_app().run_server(debug=True)
 
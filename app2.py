@@ -1,70 +1,148 @@
 # -*- coding: utf-8 -*-
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, storage
 import cv2
-import base64
 import numpy as np
 from datetime import datetime, timedelta
+import os
 import time
+from frame_broadcaster import FrameBroadcaster
+from frame_gate import FrameGate
+from image_storage import (
+    THUMBNAIL_QUALITY,
+    THUMBNAIL_WIDTH,
+    FirebaseBlobStore,
+    FirestoreStorage,
+    LocalBlobStore,
+    SQLiteStorage,
+    image_document,
+)
+from image_uploader import ImageUploader
+import metrics
+
+# Directorio para los datos que deben sobrevivir a un reinicio
+DATA_DIR = os.environ.get("ELEMENTEDGE_DATA_DIR", "data")
+
+# Puerto para exponer /metrics (formato de Prometheus); sin la variable no se expone
+METRICS_PORT = os.environ.get("ELEMENTEDGE_METRICS_PORT")
+
+# Bucket de Firebase Storage para las imágenes (p. ej. "<proyecto>.appspot.com")
+STORAGE_BUCKET = os.environ.get("ELEMENTEDGE_STORAGE_BUCKET")
 
 # Inicializa la aplicación de Firebase Admin
 def initialize_firestore(service_account_key_path):
     try:
         cred = credentials.Certificate(service_account_key_path)
-        firebase_admin.initialize_app(cred)
+        firebase_admin.initialize_app(cred, {"storageBucket": STORAGE_BUCKET} if STORAGE_BUCKET else None)
         print("Firestore initialized successfully!")
         return firestore.client()
     except Exception as e:
         print(f"Error initializing Firestore: {e}")
         return None
 
-# Captura una foto desde la cámara
-def capture_image():
+# Captura una foto desde la cámara cada `interval` segundos y entrega sus bytes
+# JPEG, los de su miniatura y su tamaño. La cámara se lee continuamente en
+# segundo plano, así cada foto es la de ese instante y no un cuadro viejo
+# acumulado en el buffer mientras se esperaba. Con un `gate` solo se entregan
+# las fotos en que cambió la escena (y una cada `gate.max_interval` segundos).
+def capture_image(interval=3.0, gate=None):
     try:
         cap = cv2.VideoCapture(0)  # Usa la cámara predeterminada
         if not cap.isOpened():
             print("Error: Could not access the camera.")
-            return None
+            return
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("Error: Could not read frame from the camera.")
-                break
+        broadcaster = FrameBroadcaster(cap, gate=gate)
+        broadcaster.start()
+        try:
+            next_capture = time.monotonic()
+            seq = 0
+            while True:
+                frame = broadcaster.latest(timeout=interval)
+                if frame is None or not broadcaster.running:
+                    print("Error: Could not read frame from the camera.")
+                    break
 
-            _, buffer = cv2.imencode('.jpg', frame)
-            image_base64 = base64.b64encode(buffer).decode('utf-8')
-            yield image_base64
+                # Sin cambios en la escena desde la última foto no hay nada que enviar
+                if frame.seq != seq:
+                    seq = frame.seq
+                    image = broadcaster.encode(frame)
+                    thumbnail = broadcaster.encode(frame, THUMBNAIL_WIDTH, THUMBNAIL_QUALITY)
+                    height, width = frame.image.shape[:2]
+                    yield image, thumbnail, width, height
 
-        cap.release()
+                # Intervalo fijo entre capturas, sin sumar el tiempo de envío
+                next_capture += interval
+                delay = next_capture - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    next_capture = time.monotonic()
+        finally:
+            broadcaster.stop()
+            cap.release()
     except Exception as e:
         print(f"Error capturing image: {e}")
         yield None
 
-# Escribe datos en Firestore
-def write_to_firestore(db, collection_name, document_id, data):
-    try:
-        doc_ref = db.collection(collection_name).document(document_id)
-        doc_ref.set(data)
-        print(f"Document {document_id} written successfully in collection {collection_name}.")
-    except Exception as e:
-        print(f"Error writing to Firestore: {e}")
+# Métricas de la subida: documentos subidos, fallos, cola en disco y la
+# duración de cada escritura
+def uploader_metrics(uploader, gate):
+    registry = metrics.MetricsRegistry()
+    registry.counter("uploader_documents_total", "Documents uploaded", lambda: uploader.uploaded)
+    registry.counter("uploader_batches_total", "Batches written", lambda: uploader.batches)
+    registry.counter("uploader_failures_total", "Failed batch writes", lambda: uploader.failures)
+    registry.counter("uploader_spooled_total", "Documents written to the disk spool", lambda: uploader.spooled)
+    registry.gauge("uploader_spool_size", "Documents waiting on disk", uploader.spool_size)
+    registry.gauge("uploader_queue_size", "Documents waiting in memory", lambda: uploader.queued)
+    registry.summary("uploader_write_seconds", "Time per document batch write", uploader.write_seconds)
+    registry.summary("uploader_blob_seconds", "Time per image file upload", uploader.blob_seconds)
+    registry.counter("camera_frames_unchanged_total", "Photos skipped because the scene did not change", lambda: gate.dropped)
+    return registry
+
+# Almacenes de documentos e imágenes: Firestore y Firebase Storage, o SQLite y
+# un directorio local con ELEMENTEDGE_IMAGE_STORAGE=local
+def open_storage(service_account_key_path):
+    if os.environ.get("ELEMENTEDGE_IMAGE_STORAGE") == "local":
+        return SQLiteStorage(os.path.join(DATA_DIR, "images.sqlite3")), LocalBlobStore(os.path.join(DATA_DIR, "blobs"))
+    db = initialize_firestore(service_account_key_path)
+    if not db:
+        return None, None
+    if not STORAGE_BUCKET:
+        print("Error: Set ELEMENTEDGE_STORAGE_BUCKET to upload images to Firebase Storage.")
+        return None, None
+    return FirestoreStorage(db), FirebaseBlobStore(storage.bucket())
 
 if __name__ == "__main__":
     # Cambia el path por el archivo de tu clave de servicio
     # service_account_key_path = "serviceAccountKey.json"
     service_account_key_path = "/home/root/ElementEdge/serviceAccountKey.json"
 
-    db = initialize_firestore(service_account_key_path)
+    document_storage, blob_store = open_storage(service_account_key_path)
 
-    if db:
+    if document_storage:
+        # Las imágenes se suben en segundo plano; sin conexión quedan en disco
+        collection_name = "images"
+        uploader = ImageUploader(
+            document_storage,
+            collection_name,
+            spool_dir=os.path.join(DATA_DIR, "upload_spool"),
+            batch_size=20,
+            max_rate=10,
+            blob_store=blob_store,
+        )
+        uploader.start()
+        # Solo se suben las fotos en que cambió la escena, y al menos una por minuto
+        gate = FrameGate(threshold=0.01, max_interval=60.0)
+        if METRICS_PORT:
+            metrics.serve(uploader_metrics(uploader, gate), int(METRICS_PORT))
         try:
             print("Capturing images every 3 seconds for 5 minutes. Press 'q' to stop early.")
-            image_generator = capture_image()
+            image_generator = capture_image(interval=3.0, gate=gate)
             start_time = datetime.now()
             end_time = start_time + timedelta(minutes=5)
 
-            for image_base64 in image_generator:
+            for snapshot in image_generator:
                 if datetime.now() >= end_time:
                     print("5 minutes have passed. Stopping image capture.")
                     break
@@ -73,22 +151,21 @@ if __name__ == "__main__":
                     print("Stopping image capture by user request.")
                     break
 
-                if image_base64:
+                if snapshot:
+                    image, thumbnail, width, height = snapshot
+
                     # Genera un ID único basado en el tiempo actual
                     document_id = f"image_{datetime.now().strftime('%Y%m%d%H%M%S')}"
 
-                    # Datos a guardar
-                    data = {
-                        "timestamp": datetime.now().isoformat(),
-                        "image_base64": image_base64
-                    }
-
-                    # Escribe en Firestore
-                    collection_name = "images"
-                    write_to_firestore(db, collection_name, document_id, data)
-
-                time.sleep(3)  # Espera 3 segundos antes de capturar la siguiente imagen
+                    # Metadatos en el documento; la imagen y su miniatura como archivos
+                    data, blobs = image_document(
+                        document_id, datetime.now().isoformat(), image, thumbnail, width, height
+                    )
+                    uploader.submit(document_id, data, blobs)
         except KeyboardInterrupt:
             print("Image capture stopped by user.")
         finally:
+            uploader.stop()
+            print(f"Uploaded {uploader.uploaded} images, {uploader.spool_size()} waiting on disk, "
+                  f"{gate.dropped} unchanged frames skipped.")
             cv2.destroyAllWindows()
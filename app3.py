@@ -1,69 +1,148 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+from firebase_admin import storage
 import cv2
-import base64
 import numpy as np
-import time
+import os
+import threading
+from image_storage import FirebaseBlobStore, FirestoreStorage, LocalBlobStore, SQLiteStorage, image_bytes
+
+# Directorio para los datos que deben sobrevivir a un reinicio
+DATA_DIR = os.environ.get("ELEMENTEDGE_DATA_DIR", "data")
+# Bucket de Firebase Storage con las imágenes (p. ej. "<proyecto>.appspot.com")
+STORAGE_BUCKET = os.environ.get("ELEMENTEDGE_STORAGE_BUCKET")
 
 # Inicializa la aplicación de Firebase Admin
 def initialize_firestore(service_account_key_path):
     try:
         cred = credentials.Certificate(service_account_key_path)
-        firebase_admin.initialize_app(cred)
+        firebase_admin.initialize_app(cred, {"storageBucket": STORAGE_BUCKET} if STORAGE_BUCKET else None)
         print("Firestore initialized successfully!")
         return firestore.client()
     except Exception as e:
         print(f"Error initializing Firestore: {e}")
         return None
 
-# Lee el último documento de Firestore
-def read_last_document(db, collection_name):
-    try:
-        docs = db.collection(collection_name).order_by("timestamp", direction=firestore.Query.DESCENDING).limit(1).stream()
-        for doc in docs:
-            return doc.to_dict()
-        return None
-    except Exception as e:
-        print(f"Error reading Firestore: {e}")
-        return None
+# Recibe los documentos nuevos de la suscripción y los decodifica en un hilo
+# propio, para que la ventana siga respondiendo mientras se descarga la imagen.
+# Solo se procesa el documento más reciente: si llegan varios mientras se
+# decodifica uno, los intermedios se saltan, y un documento ya mostrado no se
+# vuelve a decodificar.
+class ImageViewer:
+    def __init__(self, blob_store, thumbnail=False):
+        self.blob_store = blob_store
+        self.thumbnail = thumbnail
+        self.decoded = 0
+        self.skipped = 0
+        self._pending = None
+        self._current = None
+        self._decoded_key = None
+        self._image = None
+        self._image_seq = 0
+        self._running = True
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._decode_loop, name="image-decoder", daemon=True)
+        self._thread.start()
 
-# Decodifica una imagen base64 y la muestra
-def display_image_from_base64(image_base64):
-    try:
-        image_data = base64.b64decode(image_base64)
-        np_array = np.frombuffer(image_data, np.uint8)
-        image = cv2.imdecode(np_array, cv2.IMREAD_COLOR)
+    # Callback de la suscripción: se llama con el documento más reciente
+    def on_document(self, document_id, document):
+        with self._condition:
+            if (document_id, self.thumbnail) == self._decoded_key:
+                self.skipped += 1
+                return
+            self._pending = (document_id, document)
+            self._condition.notify()
 
-        if image is not None:
-            cv2.imshow("Last Captured Image", image)
-            cv2.waitKey(1)  # Actualiza la ventana sin pausar
-        else:
-            print("Error: Could not decode the image.")
-    except Exception as e:
-        print(f"Error displaying image: {e}")
+    # Alterna entre la miniatura y la imagen completa del documento actual
+    def toggle_thumbnail(self):
+        with self._condition:
+            self.thumbnail = not self.thumbnail
+            if self._pending is None and self._current is not None:
+                self._pending = self._current
+            self._condition.notify()
+
+    def _decode_loop(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    return
+                document_id, document = self._pending
+                self._pending = None
+                thumbnail = self.thumbnail
+            try:
+                image_data = image_bytes(document, self.blob_store, thumbnail)
+                if image_data is None:
+                    print("No valid image data found in the last document.")
+                    continue
+                image = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+                if image is None:
+                    print("Error: Could not decode the image.")
+                    continue
+            except Exception as e:
+                print(f"Error loading image: {e}")
+                continue
+            with self._condition:
+                self._current = (document_id, document)
+                self._decoded_key = (document_id, thumbnail)
+                self._image = image
+                self._image_seq += 1
+                self.decoded += 1
+
+    # Última imagen decodificada si es más nueva que `after_seq`: (seq, imagen)
+    def latest(self, after_seq=0):
+        with self._condition:
+            if self._image_seq <= after_seq:
+                return after_seq, None
+            return self._image_seq, self._image
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(timeout=1)
+
+# Almacenes de documentos e imágenes: Firestore y Firebase Storage, o lo que
+# app2.py guardó localmente con ELEMENTEDGE_IMAGE_STORAGE=local
+def open_storage(service_account_key_path):
+    if os.environ.get("ELEMENTEDGE_IMAGE_STORAGE") == "local":
+        return SQLiteStorage(os.path.join(DATA_DIR, "images.sqlite3")), LocalBlobStore(os.path.join(DATA_DIR, "blobs"))
+    db = initialize_firestore(service_account_key_path)
+    if not db:
+        return None, None
+    if not STORAGE_BUCKET:
+        print("Error: Set ELEMENTEDGE_STORAGE_BUCKET to read images from Firebase Storage.")
+        return None, None
+    return FirestoreStorage(db), FirebaseBlobStore(storage.bucket())
 
 if __name__ == "__main__":
     # Cambia el path por el archivo de tu clave de servicio
     service_account_key_path = "serviceAccountKey.json"
-    db = initialize_firestore(service_account_key_path)
 
-    if db:
+    document_storage, blob_store = open_storage(service_account_key_path)
+
+    if document_storage:
         collection_name = "images"
-        print("Displaying the latest image every 3 seconds. Press 'q' to stop.")
+        # La miniatura basta para monitorear; 'f' alterna con la imagen completa
+        viewer = ImageViewer(blob_store, os.environ.get("ELEMENTEDGE_VIEWER_IMAGE", "full") == "thumbnail")
+        # Las imágenes nuevas llegan por la suscripción, sin consultas periódicas
+        watch = document_storage.watch_latest(collection_name, viewer.on_document)
+        print("Displaying the latest image as it arrives. Press 'f' to toggle full/thumbnail, 'q' to stop.")
 
         try:
+            seq = 0
             while True:
-                last_document = read_last_document(db, collection_name)
-
-                if last_document and "image_base64" in last_document:
-                    display_image_from_base64(last_document["image_base64"])
-                else:
-                    print("No valid image data found in the last document.")
+                seq, image = viewer.latest(seq)
+                if image is not None:
+                    cv2.imshow("Last Captured Image", image)
 
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                key = cv2.waitKey(50) & 0xFF  # Mantiene la ventana respondiendo
+                if key == ord('q'):
                     print("Exiting image display.")
                     break
-
-                time.sleep(3)  # Espera 3 segundos antes de actualizar
+                if key == ord('f'):
+                    viewer.toggle_thumbnail()
         finally:
+            watch.unsubscribe()
+            viewer.stop()
             cv2.destroyAllWindows()
@@ -0,0 +1,310 @@
+// Canal de eventos en vivo: recibe por /events (Server-Sent Events) los signos
+// vitales, la vista general de los responders, las posiciones, los mensajes
+// del chat, las respuestas del agente mientras se generan, las alertas y los
+// cambios de marcadores, y los guarda en
+// buffers que los callbacks del navegador aplican a los componentes de Dash.
+(function () {
+    // Debe coincidir con VITALS_WINDOW y las señales de app.py
+    var VITALS_WINDOW = 10;
+    var SIGNALS = ["heart_rate", "oxygen_level", "temperature", "blood_pressure"];
+    // Alertas que se muestran a la vez en el panel de detalles
+    var MAX_ALERTS = 5;
+
+    var live = {
+        vitals: {},       // responder -> muestras pendientes de graficar
+        lastSample: {},   // responder -> última marca de tiempo recibida
+        overview: null,   // vista general pendiente de mostrar
+        lastOverview: [], // última vista general mostrada
+        overviewResponder: null,
+        positions: {},    // id de marcador -> [lat, lon] pendiente
+        chat: [],         // mensajes nuevos pendientes de mostrar
+        olderChat: [],    // página de mensajes anteriores pendiente de mostrar
+        partial: {},      // petición al agente -> respuesta recibida hasta ahora
+        partialChanged: false,
+        alerts: [],       // alertas nuevas pendientes de mostrar
+        markersChanged: false,
+        lastChatId: 0,
+        oldestChatId: null,
+        chatExhausted: false,
+        loadingChat: false,
+        channel: null,
+    };
+    window.elementEdgeLive = live;
+
+    // Canal de chat de esta sesión (se conserva al recargar la pestaña)
+    live.channel = window.sessionStorage.getItem("elementEdgeChatChannel");
+    if (!live.channel) {
+        live.channel = "session-" + Date.now().toString(36) + Math.random().toString(36).slice(2, 10);
+        window.sessionStorage.setItem("elementEdgeChatChannel", live.channel);
+    }
+
+    function pendingVitals(responder) {
+        if (!live.vitals[responder]) {
+            live.vitals[responder] = {t: []};
+            SIGNALS.forEach(function (signal) { live.vitals[responder][signal] = []; });
+        }
+        return live.vitals[responder];
+    }
+
+    function onVitals(event) {
+        var data = JSON.parse(event.data);
+        Object.keys(data).forEach(function (responder) {
+            var samples = data[responder];
+            var pending = pendingVitals(responder);
+            var last = live.lastSample[responder] || 0;
+            samples.t.forEach(function (t, i) {
+                // Ignora muestras repetidas tras una reconexión
+                if (t <= last) { return; }
+                last = t;
+                pending.t.push(t);
+                SIGNALS.forEach(function (signal) { pending[signal].push(samples[signal][i]); });
+            });
+            live.lastSample[responder] = last;
+            // Solo interesan las últimas VITALS_WINDOW muestras
+            var excess = pending.t.length - VITALS_WINDOW;
+            if (excess > 0) {
+                pending.t.splice(0, excess);
+                SIGNALS.forEach(function (signal) { pending[signal].splice(0, excess); });
+            }
+        });
+    }
+
+    function onOverview(event) {
+        live.overview = JSON.parse(event.data);
+    }
+
+    function onPositions(event) {
+        Object.assign(live.positions, JSON.parse(event.data));
+    }
+
+    function onChat(event) {
+        JSON.parse(event.data).forEach(function (message) {
+            // La respuesta completa reemplaza a la parcial
+            if (message.request !== undefined && live.partial[message.request] !== undefined) {
+                delete live.partial[message.request];
+                live.partialChanged = true;
+            }
+            if (message.id > live.lastChatId) {
+                live.chat.push(message);
+                live.lastChatId = message.id;
+                if (live.oldestChatId === null) { live.oldestChatId = message.id; }
+            }
+        });
+    }
+
+    function onPartial(event) {
+        var data = JSON.parse(event.data);
+        live.partial[data.request] = data;
+        live.partialChanged = true;
+    }
+
+    function onAlert(event) {
+        live.alerts.push(JSON.parse(event.data));
+    }
+
+    function onMarkers() {
+        live.markersChanged = true;
+    }
+
+    // Al llegar al inicio del historial pide la página anterior de mensajes
+    function onScroll(event) {
+        var history = event.target;
+        if (history.id !== "chat-history" || history.scrollTop > 0) { return; }
+        if (live.loadingChat || live.chatExhausted || live.oldestChatId === null) { return; }
+        live.loadingChat = true;
+        var url = "/api/chat/" + encodeURIComponent(live.channel) + "?before=" + live.oldestChatId;
+        fetch(url)
+            .then(function (response) { return response.json(); })
+            .then(function (messages) {
+                if (!messages.length) {
+                    live.chatExhausted = true;
+                    return;
+                }
+                live.oldestChatId = messages[0].id;
+                live.olderChat = messages.concat(live.olderChat);
+            })
+            .catch(function () {})
+            .then(function () { live.loadingChat = false; });
+    }
+    document.addEventListener("scroll", onScroll, true);
+
+    function chatElement(message) {
+        return {
+            type: "Div",
+            namespace: "dash_html_components",
+            props: {children: message.author + ": " + message.text, style: {marginBottom: "5px"}},
+        };
+    }
+
+    // EventSource se reconecta solo si la conexión se corta
+    var source = new EventSource("/events?channel=" + encodeURIComponent(live.channel));
+    source.addEventListener("vitals", onVitals);
+    source.addEventListener("overview", onOverview);
+    source.addEventListener("positions", onPositions);
+    source.addEventListener("chat", onChat);
+    source.addEventListener("chat_partial", onPartial);
+    source.addEventListener("alert", onAlert);
+    source.addEventListener("markers", onMarkers);
+    // El servidor cierra el canal si esta pestaña se atrasa; al reconectarse
+    // recibe de nuevo los signos vitales y el chat, y los marcadores se redibujan
+    var connected = false;
+    source.addEventListener("open", function () {
+        if (connected) { live.markersChanged = true; }
+        connected = true;
+    });
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        live: {
+            // extendData para los cuatro gráficos con las muestras nuevas del
+            // responder seleccionado, sin las que el servidor ya puso en los gráficos
+            vitals: function (n_intervals, responder) {
+                var noUpdate = window.dash_clientside.no_update;
+                var pending = live.vitals[responder.id];
+                if (!pending || !pending.t.length) {
+                    return SIGNALS.map(function () { return noUpdate; });
+                }
+                delete live.vitals[responder.id];
+                var start = 0;
+                while (start < pending.t.length && pending.t[start] <= responder.after) { start++; }
+                if (start === pending.t.length) {
+                    return SIGNALS.map(function () { return noUpdate; });
+                }
+                var x = pending.t.slice(start);
+                return SIGNALS.map(function (signal) {
+                    return [{x: [x], y: [pending[signal].slice(start)]}, [0], VITALS_WINDOW];
+                });
+            },
+
+            // Grilla con la mini gráfica y el último valor de cada responder
+            overview: function (n_intervals, responder) {
+                if (!live.overview && live.overviewResponder === responder.id) {
+                    return window.dash_clientside.no_update;
+                }
+                if (live.overview) {
+                    live.lastOverview = live.overview;
+                    live.overview = null;
+                }
+                live.overviewResponder = responder.id;
+                return live.lastOverview.map(function (entry) {
+                    var className = "responder-cell";
+                    if (entry.responder === responder.id) { className += " responder-selected"; }
+                    if (entry.alert) { className += " responder-alert"; }
+                    var children = [
+                        {type: "Div", namespace: "dash_html_components", props: {children: entry.name, className: "responder-name"}},
+                    ];
+                    if (entry.sparkline) {
+                        children.push({type: "Img", namespace: "dash_html_components", props: {src: entry.sparkline}});
+                    }
+                    children.push({
+                        type: "Span",
+                        namespace: "dash_html_components",
+                        props: {children: entry.value === null ? "--" : Math.round(entry.value) + " bpm"},
+                    });
+                    return {
+                        type: "Div",
+                        namespace: "dash_html_components",
+                        props: {
+                            id: {type: "responder-cell", index: entry.responder},
+                            className: className,
+                            title: entry.name,
+                            children: children,
+                        },
+                    };
+                });
+            },
+
+            // Responder de la celda pulsada. Las celdas recién dibujadas también
+            // disparan el callback, sin clics; esas no cambian nada
+            cellClick: function (n_clicks) {
+                var triggered = window.dash_clientside.callback_context.triggered;
+                if (triggered.length !== 1 || !triggered[0].value) {
+                    return window.dash_clientside.no_update;
+                }
+                var propId = triggered[0].prop_id;
+                return JSON.parse(propId.slice(0, propId.lastIndexOf("."))).index;
+            },
+
+            // Posiciones nuevas solo para los marcadores visibles que se movieron
+            positions: function (n_intervals, ids) {
+                var noUpdate = window.dash_clientside.no_update;
+                var positions = live.positions;
+                var changed = false;
+                // Los marcadores fuera de la vista se dibujan con su posición actual al volver a ella
+                live.positions = {};
+                var updates = ids.map(function (id) {
+                    var position = positions[id.index];
+                    if (position === undefined) { return noUpdate; }
+                    changed = true;
+                    return position;
+                });
+                return changed ? updates : ids.map(function () { return noUpdate; });
+            },
+
+            // Agrega al final los mensajes nuevos y al principio las páginas anteriores
+            chat: function (n_intervals, children) {
+                if (!live.chat.length && !live.olderChat.length) {
+                    return window.dash_clientside.no_update;
+                }
+                var older = live.olderChat.map(chatElement);
+                var newer = live.chat.map(chatElement);
+                live.olderChat = [];
+                live.chat = [];
+                if (older.length) {
+                    // Mantiene a la vista el mensaje que el usuario estaba leyendo
+                    var history = document.getElementById("chat-history");
+                    var previousHeight = history ? history.scrollHeight : 0;
+                    window.setTimeout(function () {
+                        if (history) { history.scrollTop = history.scrollHeight - previousHeight; }
+                    }, 0);
+                }
+                return older.concat(children || [], newer);
+            },
+
+            // Respuestas del agente que aún se están generando
+            partial: function (n_intervals) {
+                if (!live.partialChanged) {
+                    return window.dash_clientside.no_update;
+                }
+                live.partialChanged = false;
+                return Object.keys(live.partial).map(function (request) {
+                    return chatElement(live.partial[request]);
+                });
+            },
+
+            // Agrega arriba las alertas nuevas y conserva las MAX_ALERTS más recientes
+            alerts: function (n_intervals, children) {
+                if (!live.alerts.length) {
+                    return window.dash_clientside.no_update;
+                }
+                var newer = live.alerts.reverse().map(function (alert) {
+                    var time = new Date(alert.timestamp * 1000).toLocaleTimeString();
+                    return {
+                        type: "Div",
+                        namespace: "dash_html_components",
+                        props: {
+                            children: time + " " + alert.message,
+                            className: "alert alert-danger",
+                            style: {padding: "4px 8px", marginBottom: "4px"},
+                        },
+                    };
+                });
+                live.alerts = [];
+                return newer.concat(children || []).slice(0, MAX_ALERTS);
+            },
+
+            // Pide redibujar los marcadores de la vista si se agregaron o retiraron
+            markers: function (n_intervals, version) {
+                if (!live.markersChanged) {
+                    return window.dash_clientside.no_update;
+                }
+                live.markersChanged = false;
+                return (version || 0) + 1;
+            },
+
+            // Comparte con el servidor el canal de chat de esta sesión
+            channel: function (modified_timestamp, data) {
+                return data === live.channel ? window.dash_clientside.no_update : live.channel;
+            },
+        },
+    });
+})();
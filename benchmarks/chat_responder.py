@@ -0,0 +1,67 @@
+# Benchmark del pool de respuestas del chat: muchos usuarios envían mensajes a
+# un agente simulado con latencia configurable y se mide la latencia de punta
+# a punta, el tiempo hasta el primer fragmento y la utilización de los workers.
+#
+# Uso (desde la raíz del repositorio):
+#   python -m benchmarks.chat_responder --users 50 --messages 5 --workers 8 --latency 0.2
+import argparse
+import random
+import time
+
+import numpy as np
+
+from chat_responder import ChatResponderPool, EchoResponder
+
+
+# Percentiles en milisegundos de una lista de duraciones en segundos
+def describe(durations):
+    p50, p95, p99 = np.percentile(np.asarray(durations) * 1000, (50, 95, 99))
+    return f"p50 {p50:.0f} ms, p95 {p95:.0f} ms, p99 {p99:.0f} ms"
+
+
+def run(users, messages, workers, per_channel_limit, latency, token_delay, duplicates, seed=0):
+    rng = random.Random(seed)
+    tokens = []
+    pool = ChatResponderPool(
+        EchoResponder(latency, token_delay),
+        workers=workers,
+        per_channel_limit=per_channel_limit,
+        on_token=lambda request, token: tokens.append(token),
+        history_size=users * messages,
+    )
+    # Los usuarios escriben de forma intercalada; una fracción reenvía su último mensaje
+    plan = [(f"user-{user}", f"message {i} from user {user}") for i in range(messages) for user in range(users)]
+    rng.shuffle(plan)
+
+    started = time.perf_counter()
+    for channel, message in plan:
+        pool.submit(channel, message)
+        if rng.random() < duplicates:
+            pool.submit(channel, message)
+    pool.join()
+    elapsed = time.perf_counter() - started
+    utilization = pool.utilization()
+    pool.shutdown()
+
+    finished = list(pool.finished)
+    print(f"{pool.submitted} requests ({pool.deduplicated} duplicates dropped) from {users} users "
+          f"on {workers} workers in {elapsed:.2f}s -> {pool.completed / elapsed:.1f} replies/s, "
+          f"{len(tokens)} tokens streamed")
+    print(f"End to end:  {describe([r.finished_at - r.submitted_at for r in finished])}")
+    print(f"First token: {describe([r.first_token_at - r.submitted_at for r in finished])}")
+    print(f"Queued:      {describe([r.started_at - r.submitted_at for r in finished])}")
+    print(f"Worker utilization: {utilization:.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat responder pool benchmark")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=5, help="Messages per user")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--per-user", type=int, default=1, help="Concurrent replies per user")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between tokens")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="Fraction of messages sent twice")
+    args = parser.parse_args()
+
+    run(args.users, args.messages, args.workers, args.per_user, args.latency, args.token_delay, args.duplicates)
@@ -0,0 +1,110 @@
+# Benchmark de la detección de peligros: reproduce un video grabado (o la escena
+# sintética) como si fuera la cámara, con clientes de video leyendo cuadros, y
+# compara los cuadros por segundo y la latencia de los clientes sin y con el
+# hilo de detección. También informa el ritmo y la latencia de la detección.
+#
+# Uso (desde la raíz del repositorio):
+#   python -m benchmarks.hazard_detection --seconds 10 [--video clip.mp4] [--delay 0.05]
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from frame_broadcaster import FrameBroadcaster
+from hazard_detection import DNNDetector, FireColorDetector, HazardDetectionWorker
+from video_sources import SyntheticVideoSource, VideoFileSource
+
+
+# Agrega una demora fija por lote, para simular un modelo más pesado
+class DelayedDetector:
+    def __init__(self, detector, delay):
+        self.detector = detector
+        self.delay = delay
+
+    def detect(self, images):
+        time.sleep(self.delay)
+        return self.detector.detect(images)
+
+
+def percentiles_ms(values):
+    if not len(values):
+        return "n/a"
+    p50, p95 = np.percentile(np.asarray(values) * 1000, (50, 95))
+    return f"p50 {p50:.1f} ms, p95 {p95:.1f} ms"
+
+
+# Cliente de video: toma siempre el último cuadro codificado, como /video_feed
+def consume(broadcaster, stop, latencies, counts, index):
+    seq = 0
+    while not stop.is_set():
+        frame = broadcaster.latest(seq)
+        if frame is None:
+            continue
+        seq = frame.seq
+        broadcaster.encode(frame)
+        latencies.append(time.monotonic() - frame.captured_at)
+        counts[index] += 1
+
+
+def run(source, seconds, clients, detector=None, input_width=320, max_batch=8):
+    broadcaster = FrameBroadcaster(source, buffer_size=max_batch)
+    stop = threading.Event()
+    latencies = []
+    counts = [0] * clients
+    threads = [
+        threading.Thread(target=consume, args=(broadcaster, stop, latencies, counts, i), daemon=True)
+        for i in range(clients)
+    ]
+    worker = None
+    if detector is not None:
+        worker = HazardDetectionWorker(broadcaster, detector, input_width=input_width, max_batch=max_batch)
+    broadcaster.start()
+    for thread in threads:
+        thread.start()
+    if worker is not None:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    if worker is not None:
+        worker.stop()
+    broadcaster.stop()
+    for thread in threads:
+        thread.join(timeout=2)
+    return sum(counts) / clients / seconds, latencies, worker
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hazard detection pipeline benchmark")
+    parser.add_argument("--video", help="Recorded video used as the camera (default: synthetic scene)")
+    parser.add_argument("--fps", type=float, default=30.0, help="Synthetic scene frame rate")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=2, help="Concurrent video viewers")
+    parser.add_argument("--input-width", type=int, default=320)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--delay", type=float, default=0.0, help="Extra seconds per batch to simulate a heavier model")
+    parser.add_argument("--model", help="OpenCV DNN model (SSD-style output) instead of the color detector")
+    parser.add_argument("--labels", default="background,fire,smoke,person")
+    args = parser.parse_args()
+
+    def open_source():
+        if args.video:
+            return VideoFileSource(args.video)
+        return SyntheticVideoSource(fps=args.fps)
+
+    detector = DNNDetector(args.model, args.labels.split(",")) if args.model else FireColorDetector()
+    if args.delay:
+        detector = DelayedDetector(detector, args.delay)
+
+    fps, latencies, _ = run(open_source(), args.seconds, args.clients)
+    print(f"Video only:     {fps:.1f} fps per client, frame latency {percentiles_ms(latencies)}")
+
+    fps_detect, latencies_detect, worker = run(
+        open_source(), args.seconds, args.clients, detector, args.input_width, args.max_batch
+    )
+    added = np.percentile(latencies_detect, 50) - np.percentile(latencies, 50) if latencies and latencies_detect else 0
+    print(f"With detection: {fps_detect:.1f} fps per client, frame latency {percentiles_ms(latencies_detect)} "
+          f"({added * 1000:+.1f} ms p50)")
+    print(f"Detection:      {worker.processed / args.seconds:.1f} frames/s in {worker.batches} batches "
+          f"(mean {np.mean(worker.batch_sizes or [0]):.1f} frames), {worker.skipped} skipped, "
+          f"{worker.detections} detections, capture-to-result {percentiles_ms(worker.latencies)}")
@@ -0,0 +1,111 @@
+# Benchmark de la ingesta serie: reproduce muchos dispositivos simulados con el
+# protocolo de texto de sensor_simulation.ino y mide el rendimiento del parser
+# y del ingestor completo (ptys + selectors + lotes al almacén).
+#
+# Uso (desde la raíz del repositorio):
+#   python -m benchmarks.serial_ingestion --devices 200 --seconds 60 [--protocol binary]
+import argparse
+import os
+import random
+import threading
+import time
+import tty
+
+from sensor_frames import FRAME_SIGNALS, encode_frames
+from serial_ingestion import PARSERS, SerialIngestor, SerialSource, format_text_record
+from vitals_store import VitalsStore
+
+
+# Genera `seconds` lecturas (una por segundo) de un dispositivo simulado
+def simulate_device(seconds, seed, protocol="text"):
+    rng = random.Random(seed)
+    readings = [
+        {
+            "blood_pressure": rng.uniform(90, 140),
+            "heart_rate": rng.uniform(60, 100),
+            "oxygen_level": rng.uniform(90, 100),
+            "temperature": rng.uniform(36, 38),
+        }
+        for _ in range(seconds)
+    ]
+    if protocol == "binary":
+        values = [[reading[signal] for signal in FRAME_SIGNALS] for reading in readings]
+        return encode_frames(seed, range(seconds), [1000 * i for i in range(seconds)], values)
+    return b"".join(format_text_record(reading) for reading in readings)
+
+
+# Mide solo el parser, entregándole bloques pequeños como los de un puerto serie
+def benchmark_parser(streams, chunk_size, protocol="text"):
+    records = 0
+    started = time.perf_counter()
+    for stream in streams:
+        parser = PARSERS[protocol]()
+        for offset in range(0, len(stream), chunk_size):
+            records += len(parser.feed(stream[offset:offset + chunk_size]))
+    elapsed = time.perf_counter() - started
+    return records, elapsed
+
+
+# Reproduce todos los dispositivos a la vez a través de ptys y mide el ingestor
+def benchmark_replay(streams, chunk_size, expected_records, protocol="text"):
+    store = VitalsStore(retention_seconds=max(60, expected_records // max(1, len(streams))))
+    masters = []
+    slaves = []
+    sources = []
+    for i in range(len(streams)):
+        master, slave = os.openpty()
+        # Modo crudo antes de escribir: sin eco hacia el maestro ni límite de línea
+        tty.setraw(slave)
+        masters.append(master)
+        slaves.append(slave)
+        sources.append(SerialSource(f"responder_{i}", os.ttyname(slave), parser=PARSERS[protocol]()))
+
+    ingestor = SerialIngestor(store, sources)
+
+    def write_all():
+        offsets = [0] * len(streams)
+        remaining = set(range(len(streams)))
+        while remaining:
+            for i in list(remaining):
+                chunk = streams[i][offsets[i]:offsets[i] + chunk_size]
+                if not chunk:
+                    remaining.discard(i)
+                    continue
+                os.write(masters[i], chunk)
+                offsets[i] += len(chunk)
+
+    started = time.perf_counter()
+    ingestor.start()
+    writer = threading.Thread(target=write_all, daemon=True)
+    writer.start()
+    writer.join()
+    while ingestor.records < expected_records and time.perf_counter() - started < 120:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    ingestor.stop()
+    for fd in masters + slaves:
+        os.close(fd)
+    return ingestor.records, ingestor.batches, elapsed, len(store.responders())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serial ingestion throughput benchmark")
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--seconds", type=int, default=60, help="Readings per device (1 Hz)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Bytes per simulated serial read")
+    parser.add_argument("--protocol", choices=sorted(PARSERS), default="text")
+    args = parser.parse_args()
+
+    streams = [simulate_device(args.seconds, seed, args.protocol) for seed in range(args.devices)]
+    expected = args.devices * args.seconds
+    total_bytes = sum(len(stream) for stream in streams)
+    print(f"{args.devices} devices x {args.seconds} readings = {expected} records, {total_bytes / 1e6:.1f} MB")
+
+    records, elapsed = benchmark_parser(streams, args.chunk_size, args.protocol)
+    print(f"Parser: {records} records in {elapsed:.3f}s -> {records / elapsed:,.0f} records/s, "
+          f"{total_bytes / elapsed / 1e6:.1f} MB/s")
+
+    records, batches, elapsed, responders = benchmark_replay(streams, args.chunk_size, expected, args.protocol)
+    print(f"Replay: {records} records from {responders} devices in {elapsed:.3f}s "
+          f"({batches} batches) -> {records / elapsed:,.0f} records/s, "
+          f"{records / elapsed / args.devices:.1f}x real time per device at 1 Hz")
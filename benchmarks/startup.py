@@ -0,0 +1,92 @@
+# Mide el arranque del tablero en procesos nuevos, como un proceso de Gunicorn
+# recién creado: importar app.py, crear la aplicación (arrancar los servicios),
+# responder la primera página, entregar el primer cuadro de /video_feed (cuando
+# se abre la cámara) y liberar la cámara después de que se va el último cliente.
+#
+# Uso (desde la raíz del repositorio):
+#   python -m benchmarks.startup --runs 5 [--video synthetic] [--idle-timeout 1]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+STEPS = ("import", "create_app", "first_page", "first_frame", "camera_release")
+
+
+# Se ejecuta en el proceso hijo: mide cada paso e imprime los tiempos como JSON
+def measure_child():
+    timings = {}
+    started = time.perf_counter()
+    import app as dashboard
+    timings["import"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    dashboard.create_app()
+    timings["create_app"] = time.perf_counter() - started
+
+    client = dashboard.app.server.test_client()
+    started = time.perf_counter()
+    client.get("/")
+    client.get("/_dash-layout")
+    timings["first_page"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    response = client.get("/video_feed", buffered=False)
+    next(iter(response.response))
+    timings["first_frame"] = time.perf_counter() - started
+    response.close()
+
+    started = time.perf_counter()
+    broadcaster = dashboard.frame_broadcaster
+    while broadcaster.capture is not None and time.perf_counter() - started < 30:
+        time.sleep(0.01)
+    timings["camera_release"] = time.perf_counter() - started
+    print(json.dumps(timings))
+
+
+def run(runs, video, idle_timeout):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as data_dir:
+            env = dict(
+                os.environ,
+                ELEMENTEDGE_DATA_DIR=data_dir,
+                ELEMENTEDGE_VIDEO_SOURCE=video,
+                ELEMENTEDGE_CAMERA_IDLE_TIMEOUT=str(idle_timeout),
+            )
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.startup", "--child"],
+                cwd=root,
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dashboard startup time benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--video", default="synthetic", help="Video source: camera index, file path or synthetic")
+    parser.add_argument("--idle-timeout", type=float, default=1.0, help="Seconds without viewers before releasing the camera")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure_child()
+        sys.exit(0)
+
+    results = run(args.runs, args.video, args.idle_timeout)
+    print(f"{args.runs} fresh processes, video source {args.video!r}, idle timeout {args.idle_timeout:g}s")
+    for step in STEPS:
+        values = [result[step] * 1000 for result in results]
+        print(f"{step:>15}: median {statistics.median(values):7.1f} ms, max {max(values):7.1f} ms")
+    ready = [result["import"] + result["create_app"] + result["first_page"] for result in results]
+    print(f"{'ready to serve':>15}: median {statistics.median(ready) * 1000:7.1f} ms")
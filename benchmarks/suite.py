@@ -0,0 +1,651 @@
+# Suite de benchmarks de carga, sin red ni hardware. Cada escenario corre en
+# procesos nuevos y se compara con una línea base guardada, para detectar
+# regresiones antes de instalar una versión en los camiones:
+#
+#   dashboard  N navegadores simulados contra el servidor real (HTTP local):
+#              cargan la página, mueven el mapa, seleccionan marcadores y
+#              cambian de responder (los callbacks de servidor de Dash),
+#              mientras reciben /events y llegan posiciones GPS por lotes
+#   video      M clientes de /video_feed con un video grabado como cámara
+#              (--video, o un clip de la escena sintética grabado al inicio)
+#   serial     dispositivos simulados con el protocolo de sensor_simulation.ino
+#              por ptys (ver benchmarks/serial_ingestion.py)
+#   uploads    las subidas de app2.py contra un almacén local (SQLite y un
+#              directorio) que imita la demora de Firestore con --write-latency
+#
+# Cada escenario informa rendimiento (*_per_s), latencias (p50/p95/p99 en ms)
+# y memoria máxima del proceso medido (MB). Los servidores corren con los
+# datos en un directorio temporal.
+#
+# Uso (desde la raíz del repositorio):
+#   python -m benchmarks.suite [--scenarios dashboard,video] [--clients 20] [--viewers 8] [--seconds 20]
+#   python -m benchmarks.suite --save-baseline      # guarda benchmarks/baseline.json
+#   python -m benchmarks.suite --tolerance 0.15     # sale con código 1 si algo empeoró más del 15%
+import argparse
+import http.client
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+SCENARIOS = ("dashboard", "video", "serial", "uploads")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# Vista inicial del mapa y responders simulados, igual que en app.py
+MAP_CENTER = (34.0522, -118.2437)
+RESPONDERS = [f"responder_{i}" for i in range(10)]
+
+VITALS_OUTPUTS = (
+    ("vitals-responder", "data"),
+    ("vitals-title", "children"),
+    ("heart_rate_graph", "figure"),
+    ("oxygen_level_graph", "figure"),
+    ("temperature_graph", "figure"),
+    ("blood_pressure_graph", "figure"),
+)
+
+
+def percentiles(values, prefix):
+    if not len(values):
+        return {}
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1000, (50, 95, 99))
+    return {f"{prefix}_p50_ms": p50, f"{prefix}_p95_ms": p95, f"{prefix}_p99_ms": p99}
+
+
+def own_peak_memory_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Memoria máxima (VmHWM) de otro proceso; None fuera de Linux
+def peak_memory_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+# Graba unos segundos de la escena sintética como video, para usarlo de cámara
+def record_video(path, seconds=10, fps=30):
+    from video_sources import SyntheticVideoSource
+
+    source = SyntheticVideoSource(fps=fps, frames=int(seconds * fps), realtime=False)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (source.width, source.height))
+    while True:
+        success, image = source.read()
+        if not success:
+            break
+        writer.write(image)
+    writer.release()
+    return path
+
+
+# Se ejecuta en el proceso del servidor: la aplicación completa en un puerto libre
+def serve_child():
+    import logging
+
+    from werkzeug.serving import make_server
+
+    import app as dashboard
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, dashboard.create_server(), threaded=True)
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+
+# El tablero en un proceso aparte, con sus datos en un directorio temporal
+class DashboardServer:
+    def __init__(self, video, camera_idle_timeout=30):
+        self.video = video
+        self.camera_idle_timeout = camera_idle_timeout
+
+    def __enter__(self):
+        self._data_dir = tempfile.TemporaryDirectory()
+        env = dict(
+            os.environ,
+            ELEMENTEDGE_DATA_DIR=self._data_dir.name,
+            ELEMENTEDGE_VIDEO_SOURCE=self.video,
+            ELEMENTEDGE_CAMERA_IDLE_TIMEOUT=str(self.camera_idle_timeout),
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.suite", "--serve"],
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        self.port = int(self.process.stdout.readline())
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+        self._data_dir.cleanup()
+
+    def connection(self, timeout=30):
+        return http.client.HTTPConnection("127.0.0.1", self.port, timeout=timeout)
+
+    def peak_memory_mb(self):
+        return peak_memory_mb(self.process.pid)
+
+    # Valores de /metrics: {"nombre{etiquetas}": valor}
+    def metrics(self):
+        connection = self.connection()
+        connection.request("GET", "/metrics")
+        text = connection.getresponse().read().decode("utf-8")
+        connection.close()
+        values = {}
+        for line in text.splitlines():
+            if line and not line.startswith("#"):
+                name, _, value = line.rpartition(" ")
+                values[name] = float(value)
+        return values
+
+
+# Petición JSON; devuelve (estado, cuerpo decodificado o None)
+def request_json(connection, method, path, body=None):
+    payload = None if body is None else json.dumps(body)
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    connection.request(method, path, body=payload, headers=headers)
+    response = connection.getresponse()
+    data = response.read()
+    return response.status, json.loads(data) if data and response.status == 200 else None
+
+
+# Ids de los marcadores en la respuesta de un callback
+def marker_ids(value):
+    ids = []
+    if isinstance(value, dict):
+        component_id = value.get("id")
+        if isinstance(component_id, dict) and component_id.get("type") == "marker":
+            ids.append(component_id["index"])
+        for child in value.values():
+            ids.extend(marker_ids(child))
+    elif isinstance(value, list):
+        for child in value:
+            ids.extend(marker_ids(child))
+    return ids
+
+
+def random_view(rng):
+    zoom = rng.randint(11, 16)
+    center = (MAP_CENTER[0] + rng.uniform(-0.03, 0.03), MAP_CENTER[1] + rng.uniform(-0.03, 0.03))
+    degrees_per_pixel = 360.0 / (256 * 2 ** zoom)
+    half_lat, half_lon = 400 * degrees_per_pixel, 600 * degrees_per_pixel
+    bounds = [[center[0] - half_lat, center[1] - half_lon], [center[0] + half_lat, center[1] + half_lon]]
+    return bounds, zoom
+
+
+def visible_markers_request(bounds, zoom, selected):
+    return {
+        "output": "marker-layer.children",
+        "outputs": {"id": "marker-layer", "property": "children"},
+        "inputs": [
+            {"id": "map", "property": "bounds", "value": bounds},
+            {"id": "map", "property": "zoom", "value": zoom},
+            {"id": "marker-refresh", "property": "data", "value": None},
+        ],
+        "changedPropIds": ["map.bounds", "map.zoom"],
+        "state": [{"id": "selected-marker", "property": "data", "value": selected}],
+    }
+
+
+def marker_selection_request(ids, chosen, selected):
+    def wildcard(marker_id):
+        return {"index": marker_id, "type": "marker"}
+
+    return {
+        "output": '..{"index":["ALL"],"type":"marker"}.icon...details.children...selected-marker.data..',
+        "outputs": [
+            [{"id": wildcard(marker_id), "property": "icon"} for marker_id in ids],
+            {"id": "details", "property": "children"},
+            {"id": "selected-marker", "property": "data"},
+        ],
+        "inputs": [[
+            {"id": wildcard(marker_id), "property": "n_clicks", "value": 1 if marker_id == chosen else None}
+            for marker_id in ids
+        ]],
+        "changedPropIds": [json.dumps(wildcard(chosen), separators=(",", ":")) + ".n_clicks"],
+        "state": [{"id": "selected-marker", "property": "data", "value": selected}],
+    }
+
+
+# Cambio de responder por un marcador seleccionado o, con `responder_id`, por
+# una celda de la vista general (el navegador resuelve el clic y envía el id)
+def vitals_responder_request(marker_id, responder_id=None):
+    return {
+        "output": ".." + "...".join(f"{component}.{prop}" for component, prop in VITALS_OUTPUTS) + "..",
+        "outputs": [{"id": component, "property": prop} for component, prop in VITALS_OUTPUTS],
+        "inputs": [
+            {"id": "selected-marker", "property": "data", "value": marker_id},
+            {"id": "selected-responder", "property": "data", "value": responder_id},
+        ],
+        "changedPropIds": ["selected-responder.data" if responder_id else "selected-marker.data"],
+        "state": [],
+    }
+
+
+# Cuenta los eventos de /events hasta que se cierra la conexión
+def read_events(connection, counts, index):
+    try:
+        connection.request("GET", "/events")
+        response = connection.getresponse()
+        for line in response:
+            if line.startswith(b"event:"):
+                counts[index] += 1
+    except (OSError, http.client.HTTPException):
+        pass
+
+
+def close_stream(connection):
+    try:
+        connection.sock.shutdown(socket.SHUT_RDWR)
+    except (AttributeError, OSError):
+        pass
+    connection.close()
+
+
+# Un navegador: carga la página y repite mover el mapa, elegir un marcador
+# visible y ver los signos vitales de su responder; la mitad de las veces
+# también pulsa una celda de la vista general
+def dashboard_client(server, deadline, seed, latencies, errors, interactions, index):
+    rng = random.Random(seed)
+    connection = server.connection()
+    started = time.perf_counter()
+    for path in ("/", "/_dash-layout", "/_dash-dependencies"):
+        connection.request("GET", path)
+        connection.getresponse().read()
+    latencies["page_load"].append(time.perf_counter() - started)
+
+    selected = None
+    while time.monotonic() < deadline:
+        bounds, zoom = random_view(rng)
+        steps = [("visible_markers", visible_markers_request(bounds, zoom, selected))]
+        if rng.random() < 0.5:
+            steps.append(("overview_cell", vitals_responder_request(selected, rng.choice(RESPONDERS))))
+        for name, body in steps:
+            started = time.perf_counter()
+            status, data = request_json(connection, "POST", "/_dash-update-component", body)
+            latencies[name].append(time.perf_counter() - started)
+            if status not in (200, 204):
+                errors[index] += 1
+                continue
+            ids = marker_ids(data) if name == "visible_markers" else []
+            if ids:
+                chosen = rng.choice(ids)
+                steps.append(("marker_selection", marker_selection_request(ids, chosen, selected)))
+                steps.append(("vitals_responder", vitals_responder_request(chosen)))
+                selected = chosen
+        interactions[index] += 1
+    connection.close()
+
+
+# Posiciones GPS de todos los marcadores, un lote cada `interval` segundos
+def location_feed(server, deadline, marker_count, sent, interval=0.5):
+    rng = random.Random(0)
+    connection = server.connection()
+    while time.monotonic() < deadline:
+        updates = [
+            {
+                "id": f"marker_{i}",
+                "lat": MAP_CENTER[0] + rng.uniform(-0.02, 0.02),
+                "lon": MAP_CENTER[1] + rng.uniform(-0.02, 0.02),
+            }
+            for i in range(marker_count)
+        ]
+        request_json(connection, "POST", "/api/locations", updates)
+        sent[0] += len(updates)
+        time.sleep(interval)
+    connection.close()
+
+
+def run_dashboard(args, video):
+    with DashboardServer(video) as server:
+        deadline = time.monotonic() + args.seconds
+        latencies = {name: [] for name in ("page_load", "visible_markers", "marker_selection", "vitals_responder", "overview_cell")}
+        errors = [0] * args.clients
+        interactions = [0] * args.clients
+        events = [0] * args.clients
+        sent = [0]
+        event_connections = [server.connection(timeout=None) for _ in range(args.clients)]
+        threads = [
+            threading.Thread(target=read_events, args=(connection, events, i), daemon=True)
+            for i, connection in enumerate(event_connections)
+        ]
+        threads += [
+            threading.Thread(
+                target=dashboard_client,
+                args=(server, deadline, i, latencies, errors, interactions, i),
+                daemon=True,
+            )
+            for i in range(args.clients)
+        ]
+        threads.append(threading.Thread(target=location_feed, args=(server, deadline, 10, sent), daemon=True))
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads[args.clients:]:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        for connection in event_connections:
+            close_stream(connection)
+
+        callbacks = sum(len(latencies[name]) for name in latencies if name != "page_load")
+        results = {
+            "interactions_per_s": sum(interactions) / elapsed,
+            "callbacks_per_s": callbacks / elapsed,
+            "events_per_s": sum(events) / elapsed / args.clients,
+            "locations_per_s": sent[0] / elapsed,
+            "errors": sum(errors),
+            "server_memory_mb": server.peak_memory_mb(),
+        }
+        for name, values in latencies.items():
+            results.update(percentiles(values, name))
+        return results
+
+
+# Un cliente de /video_feed: separa los cuadros por el límite del multipart y
+# anota cuándo llega cada uno
+def video_viewer(server, query, arrivals, received, index):
+    connection = server.connection(timeout=None)
+    started = time.perf_counter()
+    try:
+        connection.request("GET", "/video_feed" + query)
+        response = connection.getresponse()
+        pending = b""
+        while True:
+            chunk = response.read1(65536)
+            if not chunk:
+                break
+            received[index] += len(chunk)
+            # Se guardan los últimos bytes por si el límite quedó partido entre dos lecturas
+            pending += chunk
+            frames = pending.count(b"--frame\r\n")
+            if frames:
+                arrivals[index].extend([time.perf_counter() - started] * frames)
+            pending = pending[-8:]
+    except (OSError, http.client.HTTPException, ValueError):
+        pass
+
+
+def run_video(args, video):
+    with DashboardServer(video) as server:
+        arrivals = [[] for _ in range(args.viewers)]
+        received = [0] * args.viewers
+        threads = [
+            threading.Thread(target=video_viewer, args=(server, args.video_query, arrivals, received, i), daemon=True)
+            for i in range(args.viewers)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        elapsed = time.perf_counter() - started
+        metrics = server.metrics()
+        memory = server.peak_memory_mb()
+        server.process.terminate()
+        for thread in threads:
+            thread.join(timeout=5)
+
+    first_frames = [times[0] for times in arrivals if times]
+    gaps = np.concatenate([np.diff(times) for times in arrivals if len(times) > 1] or [[]])
+    results = {
+        "fps_per_viewer_per_s": sum(len(times) for times in arrivals) / elapsed / args.viewers,
+        "throughput_mb_per_s": sum(received) / elapsed / 1e6,
+        "viewers_without_frames": sum(1 for times in arrivals if not times),
+        "server_skipped_frames": metrics.get("video_frames_skipped_total", 0.0),
+        "server_encode_p95_ms": metrics.get('video_encode_seconds{quantile="0.95"}', float("nan")) * 1000,
+        "server_memory_mb": memory,
+    }
+    results.update(percentiles(first_frames, "first_frame"))
+    results.update(percentiles(gaps, "frame_gap"))
+    return results
+
+
+# Se ejecuta en un proceso propio: ingesta de varios dispositivos por ptys
+def run_serial(args):
+    from benchmarks.serial_ingestion import benchmark_parser, benchmark_replay, simulate_device
+
+    streams = [simulate_device(args.readings, seed, args.protocol) for seed in range(args.devices)]
+    expected = args.devices * args.readings
+    records, parse_elapsed = benchmark_parser(streams, 64, args.protocol)
+    replayed, batches, replay_elapsed, _ = benchmark_replay(streams, 64, expected, args.protocol)
+    return {
+        "parser_records_per_s": records / parse_elapsed,
+        "ingest_records_per_s": replayed / replay_elapsed,
+        "missing_records": expected - replayed,
+        "records_per_batch": replayed / max(1, batches),
+        "memory_mb": own_peak_memory_mb(),
+    }
+
+
+# Almacén de documentos o de archivos local con una demora fija por llamada,
+# como la ida y vuelta a Firestore o Firebase Storage
+class DelayedStorage:
+    def __init__(self, storage, delay):
+        self.storage = storage
+        self.delay = delay
+        self.max_batch_size = getattr(storage, "max_batch_size", None)
+
+    def write_batch(self, collection_name, documents):
+        time.sleep(self.delay)
+        return self.storage.write_batch(collection_name, documents)
+
+    def put(self, key, data, content_type="image/jpeg"):
+        time.sleep(self.delay)
+        return self.storage.put(key, data, content_type)
+
+
+# Se ejecuta en un proceso propio: sube documentos de imágenes como app2.py
+def run_uploads(args):
+    from image_storage import THUMBNAIL_QUALITY, THUMBNAIL_WIDTH, LocalBlobStore, SQLiteStorage, image_document
+    from image_uploader import ImageUploader
+    from video_sources import SyntheticVideoSource
+
+    source = SyntheticVideoSource(frames=10, realtime=False)
+    snapshots = []
+    for _ in range(10):
+        _, image = source.read()
+        height, width = image.shape[:2]
+        thumbnail = cv2.resize(image, (THUMBNAIL_WIDTH, round(height * THUMBNAIL_WIDTH / width)))
+        snapshots.append((
+            cv2.imencode(".jpg", image)[1].tobytes(),
+            cv2.imencode(".jpg", thumbnail, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])[1].tobytes(),
+            width,
+            height,
+        ))
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        storage = SQLiteStorage(os.path.join(data_dir, "images.sqlite3"))
+        uploader = ImageUploader(
+            DelayedStorage(storage, args.write_latency),
+            "images",
+            spool_dir=os.path.join(data_dir, "upload_spool"),
+            batch_size=20,
+            blob_store=DelayedStorage(LocalBlobStore(os.path.join(data_dir, "blobs")), args.write_latency),
+        )
+        uploader.start()
+        submit_times = []
+        started = time.perf_counter()
+        for i in range(args.documents):
+            image, thumbnail, width, height = snapshots[i % len(snapshots)]
+            data, blobs = image_document(f"image_{i:06d}", time.time(), image, thumbnail, width, height)
+            submitted = time.perf_counter()
+            uploader.submit(f"image_{i:06d}", data, blobs)
+            submit_times.append(time.perf_counter() - submitted)
+        while uploader.uploaded < args.documents and uploader.failures == 0 and time.perf_counter() - started < 300:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        uploader.stop()
+        stored = storage.count("images")
+        storage.close()
+
+    results = {
+        "documents_per_s": stored / elapsed,
+        "missing_documents": args.documents - stored,
+        "spooled_documents": uploader.spooled,
+        "memory_mb": own_peak_memory_mb(),
+    }
+    results.update(percentiles(submit_times, "submit"))
+    results.update(percentiles(list(uploader.write_seconds.values), "batch_write"))
+    results.update(percentiles(list(uploader.blob_seconds.values), "blob_put"))
+    return results
+
+
+CHILD_SCENARIOS = {"serial": run_serial, "uploads": run_uploads}
+
+
+# Corre un escenario en un proceso nuevo, para medir su memoria por separado
+def run_child(scenario, argv):
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.suite", "--child", scenario] + argv,
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+# Compara con la línea base: los *_per_s empeoran si bajan y el resto
+# (latencias, memoria, errores) si suben más que la tolerancia. Las latencias
+# que cambian menos de `min_ms` se consideran ruido.
+def compare(results, baseline, tolerance, min_ms=1.0):
+    rows = []
+    regressions = 0
+    for scenario, metrics in results.items():
+        for name, value in metrics.items():
+            previous = baseline.get(scenario, {}).get(name)
+            change = ""
+            flag = ""
+            if value is not None and previous:
+                ratio = value / previous - 1
+                change = f"{ratio * 100:+.1f}%"
+                worse = -ratio if name.endswith("_per_s") else ratio
+                if name.endswith("_ms") and abs(value - previous) < min_ms:
+                    worse = 0.0
+                if worse > tolerance:
+                    flag = "REGRESSION"
+                    regressions += 1
+                elif worse < -tolerance:
+                    flag = "improved"
+            elif value and previous == 0 and not name.endswith("_per_s"):
+                flag = "REGRESSION"
+                regressions += 1
+            rows.append((scenario, name, value, previous, change, flag))
+    return rows, regressions
+
+
+def format_value(value):
+    if value is None:
+        return "n/a"
+    return f"{value:,.1f}" if abs(value) >= 100 else f"{value:.3g}"
+
+
+def median_results(runs):
+    merged = {}
+    for scenario in runs[0]:
+        names = runs[0][scenario]
+        merged[scenario] = {
+            name: statistics.median([run[scenario][name] for run in runs if run[scenario].get(name) is not None])
+            if any(run[scenario].get(name) is not None for run in runs) else None
+            for name in names
+        }
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load and benchmark suite")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated: " + ", ".join(SCENARIOS))
+    parser.add_argument("--runs", type=int, default=1, help="Repetitions; the median of each metric is reported")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Duration of the dashboard and video scenarios")
+    parser.add_argument("--clients", type=int, default=20, help="Concurrent dashboard clients")
+    parser.add_argument("--viewers", type=int, default=8, help="Concurrent /video_feed clients")
+    parser.add_argument("--video", help="Recorded video used as the camera (default: a recorded synthetic clip)")
+    parser.add_argument("--video-query", default="", help="Query string for /video_feed, e.g. ?width=480&fps=10")
+    parser.add_argument("--devices", type=int, default=100, help="Simulated serial devices")
+    parser.add_argument("--readings", type=int, default=60, help="Readings per serial device")
+    parser.add_argument("--protocol", choices=("text", "binary"), default="text")
+    parser.add_argument("--documents", type=int, default=500, help="Image documents to upload")
+    parser.add_argument("--write-latency", type=float, default=0.05, help="Seconds per storage call, like Firestore")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change reported as a regression")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_child()
+        sys.exit(0)
+    if args.child:
+        print(json.dumps(CHILD_SCENARIOS[args.child](args)))
+        sys.exit(0)
+
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    child_argv = [
+        "--devices", str(args.devices), "--readings", str(args.readings), "--protocol", args.protocol,
+        "--documents", str(args.documents), "--write-latency", str(args.write_latency),
+    ]
+
+    with tempfile.TemporaryDirectory() as video_dir:
+        video = args.video
+        if video is None and {"dashboard", "video"} & set(scenarios):
+            video = record_video(os.path.join(video_dir, "recorded.avi"))
+        runs = []
+        for run in range(args.runs):
+            results = {}
+            for scenario in scenarios:
+                print(f"Run {run + 1}/{args.runs}: {scenario}...", flush=True)
+                if scenario == "dashboard":
+                    results[scenario] = run_dashboard(args, video)
+                elif scenario == "video":
+                    results[scenario] = run_video(args, video)
+                else:
+                    results[scenario] = run_child(scenario, child_argv)
+            runs.append(results)
+    results = median_results(runs)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file).get("results", {})
+    rows, regressions = compare(results, baseline, args.tolerance)
+    print(f"\n{'scenario':<10} {'metric':<28} {'value':>10} {'baseline':>10} {'change':>8}")
+    for scenario, name, value, previous, change, flag in rows:
+        print(f"{scenario:<10} {name:<28} {format_value(value):>10} {format_value(previous):>10} {change:>8} {flag}")
+
+    config = {key: value for key, value in vars(args).items() if key not in ("baseline", "save_baseline", "json", "serve", "child")}
+    report = {"config": config, "results": results}
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif baseline:
+        print(f"\n{regressions} regressions beyond {args.tolerance:.0%} against {args.baseline}")
+        sys.exit(1 if regressions else 0)
+    else:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to store one")
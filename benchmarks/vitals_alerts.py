@@ -0,0 +1,76 @@
+# Benchmark del motor de alertas de signos vitales: cientos de responders
+# enviando muestras a 1-10 Hz, con anomalías inyectadas al azar. Simula el
+# tiempo (sin esperar) y mide cuánto tarda cada ciclo de detección y la
+# latencia desde la muestra anómala hasta su alerta, incluida la espera al ciclo.
+#
+# Uso (desde la raíz del repositorio):
+#   python -m benchmarks.vitals_alerts --responders 500 --rate 10 --seconds 60
+import argparse
+import time
+
+import numpy as np
+
+from vitals_alerts import VitalsAnomalyEngine
+from vitals_store import SIGNALS, VitalsStore
+
+
+def normal_readings(rng, count):
+    return np.column_stack([
+        rng.uniform(60, 100, count),
+        rng.uniform(90, 100, count),
+        rng.uniform(36, 37.5, count),
+        rng.uniform(110, 130, count),
+    ])
+
+
+def run(responders, rate, seconds, tick, anomaly_rate, seed=0):
+    rng = np.random.default_rng(seed)
+    store = VitalsStore(retention_seconds=max(60, seconds), sample_rate=rate)
+    engine = VitalsAnomalyEngine()
+    ids = [f"responder_{i}" for i in range(responders)]
+    start = time.time()
+    injected = {}
+    latencies = []
+    tick_times = []
+    next_tick = tick
+    for step in range(int(seconds * rate)):
+        t = step / rate
+        values = normal_readings(rng, responders)
+        # Anomalías: pulso muy alto o caída de oxígeno en algunos responders sin alerta activa
+        for i in np.flatnonzero(rng.random(responders) < anomaly_rate):
+            if ids[i] not in injected:
+                values[i, 0 if rng.random() < 0.5 else 1] = 220 if rng.random() < 0.5 else 80
+                injected[ids[i]] = t
+        store.append_batch(
+            (ids[i], start + t, dict(zip(SIGNALS, values[i]))) for i in range(responders)
+        )
+        while next_tick <= t + 1 / rate:
+            started = time.perf_counter()
+            events = engine.process_store(store)
+            elapsed = time.perf_counter() - started
+            tick_times.append(elapsed)
+            for event in events:
+                if event["active"] and event["responder"] in injected:
+                    latencies.append(next_tick - injected.pop(event["responder"]) + elapsed)
+            next_tick += tick
+    return engine, np.asarray(tick_times), np.asarray(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vital-sign anomaly detection benchmark")
+    parser.add_argument("--responders", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=10.0, help="Samples per second per responder")
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--tick", type=float, default=0.05, help="Seconds between detection passes")
+    parser.add_argument("--anomaly-rate", type=float, default=0.001, help="Chance of an anomaly per sample")
+    args = parser.parse_args()
+
+    engine, tick_times, latencies = run(args.responders, args.rate, args.seconds, args.tick, args.anomaly_rate)
+    samples = args.responders * args.rate * args.seconds
+    p50, p95, p99 = np.percentile(tick_times * 1000, (50, 95, 99))
+    print(f"{args.responders} responders at {args.rate:g} Hz: {samples:,.0f} samples in {len(tick_times)} passes, "
+          f"{tick_times.sum():.2f}s of detection -> {samples / tick_times.sum():,.0f} samples/s")
+    print(f"Pass time: p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms")
+    if len(latencies):
+        p50, p95, worst = np.percentile(latencies * 1000, (50, 95, 100))
+        print(f"Detection latency ({len(latencies)} anomalies): p50 {p50:.0f} ms, p95 {p95:.0f} ms, max {worst:.0f} ms")
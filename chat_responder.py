@@ -0,0 +1,147 @@
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Interfaz de los agentes que responden en el chat. `respond` recibe el mensaje
+# y el historial reciente del canal y genera la respuesta por fragmentos; un
+# agente sin streaming puede generar la respuesta completa de una sola vez.
+class Responder:
+    def respond(self, message, history):
+        raise NotImplementedError
+
+
+# Agente de prueba: repite el mensaje con una latencia inicial y una demora por
+# palabra configurables, para medir la utilización de los workers
+class EchoResponder(Responder):
+    def __init__(self, latency=0.0, token_delay=0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+
+    def respond(self, message, history):
+        time.sleep(self.latency)
+        words = f"You said '{message}'".split(" ")
+        for i, word in enumerate(words):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield word if i == len(words) - 1 else word + " "
+
+
+# Petición al agente en curso o en espera
+class ChatRequest:
+    def __init__(self, request_id, channel, message, history):
+        self.request_id = request_id
+        self.channel = channel
+        self.message = message
+        self.history = history
+        self.key = (channel, " ".join(message.split()).lower())
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self.reply = ""
+        self.error = None
+
+
+# Ejecuta las respuestas del agente en un pool de hilos, fuera de los callbacks
+# de Dash. Las peticiones idénticas de un mismo canal mientras la primera sigue
+# en curso se descartan, cada canal tiene un máximo de peticiones simultáneas
+# (las demás esperan su turno) y cada fragmento y la respuesta final se
+# entregan mediante `on_token(request, text)` y `on_complete(request)`.
+class ChatResponderPool:
+    def __init__(self, responder, workers=4, per_channel_limit=1, on_token=None, on_complete=None, history_size=1000):
+        self.responder = responder
+        self.workers = workers
+        self.per_channel_limit = per_channel_limit
+        self.on_token = on_token
+        self.on_complete = on_complete
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.finished = deque(maxlen=history_size)  # Peticiones terminadas, para estadísticas
+        self._ids = itertools.count(1)
+        self._in_flight = {}
+        self._running = defaultdict(int)
+        self._waiting = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-responder")
+        self._created_at = time.monotonic()
+
+    # Encola un mensaje; devuelve la petición (la existente si era un duplicado)
+    def submit(self, channel, message, history=()):
+        with self._lock:
+            request = ChatRequest(next(self._ids), channel, message, list(history))
+            duplicate = self._in_flight.get(request.key)
+            if duplicate is not None:
+                self.deduplicated += 1
+                return duplicate
+            self._in_flight[request.key] = request
+            self.submitted += 1
+            if self._running[channel] < self.per_channel_limit:
+                self._running[channel] += 1
+                self._executor.submit(self._run, request)
+            else:
+                self._waiting[channel].append(request)
+            return request
+
+    def _run(self, request):
+        request.started_at = time.monotonic()
+        try:
+            for token in self.responder.respond(request.message, request.history):
+                if request.first_token_at is None:
+                    request.first_token_at = time.monotonic()
+                request.reply += token
+                if self.on_token is not None:
+                    self.on_token(request, token)
+        except Exception as e:
+            request.error = e
+            print(f"Error in chat responder: {e}")
+        request.finished_at = time.monotonic()
+
+        with self._lock:
+            self.busy_seconds += request.finished_at - request.started_at
+            self._in_flight.pop(request.key, None)
+            if request.error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self.finished.append(request)
+            waiting = self._waiting[request.channel]
+            if waiting:
+                self._executor.submit(self._run, waiting.popleft())
+            else:
+                self._running[request.channel] -= 1
+                if not self._running[request.channel]:
+                    del self._running[request.channel]
+                    del self._waiting[request.channel]
+            if not self._in_flight:
+                self._idle.notify_all()
+
+        if self.on_complete is not None:
+            try:
+                self.on_complete(request)
+            except Exception as e:
+                print(f"Error delivering chat reply: {e}")
+
+    # Peticiones encoladas o en curso
+    @property
+    def pending(self):
+        return len(self._in_flight)
+
+    # Espera a que no queden peticiones pendientes
+    def join(self, timeout=None):
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._in_flight, timeout)
+
+    # Fracción del tiempo en que los workers estuvieron ocupados desde su creación
+    def utilization(self):
+        elapsed = time.monotonic() - self._created_at
+        return self.busy_seconds / (elapsed * self.workers) if elapsed > 0 else 0.0
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from metrics import Summary
+
+
+# Historial de chat por canal (una sesión del navegador o un canal compartido).
+# Cada canal conserva en memoria sus últimos `retention` mensajes, y todos los
+# mensajes se agregan a un log JSONL en disco para recuperarlos al reiniciar.
+# Cuando el log crece más del doble de lo que se conserva, se compacta. Se
+# conservan como máximo `max_channels` canales, descartando los menos activos.
+class ChatStore:
+    def __init__(self, log_path=None, retention=500, page_size=50, max_channels=1000):
+        self.log_path = log_path
+        self.retention = retention
+        self.page_size = page_size
+        self.max_channels = max_channels
+        self.write_seconds = Summary()  # Duración de cada `append`, con la escritura en disco
+        self._channels = OrderedDict()
+        self._next_id = 1
+        self._log_lines = 0
+        self._log = None
+        self._lock = threading.Lock()
+        if log_path:
+            self._load()
+            self._log = open(log_path, "a", encoding="utf-8")
+
+    def _channel(self, channel):
+        messages = self._channels.get(channel)
+        if messages is None:
+            messages = self._channels[channel] = deque(maxlen=self.retention)
+            if len(self._channels) > self.max_channels:
+                self._channels.popitem(last=False)
+        else:
+            self._channels.move_to_end(channel)
+        return messages
+
+    def _load(self):
+        directory = os.path.dirname(self.log_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, encoding="utf-8") as log:
+            for line in log:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue  # Línea truncada por un corte de energía
+                self._channel(message["channel"]).append(message)
+                self._next_id = max(self._next_id, message["id"] + 1)
+                self._log_lines += 1
+
+    # Reescribe el log solo con los mensajes conservados
+    def _compact(self):
+        retained = sorted(
+            (message for messages in self._channels.values() for message in messages),
+            key=lambda message: message["id"],
+        )
+        temporary_path = self.log_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as log:
+            for message in retained:
+                log.write(json.dumps(message, ensure_ascii=False) + "\n")
+        self._log.close()
+        os.replace(temporary_path, self.log_path)
+        self._log = open(self.log_path, "a", encoding="utf-8")
+        self._log_lines = len(retained)
+
+    # Agrega un mensaje a un canal y lo devuelve con su id
+    def append(self, channel, author, text):
+        with self.write_seconds.time(), self._lock:
+            message = {
+                "id": self._next_id,
+                "channel": channel,
+                "author": author,
+                "text": text,
+                "timestamp": time.time(),
+            }
+            self._next_id += 1
+            messages = self._channel(channel)
+            messages.append(message)
+            if self._log is not None:
+                self._log.write(json.dumps(message, ensure_ascii=False) + "\n")
+                self._log.flush()
+                self._log_lines += 1
+                retained = sum(len(channel_messages) for channel_messages in self._channels.values())
+                if self._log_lines > 2 * max(retained, self.retention):
+                    self._compact()
+            return message
+
+    # Una página de mensajes de un canal, en orden cronológico: los más
+    # recientes, o los anteriores al id `before` para cargar más al subir
+    def page(self, channel, before=None, limit=None):
+        limit = min(limit or self.page_size, self.retention)
+        with self._lock:
+            messages = list(self._channels.get(channel, ()))
+        if before is not None:
+            end = len(messages)
+            while end and messages[end - 1]["id"] >= before:
+                end -= 1
+            messages = messages[:end]
+        return messages[-limit:]
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
@@ -0,0 +1,190 @@
+import json
+import threading
+import time
+from collections import deque
+
+from metrics import Summary
+
+
+# Formatea un evento Server-Sent Events
+def format_event(topic, data):
+    payload = json.dumps(data, separators=(",", ":"))
+    return f"event: {topic}\ndata: {payload}\n\n".encode("utf-8")
+
+KEEPALIVE = b": keepalive\n\n"
+
+# Pide al navegador que se reconecte en 1 s tras cerrar un stream atrasado
+RECONNECT = b"retry: 1000\n\n"
+
+
+# Cola acotada de un suscriptor. Si el cliente no lee a tiempo y la cola se
+# llena, se descartan sus eventos pendientes y se cierra la suscripción: el
+# navegador se reconecta y recibe de nuevo el estado completo, y un relé se
+# reconecta y vuelve a copiar el estado del principal.
+class Subscription:
+    def __init__(self, broker, max_events, channel=None):
+        self.broker = broker
+        self.channel = channel
+        self.dropped = 0
+        self._events = deque(maxlen=max_events)
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def put(self, event):
+        with self._condition:
+            if self._closed:
+                return
+            if len(self._events) < self._events.maxlen:
+                self._events.append(event)
+                self._condition.notify()
+                return
+            self.dropped += len(self._events) + 1
+            self._events.clear()
+        self.close()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self.broker.unsubscribe(self)
+
+    # Espera hasta timeout segundos y devuelve los eventos pendientes (lista
+    # vacía si no llegó ninguno, None si la suscripción se cerró)
+    def take(self, timeout=None):
+        with self._condition:
+            if not self._events and not self._closed:
+                self._condition.wait(timeout)
+            if self._closed:
+                return None
+            events = list(self._events)
+            self._events.clear()
+        return events
+
+    # Generador de bytes SSE para la respuesta HTTP; envía un comentario
+    # periódico para mantener viva la conexión a través de proxies
+    def stream(self, initial=(), keepalive=15.0):
+        try:
+            for event in initial:
+                yield event
+            while True:
+                with self._condition:
+                    if not self._events and not self._closed:
+                        self._condition.wait(keepalive)
+                    closed = self._closed
+                    events = list(self._events)
+                    self._events.clear()
+                if closed:
+                    # Cerrada por atrasarse: el navegador se reconecta
+                    if self.dropped:
+                        yield RECONNECT
+                    return
+                if events:
+                    yield b"".join(events)
+                else:
+                    yield KEEPALIVE
+        finally:
+            self.close()
+
+
+# Difunde eventos a todos los navegadores conectados a /events. Cada evento se
+# serializa una sola vez y los mismos bytes se entregan a cada suscriptor; los
+# eventos de un canal (p. ej. el chat de una sesión) solo llegan a sus suscriptores.
+# Los relés reciben todos los eventos sin serializar, (tema, datos, canal), para
+# reenviarlos a otros procesos del servidor (state_backend.py).
+class EventBroker:
+    def __init__(self, max_events=256):
+        self.max_events = max_events
+        self.published = 0
+        self.closed_dropped = 0  # Eventos descartados por suscriptores ya desconectados
+        self._subscribers = set()
+        self._relays = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel=None):
+        subscription = Subscription(self, self.max_events, channel)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def relay(self):
+        subscription = Subscription(self, self.max_events)
+        with self._lock:
+            self._relays.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers or subscription in self._relays:
+                self.closed_dropped += subscription.dropped
+            self._subscribers.discard(subscription)
+            self._relays.discard(subscription)
+
+    # Suscriptores locales más relés (cada relé puede tener navegadores detrás)
+    @property
+    def subscribers(self):
+        return len(self._subscribers) + len(self._relays)
+
+    # Eventos en cola sin entregar, sumando todos los suscriptores y relés
+    def queued(self):
+        with self._lock:
+            subscriptions = self._subscribers | self._relays
+        return sum(len(subscription._events) for subscription in subscriptions)
+
+    # Eventos descartados por suscriptores lentos desde el arranque
+    def dropped(self):
+        with self._lock:
+            subscriptions = self._subscribers | self._relays
+            closed = self.closed_dropped
+        return closed + sum(subscription.dropped for subscription in subscriptions)
+
+    def publish(self, topic, data, channel=None):
+        event = format_event(topic, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+            relays = list(self._relays)
+        for relay in relays:
+            relay.put((topic, data, channel))
+        if channel is not None:
+            subscribers = [subscription for subscription in subscribers if subscription.channel == channel]
+        for subscription in subscribers:
+            subscription.put(event)
+        self.published += 1
+        return len(subscribers)
+
+
+# Hilo que ejecuta periódicamente las funciones que publican novedades y mide
+# cuánto tarda cada una (task_seconds, por nombre de función)
+class Publisher:
+    def __init__(self, interval=0.25):
+        self.interval = interval
+        self.task_seconds = {}
+        self._tasks = []
+        self._thread = None
+        self._stop = threading.Event()
+
+    def add(self, task):
+        self._tasks.append(task)
+        self.task_seconds[task.__name__] = Summary()
+        return task
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-publisher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for task in self._tasks:
+                started = time.perf_counter()
+                try:
+                    task()
+                except Exception as e:
+                    print(f"Error publishing live updates: {e}")
+                self.task_seconds[task.__name__].observe(time.perf_counter() - started)
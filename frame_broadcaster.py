@@ -0,0 +1,303 @@
+import threading
+import time
+
+import cv2
+
+from metrics import Summary
+
+# Calidad JPEG por defecto de OpenCV y límites del modo adaptativo
+DEFAULT_QUALITY = 95
+ADAPTIVE_START_QUALITY = 80
+ADAPTIVE_MIN_QUALITY = 30
+ADAPTIVE_QUALITY_STEP = 10
+ADAPTIVE_MAX_INTERVAL = 2.0  # Nunca bajar de 0.5 cuadros por segundo
+QUALITY_BUCKET = 5  # Las calidades se redondean para compartir codificaciones entre clientes
+
+
+# Parámetros de un cliente de /video_feed: ancho máximo, calidad JPEG,
+# cuadros por segundo y modo adaptativo según el ancho de banda
+class StreamSettings:
+    def __init__(self, max_width=None, quality=None, fps=None, adaptive=False):
+        self.max_width = max_width
+        self.quality = quality
+        self.fps = fps
+        self.adaptive = adaptive
+
+    # Construye la configuración desde los parámetros de la URL
+    # (?width=640&quality=60&fps=5&adaptive=1), ignorando valores inválidos
+    @classmethod
+    def from_query(cls, args):
+        def parse(name, cast, low, high):
+            try:
+                value = cast(args.get(name))
+            except (TypeError, ValueError):
+                return None
+            return min(max(value, low), high)
+
+        quality = parse("quality", int, 1, 100)
+        if quality is not None:
+            quality = max(QUALITY_BUCKET, quality - quality % QUALITY_BUCKET)
+        return cls(
+            max_width=parse("width", int, 16, 4096),
+            quality=quality,
+            fps=parse("fps", float, 0.1, 60.0),
+            adaptive=args.get("adaptive", "0").lower() in ("1", "true", "yes"),
+        )
+
+
+# Cuadro capturado con sus variantes codificadas, compartidas entre clientes
+class _Frame:
+    def __init__(self, seq, image):
+        self.seq = seq
+        self.image = image
+        self.captured_at = time.monotonic()
+        self.variants = {}
+        self.lock = threading.Lock()
+
+
+# Difunde los cuadros de una única captura a todos los clientes de /video_feed.
+# Un hilo en segundo plano lee cada cuadro una sola vez, lo codifica con la
+# configuración por defecto y lo guarda en un buffer circular; cada cliente
+# toma siempre el cuadro más reciente, de modo que los clientes lentos saltan
+# cuadros en lugar de acumularlos. Las variantes (ancho, calidad) se codifican
+# bajo demanda una sola vez por cuadro y se comparten entre clientes.
+# Con un `gate` (frame_gate.FrameGate) solo se codifican y publican los cuadros
+# en que la escena cambió, más un latido periódico si no cambia.
+# Con `open_capture` (una función que abre la captura) en lugar de `capture`,
+# la cámara se abre al arrancar, con el primer cliente, y si hay `idle_timeout`
+# se libera cuando pasan esos segundos sin clientes de `stream` ni de `hold`.
+class FrameBroadcaster:
+    def __init__(self, capture=None, buffer_size=4, wait_timeout=1.0, gate=None, open_capture=None, idle_timeout=None):
+        self.capture = capture
+        self.open_capture = open_capture
+        self.idle_timeout = idle_timeout
+        self.gate = gate
+        self.buffer_size = buffer_size
+        self.wait_timeout = wait_timeout
+        self.opened = 0
+        self.captured = 0
+        self.gated = 0  # Cuadros descartados por el gate
+        self.skipped = 0  # Cuadros que algún cliente no alcanzó a recibir
+        self.capture_seconds = Summary()
+        self.encode_seconds = Summary()
+        self._buffer = [None] * buffer_size
+        self._seq = 0
+        self._running = False
+        self._thread = None
+        self._viewers = 0
+        self._holders = 0
+        self._idle_since = time.monotonic()
+        self._condition = threading.Condition()
+
+    # Arranca el hilo de captura si no está corriendo; si el anterior se está
+    # cerrando espera a que libere la cámara antes de volver a abrirla
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            previous = self._thread
+        if previous is not None and previous is not threading.current_thread():
+            previous.join()
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._capture_loop, name="frame-broadcaster", daemon=True)
+            self._thread.start()
+
+    # Detiene el hilo de captura y despierta a los clientes en espera
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.wait_timeout)
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def viewers(self):
+        return self._viewers
+
+    # Mantiene la captura abierta sin ser cliente de video (p. ej. la detección
+    # de peligros) hasta el `release` correspondiente
+    def hold(self):
+        with self._condition:
+            self._holders += 1
+        self.start()
+
+    def release(self):
+        with self._condition:
+            self._holders -= 1
+            self._idle_since = time.monotonic()
+
+    # Sin clientes desde hace más de idle_timeout (solo si la captura es propia)
+    def _idle(self):
+        return (
+            self.open_capture is not None
+            and self.idle_timeout is not None
+            and self._viewers == 0
+            and self._holders == 0
+            and time.monotonic() - self._idle_since > self.idle_timeout
+        )
+
+    def _capture_loop(self):
+        try:
+            if self.capture is None:
+                self.capture = self.open_capture()
+                self.opened += 1
+            while True:
+                with self._condition:
+                    if self._idle():
+                        self._running = False
+                    if not self._running:
+                        break
+                started = time.perf_counter()
+                success, image = self.capture.read()
+                self.capture_seconds.observe(time.perf_counter() - started)
+                if not success:
+                    break
+                self.captured += 1
+                if self.gate is not None and not self.gate.check(image):
+                    self.gated += 1
+                    continue
+                frame = _Frame(self._seq + 1, image)
+                if self.encode(frame) is None:
+                    continue
+                self._publish(frame)
+        finally:
+            with self._condition:
+                self._running = False
+                self._condition.notify_all()
+            # Libera el dispositivo para otros procesos; se vuelve a abrir con el próximo cliente
+            if self.open_capture is not None and self.capture is not None:
+                self.capture.release()
+                self.capture = None
+
+    def _publish(self, frame):
+        with self._condition:
+            self._seq = frame.seq
+            self._buffer[frame.seq % self.buffer_size] = frame
+            self._condition.notify_all()
+
+    # Devuelve los bytes JPEG del cuadro con el ancho y la calidad pedidos,
+    # codificándolo solo la primera vez que un cliente pide esa variante
+    def encode(self, frame, max_width=None, quality=None):
+        image_width = frame.image.shape[1]
+        if max_width is not None and max_width >= image_width:
+            max_width = None
+        if quality == DEFAULT_QUALITY:
+            quality = None
+        key = (max_width, quality)
+        jpeg = frame.variants.get(key)
+        if jpeg is not None:
+            return jpeg
+        with frame.lock:
+            jpeg = frame.variants.get(key)
+            if jpeg is None:
+                started = time.perf_counter()
+                image = frame.image
+                if max_width is not None:
+                    height = max(1, round(image.shape[0] * max_width / image_width))
+                    image = cv2.resize(image, (max_width, height), interpolation=cv2.INTER_AREA)
+                params = [] if quality is None else [cv2.IMWRITE_JPEG_QUALITY, quality]
+                encoded, buffer = cv2.imencode('.jpg', image, params)
+                if not encoded:
+                    return None
+                jpeg = buffer.tobytes()
+                frame.variants[key] = jpeg
+                self.encode_seconds.observe(time.perf_counter() - started)
+        return jpeg
+
+    # Devuelve el último cuadro más nuevo que after_seq, esperando hasta
+    # timeout segundos; None si no llegó ninguno
+    def latest(self, after_seq=0, timeout=None):
+        with self._condition:
+            if self._seq <= after_seq:
+                self._condition.wait_for(
+                    lambda: self._seq > after_seq or not self._running,
+                    timeout=self.wait_timeout if timeout is None else timeout,
+                )
+            if self._seq <= after_seq:
+                return None
+            return self._buffer[self._seq % self.buffer_size]
+
+    # Devuelve todos los cuadros del buffer más nuevos que after_seq, del más
+    # antiguo al más reciente, esperando hasta timeout segundos; lista vacía si
+    # no llegó ninguno. Permite a un consumidor atrasado procesarlos por lotes.
+    def frames_since(self, after_seq=0, timeout=None):
+        with self._condition:
+            if self._seq <= after_seq:
+                self._condition.wait_for(
+                    lambda: self._seq > after_seq or not self._running,
+                    timeout=self.wait_timeout if timeout is None else timeout,
+                )
+            first = max(after_seq + 1, self._seq - self.buffer_size + 1)
+            return [self._buffer[seq % self.buffer_size] for seq in range(first, self._seq + 1)]
+
+    # Generador de cuadros JPEG para un cliente con la configuración por defecto
+    def frames(self):
+        return self.stream(StreamSettings())
+
+    # Generador de cuadros JPEG para un cliente; termina cuando la cámara deja
+    # de entregar cuadros. Limita los cuadros por segundo y, en modo adaptativo,
+    # mide cuánto tarda el servidor en escribir cada cuadro al socket: si la
+    # escritura se atrasa baja la calidad y luego descarta cuadros, y si se
+    # recupera vuelve poco a poco a la configuración pedida.
+    def stream(self, settings):
+        with self._condition:
+            self._viewers += 1
+        try:
+            yield from self._stream(settings)
+        finally:
+            with self._condition:
+                self._viewers -= 1
+                self._idle_since = time.monotonic()
+
+    def _stream(self, settings):
+        self.start()
+        target_quality = settings.quality
+        target_interval = 1.0 / settings.fps if settings.fps else 0.0
+        quality = target_quality
+        interval = target_interval
+        if settings.adaptive and quality is None:
+            target_quality = quality = ADAPTIVE_START_QUALITY
+        seq = 0
+        while True:
+            frame = self.latest(seq)
+            if frame is None:
+                if not self._running:
+                    return
+                continue
+            if seq:
+                self.skipped += frame.seq - seq - 1
+            seq = frame.seq
+            jpeg = self.encode(frame, settings.max_width, quality)
+            if jpeg is None:
+                continue
+
+            sent_at = time.monotonic()
+            yield jpeg
+            write_time = time.monotonic() - sent_at
+
+            if settings.adaptive:
+                budget = interval or 1.0 / 15
+                if write_time > budget:
+                    if quality > ADAPTIVE_MIN_QUALITY:
+                        quality = max(ADAPTIVE_MIN_QUALITY, quality - ADAPTIVE_QUALITY_STEP)
+                    else:
+                        interval = min(ADAPTIVE_MAX_INTERVAL, max(interval, budget) * 1.5)
+                elif write_time < budget / 2:
+                    if interval > target_interval:
+                        interval = max(target_interval, interval / 1.5)
+                        if interval - target_interval < 1e-3:
+                            interval = target_interval
+                    elif quality < target_quality:
+                        quality = min(target_quality, quality + ADAPTIVE_QUALITY_STEP)
+
+            if interval:
+                remaining = sent_at + interval - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
@@ -0,0 +1,56 @@
+import time
+
+import cv2
+import numpy as np
+
+
+# Decide qué cuadros vale la pena codificar y enviar. Cada cuadro se reduce a
+# una miniatura en escala de grises (p. ej. 64x48) y se compara con la del
+# último cuadro conservado: el puntaje es la fracción de píxeles que cambiaron
+# más de `pixel_threshold` niveles. Se conserva el cuadro si el puntaje supera
+# `threshold` o si pasaron `max_interval` segundos desde el último conservado,
+# para que la escena estática se siga actualizando de vez en cuando.
+class FrameGate:
+    def __init__(self, threshold=0.01, max_interval=30.0, pixel_threshold=20, size=(64, 48)):
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.pixel_threshold = pixel_threshold
+        self.size = size
+        self.kept = 0
+        self.dropped = 0
+        self.last_score = None
+        self._reference = None
+        self._kept_at = None
+
+    def _signature(self, image):
+        small = cv2.resize(image, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    # Fracción de píxeles de la miniatura que cambiaron respecto a otra
+    def score(self, signature, reference):
+        difference = cv2.absdiff(signature, reference)
+        return float(np.count_nonzero(difference > self.pixel_threshold)) / difference.size
+
+    # True si el cuadro cambió lo suficiente (o toca el latido); en ese caso
+    # pasa a ser la referencia para los siguientes
+    def check(self, image, now=None):
+        now = time.monotonic() if now is None else now
+        signature = self._signature(image)
+        if self._reference is None:
+            self.last_score = 1.0
+        else:
+            self.last_score = self.score(signature, self._reference)
+            if self.last_score < self.threshold and now - self._kept_at < self.max_interval:
+                self.dropped += 1
+                return False
+        self._reference = signature
+        self._kept_at = now
+        self.kept += 1
+        return True
+
+    # Olvida la referencia: el próximo cuadro siempre se conserva
+    def reset(self):
+        self._reference = None
+        self._kept_at = None
@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+# Interfaz de los detectores de peligros. `detect` recibe una lista de imágenes
+# BGR del mismo tamaño y devuelve, por imagen, una lista de detecciones
+# {"label", "score", "box": (x0, y0, x1, y1)} con la caja normalizada a [0, 1].
+# Procesar la lista completa de una vez permite aprovechar la inferencia por lotes.
+class Detector:
+    labels = ()
+
+    def detect(self, images):
+        raise NotImplementedError
+
+
+# Detector de fuego por color, sin modelo: cuenta los píxeles rojo-anaranjados
+# muy brillantes de todo el lote en una sola operación vectorizada. Sirve como
+# detector por defecto en el RB3 y como referencia para el benchmark.
+class FireColorDetector(Detector):
+    labels = ("fire",)
+
+    def __init__(self, min_fraction=0.01):
+        self.min_fraction = min_fraction
+
+    def detect(self, images):
+        if not images:
+            return []
+        batch = np.stack(images).astype(np.int16)
+        blue, green, red = batch[..., 0], batch[..., 1], batch[..., 2]
+        mask = (red > 190) & (red - green > 30) & (green > blue) & (red - blue > 90)
+        fractions = mask.mean(axis=(1, 2))
+        height, width = mask.shape[1:]
+        results = []
+        for i, fraction in enumerate(fractions):
+            if fraction < self.min_fraction:
+                results.append([])
+                continue
+            rows = np.flatnonzero(mask[i].any(axis=1))
+            cols = np.flatnonzero(mask[i].any(axis=0))
+            box = (cols[0] / width, rows[0] / height, (cols[-1] + 1) / width, (rows[-1] + 1) / height)
+            score = min(1.0, float(fraction) / (4 * self.min_fraction))
+            results.append([{"label": "fire", "score": score, "box": tuple(float(v) for v in box)}])
+        return results
+
+
+# Detector con una red de OpenCV DNN en CPU (ONNX, TensorFlow, Caffe...) con
+# salida estilo SSD: filas (imagen, clase, puntaje, x0, y0, x1, y1). Todo el
+# lote entra a la red en un solo blob.
+class DNNDetector(Detector):
+    def __init__(
+        self,
+        model_path,
+        labels,
+        config_path=None,
+        input_size=(300, 300),
+        scale=1 / 127.5,
+        mean=(127.5, 127.5, 127.5),
+        swap_rb=True,
+        score_threshold=0.5,
+    ):
+        self.labels = tuple(labels)
+        self.input_size = input_size
+        self.scale = scale
+        self.mean = mean
+        self.swap_rb = swap_rb
+        self.score_threshold = score_threshold
+        self.net = cv2.dnn.readNet(model_path, config_path or "")
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def detect(self, images):
+        if not images:
+            return []
+        blob = cv2.dnn.blobFromImages(images, self.scale, self.input_size, self.mean, self.swap_rb, crop=False)
+        self.net.setInput(blob)
+        rows = self.net.forward().reshape(-1, 7)
+        rows = rows[rows[:, 2] >= self.score_threshold]
+        results = [[] for _ in images]
+        for image_id, class_id, score, x0, y0, x1, y1 in rows.tolist():
+            image_id = int(image_id)
+            class_id = int(class_id)
+            if 0 <= image_id < len(images) and 0 <= class_id < len(self.labels):
+                box = tuple(min(1.0, max(0.0, v)) for v in (x0, y0, x1, y1))
+                results[image_id].append({"label": self.labels[class_id], "score": score, "box": box})
+        return results
+
+
+# Corre un detector sobre los cuadros de un FrameBroadcaster en un hilo aparte,
+# sin tocar el hilo de captura ni los clientes de video. Cada cuadro se reduce
+# a `input_width` antes de la inferencia. Si el detector se atrasa, toma de una
+# vez todos los cuadros nuevos del buffer (hasta `max_batch`) y los procesa en
+# un solo lote; los que ya salieron del buffer se cuentan como saltados.
+# Las detecciones se entregan con on_detections(cuadro, detecciones).
+# Con `hold_capture` (por defecto) la detección mantiene abierta la captura
+# mientras corre y la vuelve a abrir si se cierra; con `hold_capture=False`
+# analiza los cuadros solo mientras algún cliente de video la mantiene abierta.
+class HazardDetectionWorker:
+    def __init__(
+        self,
+        broadcaster,
+        detector,
+        on_detections=None,
+        input_width=320,
+        max_batch=8,
+        min_interval=0.0,
+        history=1000,
+        hold_capture=True,
+    ):
+        self.broadcaster = broadcaster
+        self.hold_capture = hold_capture
+        self.detector = detector
+        self.on_detections = on_detections
+        self.input_width = input_width
+        self.max_batch = max_batch
+        self.min_interval = min_interval
+        self.processed = 0
+        self.skipped = 0
+        self.batches = 0
+        self.detections = 0
+        self.latencies = deque(maxlen=history)  # Segundos entre la captura y la detección
+        self.batch_sizes = deque(maxlen=history)
+        self._holding = False
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self.hold_capture and not self._holding:
+            self.broadcaster.hold()
+            self._holding = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="hazard-detection", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._holding:
+            self.broadcaster.release()
+            self._holding = False
+
+    def _downscale(self, image):
+        height, width = image.shape[:2]
+        if width <= self.input_width:
+            return image
+        size = (self.input_width, max(1, round(height * self.input_width / width)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def _run(self):
+        seq = 0
+        while not self._stop.is_set():
+            frames = self.broadcaster.frames_since(seq, timeout=1.0)
+            if not frames:
+                if not self.broadcaster.running:
+                    if self._stop.wait(1.0):
+                        break
+                    # La cámara dejó de entregar cuadros: se reintenta abrirla
+                    if self.hold_capture:
+                        self.broadcaster.start()
+                continue
+            if seq:
+                self.skipped += frames[0].seq - seq - 1
+            if len(frames) > self.max_batch:
+                self.skipped += len(frames) - self.max_batch
+                frames = frames[-self.max_batch:]
+            seq = frames[-1].seq
+
+            started = time.monotonic()
+            try:
+                results = self.detector.detect([self._downscale(frame.image) for frame in frames])
+            except Exception as e:
+                print(f"Error running hazard detection: {e}")
+                self._stop.wait(1.0)
+                continue
+            finished = time.monotonic()
+
+            self.batches += 1
+            self.batch_sizes.append(len(frames))
+            for frame, detections in zip(frames, results):
+                self.processed += 1
+                self.latencies.append(finished - frame.captured_at)
+                if detections:
+                    self.detections += len(detections)
+                    if self.on_detections is not None:
+                        try:
+                            self.on_detections(frame, detections)
+                        except Exception as e:
+                            print(f"Error publishing detections: {e}")
+
+            if self.min_interval:
+                self._stop.wait(self.min_interval - (time.monotonic() - started))
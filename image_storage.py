@@ -0,0 +1,219 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+
+# Miniaturas que acompañan a cada imagen, para vistas previas y listados
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_QUALITY = 70
+
+
+# Interfaz de los almacenes de documentos de imágenes. `write_batch` escribe
+# una lista de (document_id, data) en una colección de una sola vez y lanza
+# una excepción si el backend no está disponible, sin escrituras parciales.
+# `watch_latest` llama a callback(document_id, data) con el documento más
+# reciente de la colección cada vez que cambia (y una vez al suscribirse) y
+# devuelve un objeto con `unsubscribe()`.
+class DocumentStorage:
+    max_batch_size = 500
+
+    def write_batch(self, collection_name, documents):
+        raise NotImplementedError
+
+    def watch_latest(self, collection_name, callback):
+        raise NotImplementedError
+
+
+# Firestore: cada lote se envía en un solo commit (máximo 500 escrituras)
+class FirestoreStorage(DocumentStorage):
+    max_batch_size = 500
+
+    def __init__(self, db):
+        self.db = db
+
+    def write_batch(self, collection_name, documents):
+        batch = self.db.batch()
+        collection = self.db.collection(collection_name)
+        for document_id, data in documents:
+            batch.set(collection.document(document_id), data)
+        batch.commit()
+
+    # Firestore envía los cambios de la consulta por una sola conexión, sin
+    # volver a leer el documento en cada consulta periódica
+    def watch_latest(self, collection_name, callback):
+        def on_snapshot(docs, changes, read_time):
+            for doc in docs:
+                callback(doc.id, doc.to_dict())
+
+        query = self.db.collection(collection_name).order_by("timestamp", direction="DESCENDING").limit(1)
+        return query.on_snapshot(on_snapshot)
+
+
+# Almacén local en SQLite, para pruebas y para estaciones sin conexión
+class SQLiteStorage(DocumentStorage):
+    max_batch_size = 1000
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " collection TEXT NOT NULL,"
+            " id TEXT NOT NULL,"
+            " timestamp TEXT,"
+            " data TEXT NOT NULL,"
+            " PRIMARY KEY (collection, id))"
+        )
+        self._connection.commit()
+
+    def write_batch(self, collection_name, documents):
+        rows = [
+            (collection_name, document_id, data.get("timestamp"), json.dumps(data))
+            for document_id, data in documents
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO documents (collection, id, timestamp, data) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    # Último documento de una colección según su timestamp
+    def last_document(self, collection_name):
+        with self._lock:
+            row = self._connection.execute(LAST_DOCUMENT_QUERY, (collection_name,)).fetchone()
+        return json.loads(row[1]) if row else None
+
+    def watch_latest(self, collection_name, callback, interval=0.2):
+        return SQLiteWatch(self.path, collection_name, callback, interval)
+
+    def count(self, collection_name):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM documents WHERE collection = ?", (collection_name,)
+            ).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+LAST_DOCUMENT_QUERY = "SELECT id, data FROM documents WHERE collection = ? ORDER BY timestamp DESC LIMIT 1"
+
+
+# Suscripción al último documento de una base SQLite, que puede escribir otro
+# proceso. SQLite no avisa de los cambios, así que un hilo consulta con una
+# conexión propia `PRAGMA data_version`, que solo cambia cuando otra conexión
+# confirma una escritura, y lee el documento únicamente entonces.
+class SQLiteWatch:
+    def __init__(self, path, collection_name, callback, interval=0.2):
+        self.path = path
+        self.collection_name = collection_name
+        self.callback = callback
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sqlite-watch", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            version = None
+            last_id = None
+            while not self._stop.is_set():
+                current = connection.execute("PRAGMA data_version").fetchone()[0]
+                if current != version:
+                    version = current
+                    row = connection.execute(LAST_DOCUMENT_QUERY, (self.collection_name,)).fetchone()
+                    if row and row[0] != last_id:
+                        last_id = row[0]
+                        try:
+                            self.callback(row[0], json.loads(row[1]))
+                        except Exception as e:
+                            print(f"Error in document watch callback: {e}")
+                self._stop.wait(self.interval)
+        finally:
+            connection.close()
+
+    def unsubscribe(self):
+        self._stop.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.interval + 1)
+
+
+# Interfaz de los almacenes de archivos binarios (imágenes JPEG). Las claves son
+# rutas relativas como "images/<id>.jpg"; escribir dos veces la misma clave es
+# idempotente, así los reintentos no duplican archivos.
+class BlobStore:
+    def put(self, key, data, content_type="image/jpeg"):
+        raise NotImplementedError
+
+    def get(self, key):
+        raise NotImplementedError
+
+
+# Firebase Storage (Cloud Storage), a partir de firebase_admin.storage.bucket()
+class FirebaseBlobStore(BlobStore):
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def put(self, key, data, content_type="image/jpeg"):
+        self.bucket.blob(key).upload_from_string(data, content_type=content_type)
+
+    def get(self, key):
+        return self.bucket.blob(key).download_as_bytes()
+
+
+# Archivos en un directorio local, para pruebas y para estaciones sin conexión
+class LocalBlobStore(BlobStore):
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        parts = key.split("/")
+        if not key or any(part in ("", ".", "..") for part in parts):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return os.path.join(self.root, *parts)
+
+    def put(self, key, data, content_type="image/jpeg"):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as blob_file:
+            blob_file.write(data)
+        os.replace(path + ".tmp", path)
+
+    def get(self, key):
+        with open(self._path(key), "rb") as blob_file:
+            return blob_file.read()
+
+
+# Documento y archivos de una captura: el documento solo guarda metadatos y las
+# claves de la imagen completa y su miniatura, que van al almacén de archivos
+def image_document(document_id, timestamp, image, thumbnail, width, height):
+    image_key = f"images/{document_id}.jpg"
+    thumbnail_key = f"thumbnails/{document_id}.jpg"
+    data = {
+        "timestamp": timestamp,
+        "image_path": image_key,
+        "thumbnail_path": thumbnail_key,
+        "width": width,
+        "height": height,
+        "size": len(image),
+    }
+    return data, {image_key: image, thumbnail_key: thumbnail}
+
+
+# Bytes JPEG de la imagen de un documento (o de su miniatura), descargados bajo
+# demanda; acepta también los documentos antiguos con la imagen en base64
+def image_bytes(document, blob_store, thumbnail=False):
+    key = document.get("thumbnail_path" if thumbnail else "image_path") or document.get("image_path")
+    if key:
+        return blob_store.get(key)
+    if "image_base64" in document:
+        return base64.b64decode(document["image_base64"])
+    return None
@@ -0,0 +1,231 @@
+import json
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Summary
+
+
+# Sube documentos de imágenes en segundo plano, sin bloquear la captura.
+# Cada documento puede llevar archivos binarios (la imagen y su miniatura), que
+# se suben al almacén de archivos antes de escribir el documento que los
+# referencia. Los documentos entran en una cola acotada y un hilo los escribe
+# por lotes, respetando un máximo de escrituras por segundo. Si el backend
+# falla, el lote se guarda en una cola en disco (un JSON por documento más sus
+# archivos binarios) y se reintenta con espera exponencial; al recuperar la
+# conexión se vacía la cola en disco, de la más antigua a la más nueva. Ningún
+# documento se descarta: si la cola en memoria está llena, va directo al disco.
+class ImageUploader:
+    def __init__(
+        self,
+        storage,
+        collection_name,
+        spool_dir,
+        max_queue=64,
+        batch_size=20,
+        max_rate=None,
+        flush_interval=1.0,
+        min_backoff=1.0,
+        max_backoff=60.0,
+        blob_store=None,
+        blob_workers=8,
+    ):
+        self.storage = storage
+        self.blob_store = blob_store
+        self.collection_name = collection_name
+        self.spool_dir = spool_dir
+        self.batch_size = min(batch_size, storage.max_batch_size)
+        self.max_rate = max_rate  # Documentos por segundo; None sin límite
+        self.flush_interval = flush_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.uploaded = 0
+        self.batches = 0
+        self.failures = 0
+        self.spooled = 0
+        self.write_seconds = Summary()  # Duración de cada write_batch
+        self.blob_seconds = Summary()  # Duración de cada put de imagen
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._next_write_at = 0.0
+        self._spool_sequence = 0
+        self._spool_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        # Los archivos de un lote se suben en paralelo: cada uno es una ida y vuelta al backend
+        self._blob_executor = ThreadPoolExecutor(max_workers=blob_workers, thread_name_prefix="blob-upload")
+        os.makedirs(spool_dir, exist_ok=True)
+
+    # Encola un documento para subirlo, con sus archivos {clave: bytes};
+    # nunca bloquea al que captura. Los archivos necesitan un blob_store.
+    def submit(self, document_id, data, blobs=None):
+        if blobs and self.blob_store is None:
+            raise ValueError("ImageUploader needs a blob_store to upload files")
+        item = (document_id, data, blobs or {})
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._spool([item])
+
+    @property
+    def online(self):
+        return self._backoff == 0.0
+
+    # Documentos en la cola en memoria
+    @property
+    def queued(self):
+        return self._queue.qsize()
+
+    # Documentos guardados en disco esperando a subirse
+    def spool_size(self):
+        return len(self._spool_files())
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="image-uploader", daemon=True)
+        self._thread.start()
+
+    # Detiene el hilo; lo que quede en memoria se intenta subir una última vez
+    # y, si no se puede, queda en el disco para la próxima ejecución
+    def stop(self, timeout=10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        while True:
+            remaining = self._drain_queue(block=False)
+            if not remaining:
+                break
+            if not (self.online and self._write(remaining)):
+                self._spool(remaining)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._drain_queue(block=True)
+            if batch:
+                if time.monotonic() < self._retry_at or not self._write(batch):
+                    self._spool(batch)
+            if time.monotonic() >= self._retry_at:
+                self._drain_spool()
+
+    # Toma hasta batch_size documentos de la cola, esperando como máximo
+    # flush_interval a que se complete el lote
+    def _drain_queue(self, block):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if block:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _put_blob(self, item):
+        key, content = item
+        with self.blob_seconds.time():
+            self.blob_store.put(key, content)
+
+    # Escribe un lote respetando el límite de escrituras; devuelve si tuvo éxito
+    def _write(self, batch):
+        wait = self._next_write_at - time.monotonic()
+        if wait > 0 and self._stop.wait(wait):
+            return False
+        try:
+            files = []
+            for document_id, _, blobs in batch:
+                # Documentos de la cola en disco de una ejecución con almacén de archivos
+                if blobs and self.blob_store is None:
+                    print(f"Dropping {len(blobs)} files of {document_id}: no blob store configured")
+                    continue
+                files.extend(blobs.items())
+            # list() espera todas las subidas y propaga el primer error
+            list(self._blob_executor.map(self._put_blob, files))
+            with self.write_seconds.time():
+                self.storage.write_batch(self.collection_name, [(document_id, data) for document_id, data, _ in batch])
+        except Exception as e:
+            self.failures += 1
+            self._backoff = min(self.max_backoff, max(self.min_backoff, self._backoff * 2))
+            self._retry_at = time.monotonic() + self._backoff * random.uniform(0.5, 1.0)
+            print(f"Error uploading {len(batch)} documents, retrying in {self._backoff:.1f}s: {e}")
+            return False
+        if not self.online:
+            print("Upload backend reachable again.")
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        if self.max_rate:
+            self._next_write_at = time.monotonic() + len(batch) / self.max_rate
+        self.uploaded += len(batch)
+        self.batches += 1
+        return True
+
+    def _spool_files(self):
+        return sorted(name for name in os.listdir(self.spool_dir) if name.endswith(".json"))
+
+    # Guarda documentos en disco. Los archivos binarios se escriben primero y el
+    # JSON al final, completo y luego renombrado: un corte de energía no deja
+    # documentos a medias ni documentos sin sus archivos
+    def _spool(self, documents):
+        with self._spool_lock:
+            for document_id, data, blobs in documents:
+                self._spool_sequence += 1
+                name = f"{time.time_ns():020d}_{self._spool_sequence:06d}"
+                blob_files = {}
+                for i, (key, content) in enumerate(blobs.items()):
+                    blob_files[key] = f"{name}.{i}.blob"
+                    with open(os.path.join(self.spool_dir, blob_files[key]), "wb") as blob_file:
+                        blob_file.write(content)
+                path = os.path.join(self.spool_dir, name + ".json")
+                with open(path + ".tmp", "w", encoding="utf-8") as spool_file:
+                    json.dump({"document_id": document_id, "data": data, "blobs": blob_files}, spool_file)
+                os.replace(path + ".tmp", path)
+                self.spooled += 1
+
+    # Lee un documento guardado en disco con sus archivos binarios
+    def _load_spooled(self, name):
+        with open(os.path.join(self.spool_dir, name), encoding="utf-8") as spool_file:
+            document = json.load(spool_file)
+        blobs = {}
+        for key, blob_name in document.get("blobs", {}).items():
+            with open(os.path.join(self.spool_dir, blob_name), "rb") as blob_file:
+                blobs[key] = blob_file.read()
+        return (document["document_id"], document["data"], blobs), list(document.get("blobs", {}).values())
+
+    # Sube por lotes lo guardado en disco hasta vaciarlo o hasta que falle
+    def _drain_spool(self):
+        while not self._stop.is_set():
+            names = self._spool_files()[:self.batch_size]
+            if not names:
+                return
+            batch = []
+            spooled_files = []
+            for name in names:
+                path = os.path.join(self.spool_dir, name)
+                try:
+                    item, blob_names = self._load_spooled(name)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Skipping unreadable spool file {name}: {e}")
+                    os.replace(path, path + ".bad")
+                    continue
+                batch.append(item)
+                spooled_files.append(name)
+                spooled_files.extend(blob_names)
+            if batch and not self._write(batch):
+                return
+            for name in spooled_files:
+                path = os.path.join(self.spool_dir, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            # Da prioridad a los documentos nuevos de la cola en memoria
+            if not self._queue.empty():
+                return
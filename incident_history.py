@@ -0,0 +1,331 @@
+import math
+import os
+from datetime import datetime
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from metrics import Summary
+from vitals_store import SIGNALS
+
+# Resoluciones de los resúmenes precalculados, en segundos
+ROLLUP_RESOLUTIONS = (1, 10, 60)
+
+
+# Historial persistente de un incidente en SQLite: todas las muestras de signos
+# vitales y posiciones, más resúmenes por responder en intervalos de 1 s, 10 s
+# y 1 min (cantidad, suma, mínimo y máximo por señal) que se actualizan en cada
+# escritura. Las consultas de rangos largos leen el resumen más grueso que
+# alcance para los puntos pedidos en lugar de las muestras crudas.
+# Las muestras se toman del VitalsStore y del LocationFeed por lotes (`sync`),
+# cada lote en una sola transacción.
+class IncidentHistory:
+    def __init__(self, path, signals=SIGNALS, resolutions=ROLLUP_RESOLUTIONS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.signals = signals
+        self.resolutions = resolutions
+        self.written = 0
+        self.write_seconds = Summary()  # Duración de cada transacción de `append`
+        self.query_seconds = Summary()
+        self._vitals_after = {}
+        self._positions_version = None
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+        # Continúa después de lo ya guardado: si el VitalsStore compartido sobrevivió
+        # a un reinicio del principal, sus muestras no se vuelven a escribir
+        for responder_id, last in self._connection.execute("SELECT responder, MAX(t) FROM samples GROUP BY responder"):
+            self._vitals_after[responder_id] = last
+
+    def _create_tables(self):
+        columns = ", ".join(f"{signal} REAL" for signal in self.signals)
+        statements = [
+            f"CREATE TABLE IF NOT EXISTS samples (responder TEXT NOT NULL, t REAL NOT NULL, {columns})",
+            "CREATE INDEX IF NOT EXISTS samples_responder_t ON samples (responder, t)",
+            "CREATE INDEX IF NOT EXISTS samples_t ON samples (t)",
+            "CREATE TABLE IF NOT EXISTS positions (marker TEXT NOT NULL, t REAL NOT NULL, lat REAL, lon REAL)",
+            "CREATE INDEX IF NOT EXISTS positions_t ON positions (t)",
+        ]
+        for resolution in self.resolutions:
+            aggregates = ", ".join(
+                f"{signal}_n INTEGER, {signal}_sum REAL, {signal}_min REAL, {signal}_max REAL"
+                for signal in self.signals
+            )
+            statements.append(
+                f"CREATE TABLE IF NOT EXISTS rollup_{resolution} "
+                f"(responder TEXT NOT NULL, bucket REAL NOT NULL, {aggregates}, PRIMARY KEY (responder, bucket))"
+            )
+        with self._connection:
+            for statement in statements:
+                self._connection.execute(statement)
+
+    # Agrega muestras: `responders` (n,), `times` (n,) y `values` (n, señales) con NaN
+    # en las lecturas que faltan. Muestras y resúmenes se escriben en una transacción.
+    def append(self, responders, times, values):
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if not len(times):
+            return 0
+        rows = [
+            (responder, t, *[None if math.isnan(v) else v for v in row])
+            for responder, t, row in zip(responders, times.tolist(), values.tolist())
+        ]
+        placeholders = ", ".join("?" * (2 + len(self.signals)))
+        with self.write_seconds.time(), self._lock, self._connection:
+            self._connection.executemany(f"INSERT INTO samples VALUES ({placeholders})", rows)
+            for resolution in self.resolutions:
+                self._upsert_rollup(resolution, responders, times, values)
+        self.written += len(rows)
+        return len(rows)
+
+    # Agrega el lote por (responder, intervalo) con NumPy y lo combina con lo ya guardado
+    def _upsert_rollup(self, resolution, responders, times, values):
+        names, codes = np.unique(np.asarray(responders, dtype=object).astype(str), return_inverse=True)
+        buckets = np.floor(times / resolution).astype(np.int64)
+        keys, inverse = np.unique(np.column_stack([codes, buckets]), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        groups = len(keys)
+        valid = ~np.isnan(values)
+        aggregates = []
+        for column in range(len(self.signals)):
+            column_values = values[:, column]
+            column_valid = valid[:, column]
+            count = np.bincount(inverse, weights=column_valid, minlength=groups)
+            total = np.bincount(inverse, weights=np.where(column_valid, column_values, 0.0), minlength=groups)
+            minimum = np.full(groups, np.nan)
+            maximum = np.full(groups, np.nan)
+            np.fmin.at(minimum, inverse, column_values)
+            np.fmax.at(maximum, inverse, column_values)
+            aggregates.append((count, total, minimum, maximum))
+
+        rows = []
+        for g, (code, bucket) in enumerate(keys.tolist()):
+            row = [names[code], float(bucket * resolution)]
+            for count, total, minimum, maximum in aggregates:
+                row += [
+                    int(count[g]),
+                    float(total[g]),
+                    None if np.isnan(minimum[g]) else float(minimum[g]),
+                    None if np.isnan(maximum[g]) else float(maximum[g]),
+                ]
+            rows.append(row)
+
+        columns = ["responder", "bucket"]
+        updates = []
+        for signal in self.signals:
+            columns += [f"{signal}_n", f"{signal}_sum", f"{signal}_min", f"{signal}_max"]
+            updates += [
+                f"{signal}_n = {signal}_n + excluded.{signal}_n",
+                f"{signal}_sum = {signal}_sum + excluded.{signal}_sum",
+                f"{signal}_min = min(coalesce({signal}_min, excluded.{signal}_min), "
+                f"coalesce(excluded.{signal}_min, {signal}_min))",
+                f"{signal}_max = max(coalesce({signal}_max, excluded.{signal}_max), "
+                f"coalesce(excluded.{signal}_max, {signal}_max))",
+            ]
+        self._connection.executemany(
+            f"INSERT INTO rollup_{resolution} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (responder, bucket) DO UPDATE SET {', '.join(updates)}",
+            rows,
+        )
+
+    def append_positions(self, positions, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        rows = [(marker_id, timestamp, lat, lon) for marker_id, (lat, lon) in positions.items()]
+        if rows:
+            with self._lock, self._connection:
+                self._connection.executemany("INSERT INTO positions VALUES (?, ?, ?, ?)", rows)
+        return len(rows)
+
+    # Guarda lo que llegó al almacén de signos vitales y al feed de posiciones
+    # desde la última llamada; devuelve la cantidad de muestras escritas
+    def sync(self, vitals_store, location_feed=None):
+        responders = []
+        times = []
+        values = []
+        for responder_id in vitals_store.responders():
+            window_times, window_values = vitals_store.window(
+                responder_id, None, after=self._vitals_after.get(responder_id)
+            )
+            if len(window_times):
+                self._vitals_after[responder_id] = float(window_times[-1])
+                responders += [responder_id] * len(window_times)
+                times.append(np.array(window_times))
+                values.append(np.array(window_values.T))
+        written = 0
+        if times:
+            written = self.append(responders, np.concatenate(times), np.concatenate(values))
+        if location_feed is not None:
+            self._positions_version, positions = location_feed.changes_since(self._positions_version)
+            self.append_positions(positions)
+        return written
+
+    # Serie de una señal entre `start` y `end` con como máximo `max_points`
+    # puntos: muestras crudas si caben, o el resumen más fino que quepa.
+    # Devuelve (resolución, tiempos, promedio, mínimo, máximo); resolución 0 = crudo.
+    def query(self, responder_id, signal, start, end, max_points=500):
+        if signal not in self.signals:
+            raise ValueError(f"Unknown signal: {signal}")
+        with self.query_seconds.time(), self._lock:
+            raw_count = self._connection.execute(
+                "SELECT COUNT(*) FROM samples WHERE responder = ? AND t >= ? AND t < ?",
+                (responder_id, start, end),
+            ).fetchone()[0]
+            if raw_count <= max_points:
+                rows = self._connection.execute(
+                    f"SELECT t, {signal}, {signal}, {signal} FROM samples "
+                    f"WHERE responder = ? AND t >= ? AND t < ? AND {signal} IS NOT NULL ORDER BY t",
+                    (responder_id, start, end),
+                ).fetchall()
+                resolution = 0
+            else:
+                span = end - start
+                resolution = next((r for r in self.resolutions if span / r <= max_points), None)
+                if resolution is not None:
+                    rows = self._connection.execute(
+                        f"SELECT bucket, {signal}_sum / {signal}_n, {signal}_min, {signal}_max "
+                        f"FROM rollup_{resolution} WHERE responder = ? AND bucket >= ? AND bucket < ? "
+                        f"AND {signal}_n > 0 ORDER BY bucket",
+                        (responder_id, math.floor(start / resolution) * resolution, end),
+                    ).fetchall()
+                else:
+                    # Ni el resumen más grueso cabe: se agrupan sus intervalos en
+                    # intervalos múltiplos de él, contados desde el comienzo del rango
+                    coarsest = self.resolutions[-1]
+                    first = math.floor(start / coarsest) * coarsest
+                    resolution = coarsest * math.ceil((end - first) / (coarsest * max_points))
+                    rows = self._connection.execute(
+                        f"SELECT ? + CAST((bucket - ?) / ? AS INTEGER) * ? AS wide, "
+                        f"SUM({signal}_sum) / SUM({signal}_n), MIN({signal}_min), MAX({signal}_max) "
+                        f"FROM rollup_{coarsest} WHERE responder = ? AND bucket >= ? AND bucket < ? "
+                        f"AND {signal}_n > 0 GROUP BY wide ORDER BY wide",
+                        (first, first, resolution, resolution, responder_id, first, end),
+                    ).fetchall()
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        return resolution, columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3]
+
+    # Rango de tiempo guardado: (inicio, fin) o None si está vacío
+    def time_range(self):
+        with self._lock:
+            row = self._connection.execute("SELECT MIN(t), MAX(t) FROM samples").fetchone()
+        return None if row[0] is None else (row[0], row[1])
+
+    # Muestras y posiciones entre `start` y `end` en orden de tiempo, por bloques
+    # de `chunk_seconds` para no cargar el incidente completo en memoria
+    def iter_events(self, start, end, chunk_seconds=60.0):
+        columns = ", ".join(self.signals)
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(end, chunk_start + chunk_seconds)
+            with self._lock:
+                samples = self._connection.execute(
+                    f"SELECT t, responder, {columns} FROM samples WHERE t >= ? AND t < ? ORDER BY t",
+                    (chunk_start, chunk_end),
+                ).fetchall()
+                positions = self._connection.execute(
+                    "SELECT t, marker, lat, lon FROM positions WHERE t >= ? AND t < ? ORDER BY t",
+                    (chunk_start, chunk_end),
+                ).fetchall()
+            events = [(row[0], "vitals", row[1], row[2:]) for row in samples]
+            events += [(row[0], "position", row[1], row[2:]) for row in positions]
+            events.sort(key=lambda event: event[0])
+            yield from events
+            chunk_start = chunk_end
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+# Reproduce un incidente guardado a través del tablero: vuelve a enviar las
+# muestras al VitalsStore y las posiciones al LocationFeed con el ritmo
+# original multiplicado por `speed`, con las marcas de tiempo trasladadas al
+# presente para que los gráficos en vivo las muestren.
+class IncidentReplay:
+    def __init__(self, history, vitals_store, location_feed=None, start=None, end=None, speed=1.0, batch_interval=0.1):
+        self.history = history
+        self.vitals_store = vitals_store
+        self.location_feed = location_feed
+        time_range = history.time_range() or (0.0, 0.0)
+        self.start_time = time_range[0] if start is None else start
+        self.end_time = time_range[1] + 1e-6 if end is None else end
+        self.speed = speed
+        self.batch_interval = batch_interval
+        self.replayed = 0
+        self.position = self.start_time  # Instante del incidente que se está reproduciendo
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="incident-replay", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.batch_interval + 1)
+
+    @property
+    def finished(self):
+        return self._thread is not None and not self._thread.is_alive()
+
+    def _run(self):
+        started = time.time()
+        # Cada instante del incidente se corresponde con uno del presente
+        offset = started - self.start_time / self.speed
+        vitals = []
+        positions = []
+
+        def flush():
+            if vitals:
+                self.vitals_store.append_batch(vitals)
+            if positions and self.location_feed is not None:
+                self.location_feed.submit(positions)
+            self.replayed += len(vitals) + len(positions)
+            vitals.clear()
+            positions.clear()
+
+        for t, kind, source_id, data in self.history.iter_events(self.start_time, self.end_time):
+            due = offset + t / self.speed
+            wait = due - time.time()
+            if wait > self.batch_interval:
+                flush()
+                if self._stop.wait(wait):
+                    return
+            elif self._stop.is_set():
+                return
+            self.position = t
+            if kind == "vitals":
+                readings = {signal: value for signal, value in zip(self.history.signals, data) if value is not None}
+                vitals.append((source_id, due, readings))
+            else:
+                positions.append({"id": source_id, "lat": data[0], "lon": data[1], "timestamp": due})
+        flush()
+
+
+# Instante en segundos desde epoch a partir de un número o una fecha ISO 8601
+def parse_timestamp(text):
+    text = text.strip()
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+
+# Rango a reproducir "inicio[,fin]"; un extremo vacío o "all" usa el del historial
+def parse_time_range(spec):
+    parts = [part.strip() for part in spec.split(",", 1)] + [""]
+    start, end = parts[0], parts[1]
+    return (
+        parse_timestamp(start) if start and start != "all" else None,
+        parse_timestamp(end) if end else None,
+    )
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import deque
+
+
+# Entrada de posiciones GPS para los marcadores del mapa. Los productores (el
+# endpoint HTTP o cualquier hilo del proceso) envían lotes con `submit`; las
+# posiciones se combinan por responder (gana la más reciente) y un hilo las
+# aplica al almacén de marcadores a ritmo acotado. Cada aplicación crea una
+# versión nueva, y los clientes piden solo lo que cambió desde la suya.
+class LocationFeed:
+    def __init__(self, marker_store, apply_interval=0.5, history=240):
+        self.marker_store = marker_store
+        self.apply_interval = apply_interval
+        self.version = 0
+        self.received = 0
+        self.applied = 0
+        self._pending = {}
+        self._log = deque(maxlen=history)  # (versión, ids modificados)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    # Valida y encola un lote de posiciones {"id", "lat", "lon", "timestamp"?}.
+    # Devuelve (aceptadas, rechazadas).
+    def submit(self, updates):
+        accepted = rejected = 0
+        now = time.time()
+        with self._lock:
+            for update in updates:
+                try:
+                    marker_id = str(update["id"])
+                    lat = float(update["lat"])
+                    lon = float(update["lon"])
+                    timestamp = float(update.get("timestamp", now))
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    rejected += 1
+                    continue
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    rejected += 1
+                    continue
+                current = self._pending.get(marker_id)
+                if current is None or current[2] <= timestamp:
+                    self._pending[marker_id] = (lat, lon, timestamp)
+                accepted += 1
+            self.received += accepted
+        return accepted, rejected
+
+    # Marcadores con una posición recibida que aún no se aplicó
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    # Aplica las posiciones pendientes al almacén; devuelve los ids que cambiaron
+    def apply(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        changed = [
+            marker_id
+            for marker_id, (lat, lon, _) in pending.items()
+            if self.marker_store.move(marker_id, (lat, lon))
+        ]
+        if changed:
+            with self._lock:
+                self.version += 1
+                self._log.append((self.version, changed))
+                self.applied += len(changed)
+        return changed
+
+    # Posiciones que cambiaron después de `version`: (versión actual, {id: (lat, lon)}).
+    # Si la versión es demasiado antigua para el historial devuelve todas las posiciones.
+    def changes_since(self, version):
+        with self._lock:
+            current = self.version
+            if version is not None and version >= current:
+                return current, {}
+            log = list(self._log)
+        if version is None or not log or log[0][0] > version + 1:
+            changed = [marker["id"] for marker in self.marker_store.all()]
+        else:
+            changed = {marker_id for entry_version, ids in log if entry_version > version for marker_id in ids}
+        positions = {}
+        for marker_id in changed:
+            marker = self.marker_store.get(marker_id)
+            if marker is not None:
+                positions[marker_id] = marker["location"]
+        return current, positions
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="location-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.apply_interval + 1)
+
+    def _run(self):
+        while not self._stop.wait(self.apply_interval):
+            self.apply()
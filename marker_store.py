@@ -0,0 +1,159 @@
+import math
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+
+# Almacén de marcadores del mapa con un índice espacial de rejilla.
+# Cada marcador es un dict con al menos "id" y "location" (lat, lon). Las
+# posiciones también se guardan en arreglos NumPy para filtrar y agrupar de
+# forma vectorizada los marcadores de la vista actual.
+class MarkerStore:
+    def __init__(self, markers=(), cell_size=0.01, cluster_below_zoom=15, max_markers=300, cluster_pixels=60):
+        self.cell_size = cell_size
+        self.cluster_below_zoom = cluster_below_zoom
+        self.max_markers = max_markers
+        self.cluster_pixels = cluster_pixels
+        self._records = []
+        self._index = {}
+        self._lat = np.zeros(64)
+        self._lon = np.zeros(64)
+        self._grid = defaultdict(set)
+        self._lock = threading.RLock()
+        for marker in markers:
+            self.add(marker)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, marker_id):
+        return marker_id in self._index
+
+    def get(self, marker_id):
+        with self._lock:
+            row = self._index.get(marker_id)
+            return None if row is None else self._records[row]
+
+    def all(self):
+        with self._lock:
+            return list(self._records)
+
+    # Agrega o reemplaza un marcador
+    def add(self, marker):
+        with self._lock:
+            if marker["id"] in self._index:
+                self.remove(marker["id"])
+            row = len(self._records)
+            if row == len(self._lat):
+                self._lat = np.resize(self._lat, 2 * row)
+                self._lon = np.resize(self._lon, 2 * row)
+            lat, lon = marker["location"]
+            self._records.append(marker)
+            self._index[marker["id"]] = row
+            self._lat[row], self._lon[row] = lat, lon
+            self._grid[self._cell(lat, lon)].add(row)
+
+    def remove(self, marker_id):
+        with self._lock:
+            row = self._index.pop(marker_id)
+            marker = self._records[row]
+            self._discard_from_grid(row, *marker["location"])
+            last = len(self._records) - 1
+            if row != last:
+                # Mueve el último registro al hueco para mantener los arreglos compactos
+                moved = self._records[last]
+                self._discard_from_grid(last, *moved["location"])
+                self._records[row] = moved
+                self._index[moved["id"]] = row
+                self._lat[row], self._lon[row] = self._lat[last], self._lon[last]
+                self._grid[self._cell(*moved["location"])].add(row)
+            self._records.pop()
+            return marker
+
+    def _discard_from_grid(self, row, lat, lon):
+        cell = self._cell(lat, lon)
+        rows = self._grid.get(cell)
+        if rows is not None:
+            rows.discard(row)
+            if not rows:
+                del self._grid[cell]
+
+    # Mueve un marcador; devuelve False si no existe
+    def move(self, marker_id, location):
+        with self._lock:
+            row = self._index.get(marker_id)
+            if row is None:
+                return False
+            marker = self._records[row]
+            old_cell = self._cell(*marker["location"])
+            new_cell = self._cell(*location)
+            if old_cell != new_cell:
+                self._discard_from_grid(row, *marker["location"])
+                self._grid[new_cell].add(row)
+            marker["location"] = tuple(location)
+            self._lat[row], self._lon[row] = location
+            return True
+
+    # Filas de los marcadores dentro de los límites [[sur, oeste], [norte, este]].
+    # Recorre solo las celdas de la rejilla que tocan la vista; si la vista
+    # abarca más celdas que marcadores hay, filtra todos los arreglos de una vez.
+    def _rows_in_bounds(self, bounds):
+        (south, west), (north, east) = bounds
+        count = len(self._records)
+        lat, lon = self._lat[:count], self._lon[:count]
+        south_cell, west_cell = self._cell(south, west)
+        north_cell, east_cell = self._cell(north, east)
+        cells = (north_cell - south_cell + 1) * (east_cell - west_cell + 1)
+        if cells >= count:
+            rows = np.arange(count)
+        else:
+            rows = [
+                row
+                for cell_lat in range(south_cell, north_cell + 1)
+                for cell_lon in range(west_cell, east_cell + 1)
+                for row in self._grid.get((cell_lat, cell_lon), ())
+            ]
+            rows = np.fromiter(rows, dtype=np.int64, count=len(rows))
+        inside = (lat[rows] >= south) & (lat[rows] <= north) & (lon[rows] >= west) & (lon[rows] <= east)
+        return rows[inside]
+
+    # Marcadores visibles para unos límites y un zoom del mapa. Con poco zoom o
+    # demasiados marcadores en la vista los agrupa en una rejilla de unos
+    # `cluster_pixels` píxeles; devuelve (marcadores individuales, grupos).
+    # Cada grupo es {"id", "location", "count", "types"}.
+    def query(self, bounds, zoom):
+        with self._lock:
+            rows = self._rows_in_bounds(bounds)
+            if not len(rows):
+                return [], []
+            if zoom >= self.cluster_below_zoom and len(rows) <= self.max_markers:
+                return [self._records[row] for row in rows], []
+
+            # Tamaño de la celda de agrupación en grados para este zoom (teselas de 256 px)
+            size = 360.0 / (2 ** zoom) * self.cluster_pixels / 256.0
+            lat, lon = self._lat[rows], self._lon[rows]
+            keys = np.stack([np.floor(lat / size), np.floor(lon / size)], axis=1).astype(np.int64)
+            cells, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+            inverse = inverse.reshape(-1)
+            center_lat = np.bincount(inverse, weights=lat) / counts
+            center_lon = np.bincount(inverse, weights=lon) / counts
+
+            singles = counts[inverse] == 1
+            markers = [self._records[row] for row in rows[singles]]
+            cluster_types = defaultdict(lambda: defaultdict(int))
+            for row, i in zip(rows[~singles].tolist(), inverse[~singles].tolist()):
+                cluster_types[i][self._records[row].get("type")] += 1
+            clusters = [
+                {
+                    "id": f"cluster_{zoom}_{cells[i][0]}_{cells[i][1]}",
+                    "location": (float(center_lat[i]), float(center_lon[i])),
+                    "count": int(counts[i]),
+                    "types": dict(types),
+                }
+                for i, types in cluster_types.items()
+            ]
+            return markers, clusters
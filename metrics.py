@@ -0,0 +1,250 @@
+import functools
+import sys
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Cuantiles que se informan de cada resumen
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+# Duraciones (u otros valores) observadas: total acumulado y una ventana de las
+# últimas `window` para calcular p50/p95/p99 al exportarlas. Registrar un valor
+# cuesta un append, así que se puede usar en los caminos calientes.
+class Summary:
+    def __init__(self, window=1024):
+        self.count = 0
+        self.sum = 0.0
+        self.values = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            self.values.append(value)
+
+    # Mide la duración de un bloque: `with summary.time(): ...`
+    def time(self):
+        return _Timer(self)
+
+    def quantiles(self, quantiles=QUANTILES):
+        with self._lock:
+            values = list(self.values)
+        if not values:
+            return [float("nan")] * len(quantiles)
+        return np.quantile(values, quantiles).tolist()
+
+
+class _Timer:
+    def __init__(self, summary):
+        self.summary = summary
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.summary.observe(time.perf_counter() - self.started)
+
+
+# Registro de métricas exportadas en el formato de texto de Prometheus. Los
+# contadores y medidores se leen al exportar, con una función que consulta los
+# atributos que ya llevan los objetos (p. ej. hazard_worker.processed), así que
+# registrar una métrica no agrega trabajo a quien la produce. Los resúmenes
+# toman un Summary, una secuencia de valores recientes o una función que la devuelve.
+class MetricsRegistry:
+    def __init__(self):
+        self._families = {}  # nombre -> (tipo, ayuda, [(etiquetas, fuente)])
+        self._lock = threading.Lock()
+
+    def _register(self, kind, name, help_text, source, labels):
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help_text, []))
+            if family[0] != kind:
+                raise ValueError(f"Metric {name} is already registered as a {family[0]}")
+            family[2].append((labels, source))
+        return source
+
+    def counter(self, name, help_text, function, **labels):
+        return self._register("counter", name, help_text, function, labels)
+
+    def gauge(self, name, help_text, function, **labels):
+        return self._register("gauge", name, help_text, function, labels)
+
+    def summary(self, name, help_text, source=None, **labels):
+        return self._register("summary", name, help_text, Summary() if source is None else source, labels)
+
+    def render(self):
+        with self._lock:
+            families = [(name, kind, help_text, list(series)) for name, (kind, help_text, series) in self._families.items()]
+        lines = []
+        for name, kind, help_text, series in sorted(families):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, source in series:
+                try:
+                    if kind == "summary":
+                        lines.extend(_summary_lines(name, labels, source))
+                    else:
+                        lines.append(f"{name}{_labels(labels)} {_number(source())}")
+                except Exception as e:
+                    lines.append(f"# error reading {name}{_labels(labels)}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    value = float(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def _summary_lines(name, labels, source):
+    if isinstance(source, Summary):
+        quantiles, count, total = source.quantiles(), source.count, source.sum
+    else:
+        values = list(source() if callable(source) else source)
+        quantiles = np.quantile(values, QUANTILES).tolist() if values else [float("nan")] * len(QUANTILES)
+        count, total = len(values), float(sum(values))
+    lines = [
+        f"{name}{_labels(labels, quantile=quantile)} {_number(value)}"
+        for quantile, value in zip(QUANTILES, quantiles)
+    ]
+    lines.append(f"{name}_sum{_labels(labels)} {_number(total)}")
+    lines.append(f"{name}_count{_labels(labels)} {count}")
+    return lines
+
+
+# Envuelve una función para registrar su duración en un Summary. Las
+# excepciones de `expected` (p. ej. PreventUpdate) no cuentan como errores
+def timed(function, summary, errors=None, expected=()):
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except expected:
+            raise
+        except Exception:
+            if errors is not None:
+                errors[0] += 1
+            raise
+        finally:
+            summary.observe(time.perf_counter() - started)
+    return wrapper
+
+
+# Mide todos los callbacks de servidor de una app de Dash, con el nombre de la
+# función como etiqueta. Se llama después de registrar los callbacks.
+def instrument_callbacks(dash_app, registry):
+    from dash.exceptions import PreventUpdate
+
+    for entry in dash_app.callback_map.values():
+        callback = entry.get("callback")
+        if callback is None or getattr(callback, "instrumented", False):
+            continue
+        name = getattr(callback, "__name__", "callback")
+        summary = registry.summary(
+            "dash_callback_seconds", "Time spent in Dash server callbacks", callback=name
+        )
+        errors = [0]
+        registry.counter(
+            "dash_callback_errors_total", "Dash callbacks that raised", lambda errors=errors: errors[0], callback=name
+        )
+        entry["callback"] = timed(callback, summary, errors, expected=(PreventUpdate,))
+        entry["callback"].instrumented = True
+
+
+# Perfilador por muestreo: cada `interval` segundos toma la pila de todos los
+# hilos y cuenta cuántas veces aparece cada una. El resultado está en formato
+# "collapsed" (una pila por línea, funciones separadas por ';' y la cantidad de
+# muestras), que leen flamegraph.pl y speedscope. Mientras no corre no cuesta nada.
+class SamplingProfiler:
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    # Detiene el muestreo y devuelve las pilas en formato collapsed
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        return self.collapsed()
+
+    def collapsed(self):
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update((thread.ident, thread.name) for thread in threading.enumerate())
+            frames = sys._current_frames()
+            with self._lock:
+                self.samples += 1
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    functions = []
+                    while frame is not None:
+                        code = frame.f_code
+                        functions.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    functions.append(names.get(ident, str(ident)))
+                    self._stacks[";".join(reversed(functions))] += 1
+
+
+# Sirve /metrics en un puerto propio, para procesos sin servidor web (app2.py)
+def serve(registry, port, host="0.0.0.0"):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
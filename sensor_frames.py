@@ -0,0 +1,135 @@
+import time
+
+import numpy as np
+
+# Formato binario compacto de sensor_simulation.ino (versión 1), little-endian:
+#
+#   byte  0      magic 0xEE
+#   byte  1      versión del formato
+#   bytes 2-3    id del dispositivo (uint16)
+#   bytes 4-5    número de secuencia (uint16, da la vuelta)
+#   bytes 6-9    millis() del dispositivo (uint32)
+#   bytes 10-17  presión, pulso, oxígeno y temperatura en centésimas (int16)
+#   byte  18     CRC-8 (polinomio 0x07) de los bytes 0-17
+#
+# 19 bytes por lectura frente a unos 80 del protocolo de texto.
+FRAME_MAGIC = 0xEE
+FRAME_VERSION = 1
+FRAME_SIGNALS = ("blood_pressure", "heart_rate", "oxygen_level", "temperature")
+FRAME_SCALE = 100.0
+
+FRAME_DTYPE = np.dtype([
+    ("magic", "u1"),
+    ("version", "u1"),
+    ("device_id", "<u2"),
+    ("sequence", "<u2"),
+    ("timestamp_ms", "<u4"),
+    ("values", "<i2", (len(FRAME_SIGNALS),)),
+    ("checksum", "u1"),
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+
+
+def _crc8_table(polynomial=0x07):
+    table = np.zeros(256, dtype=np.uint8)
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ polynomial) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table[byte] = crc
+    return table
+
+CRC8_TABLE = _crc8_table()
+
+
+# CRC-8 de cada fila de una matriz (n, bytes), vectorizado sobre las filas
+def crc8(rows):
+    crc = np.zeros(len(rows), dtype=np.uint8)
+    for column in range(rows.shape[1]):
+        crc = CRC8_TABLE[crc ^ rows[:, column]]
+    return crc
+
+
+# Empaqueta lecturas en tramas binarias; `values` tiene forma (n, 4) en unidades reales
+def encode_frames(device_id, sequences, timestamps_ms, values):
+    values = np.asarray(values, dtype=np.float64).reshape(-1, len(FRAME_SIGNALS))
+    frames = np.zeros(len(values), dtype=FRAME_DTYPE)
+    frames["magic"] = FRAME_MAGIC
+    frames["version"] = FRAME_VERSION
+    frames["device_id"] = device_id
+    frames["sequence"] = np.asarray(sequences) & 0xFFFF
+    frames["timestamp_ms"] = np.asarray(timestamps_ms) & 0xFFFFFFFF
+    frames["values"] = np.clip(np.round(values * FRAME_SCALE), -32768, 32767)
+    raw = frames.view(np.uint8).reshape(len(frames), FRAME_SIZE)
+    frames["checksum"] = crc8(raw[:, :-1])
+    return frames.tobytes()
+
+
+# Decodifica todas las tramas válidas de un buffer de una sola vez.
+# Busca las cabeceras, reúne los candidatos en una matriz (n, 19), verifica
+# el CRC de todos a la vez y los reinterpreta con el dtype estructurado.
+# Devuelve (tramas, bytes consumidos); el resto del buffer puede contener una
+# trama incompleta y debe anteponerse a los datos siguientes.
+def decode_frames(buffer):
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if len(data) < FRAME_SIZE:
+        return np.zeros(0, dtype=FRAME_DTYPE), 0
+
+    starts = np.flatnonzero((data[:-1] == FRAME_MAGIC) & (data[1:] == FRAME_VERSION))
+    starts = starts[starts <= len(data) - FRAME_SIZE]
+    rows = data[starts[:, None] + np.arange(FRAME_SIZE)]
+    valid = crc8(rows[:, :-1]) == rows[:, -1]
+    starts, rows = starts[valid], rows[valid]
+
+    # Descarta candidatos que se solapan con una trama válida anterior (bytes de
+    # datos que por casualidad parecen una cabecera con CRC correcto)
+    if len(starts) > 1 and (np.diff(starts) < FRAME_SIZE).any():
+        keep = np.zeros(len(starts), dtype=bool)
+        frame_end = 0
+        for i, start in enumerate(starts):
+            if start >= frame_end:
+                keep[i] = True
+                frame_end = start + FRAME_SIZE
+        starts, rows = starts[keep], rows[keep]
+
+    frames = np.ascontiguousarray(rows).view(FRAME_DTYPE).reshape(-1)
+    frames_end = int(starts[-1]) + FRAME_SIZE if len(starts) else 0
+    consumed = max(frames_end, len(data) - FRAME_SIZE + 1)
+    return frames, consumed
+
+
+# Valores reales (n, 4) a partir de las tramas decodificadas
+def frame_values(frames):
+    return frames["values"].astype(np.float32) / FRAME_SCALE
+
+
+# Parser incremental del formato binario con la misma interfaz que
+# serial_ingestion.TextRecordParser. Convierte el reloj del dispositivo a
+# tiempo del servidor, así las lecturas a 10-50 Hz conservan su separación.
+class BinaryFrameParser:
+    def __init__(self):
+        self._pending = b""
+        self._clock_offset = None
+        self._last_device_ms = None
+        self.frames = 0
+
+    def feed(self, data, received_at=None):
+        received_at = time.time() if received_at is None else received_at
+        buffer = self._pending + data
+        frames, consumed = decode_frames(buffer)
+        self._pending = buffer[consumed:]
+        if not len(frames):
+            return []
+        self.frames += len(frames)
+
+        device_seconds = frames["timestamp_ms"].astype(np.float64) / 1000.0
+        # Sincroniza con la primera trama y tras un reinicio del dispositivo
+        if self._clock_offset is None or device_seconds[0] * 1000 < self._last_device_ms:
+            self._clock_offset = received_at - device_seconds[-1]
+        self._last_device_ms = float(frames["timestamp_ms"][-1])
+        timestamps = (device_seconds + self._clock_offset).tolist()
+        values = frame_values(frames).tolist()
+        return [
+            (timestamp, dict(zip(FRAME_SIGNALS, row)))
+            for timestamp, row in zip(timestamps, values)
+        ]
@@ -8,6 +8,57 @@ const int temperaturePin = A3;   // Simulated for body temperature
 const unsigned long sendInterval = 1000;
 unsigned long previousMillis = 0;
 
+// Output format: 0 = labelled text lines, 1 = compact binary frames (19 bytes per reading).
+// With binary frames the interval can go down to 20-100 ms (10-50 Hz) at 9600 baud.
+#define USE_BINARY_FRAMES 0
+
+// Binary frame format (version 1, little-endian), decoded by sensor_frames.py:
+//   magic 0xEE | version | device id (u16) | sequence (u16) | millis (u32)
+//   | blood pressure, heart rate, oxygen, temperature in hundredths (4 x i16) | CRC-8 (poly 0x07)
+const byte frameMagic = 0xEE;
+const byte frameVersion = 1;
+const unsigned int deviceId = 1;  // Unique per wearable
+unsigned int frameSequence = 0;
+
+// CRC-8 with polynomial 0x07, matching sensor_frames.crc8
+byte crc8(const byte *data, byte length) {
+  byte crc = 0;
+  for (byte i = 0; i < length; i++) {
+    crc ^= data[i];
+    for (byte bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void putUInt16(byte *buffer, byte offset, unsigned int value) {
+  buffer[offset] = value & 0xFF;
+  buffer[offset + 1] = (value >> 8) & 0xFF;
+}
+
+void putUInt32(byte *buffer, byte offset, unsigned long value) {
+  for (byte i = 0; i < 4; i++) {
+    buffer[offset + i] = (value >> (8 * i)) & 0xFF;
+  }
+}
+
+// Send one reading as a binary frame; values are in hundredths of their unit
+void sendBinaryFrame(unsigned long timestamp, int bloodPressure, int heartRate, int oxygenLevel, int temperature) {
+  byte frame[19];
+  frame[0] = frameMagic;
+  frame[1] = frameVersion;
+  putUInt16(frame, 2, deviceId);
+  putUInt16(frame, 4, frameSequence++);
+  putUInt32(frame, 6, timestamp);
+  putUInt16(frame, 10, bloodPressure);
+  putUInt16(frame, 12, heartRate);
+  putUInt16(frame, 14, oxygenLevel);
+  putUInt16(frame, 16, temperature);
+  frame[18] = crc8(frame, 18);
+  Serial.write(frame, sizeof(frame));
+}
+
 void setup() {
   // Initialize serial communication
   Serial.begin(9600);
@@ -18,8 +69,10 @@ void setup() {
   pinMode(oxygenLevelPin, INPUT);
   pinMode(temperaturePin, INPUT);
 
+#if !USE_BINARY_FRAMES
   // Startup message
   Serial.println("Initializing sensor simulation...");
+#endif
 }
 
 void loop() {
@@ -36,6 +89,16 @@ void loop() {
     int oxygenLevel = analogRead(oxygenLevelPin);     // Value between 0 and 1023
     int temperature = analogRead(temperaturePin);     // Value between 0 and 1023
 
+#if USE_BINARY_FRAMES
+    // Scale to hundredths of each unit and send a compact frame
+    sendBinaryFrame(
+      currentMillis,
+      map(bloodPressure, 0, 1023, 9000, 14000),  // 90.00-140.00 mmHg
+      map(heartRate, 0, 1023, 6000, 10000),      // 60.00-100.00 BPM
+      map(oxygenLevel, 0, 1023, 9000, 10000),    // 90.00-100.00 %
+      map(temperature, 0, 1023, 3600, 3800)      // 36.00-38.00 °C
+    );
+#else
     // Scale simulated values to realistic ranges
     float bloodPressureScaled = map(bloodPressure, 0, 1023, 90, 140); // Blood pressure (90-140 mmHg)
     float heartRateScaled = map(heartRate, 0, 1023, 60, 100);         // Heart rate (60-100 BPM)
@@ -60,5 +123,6 @@ void loop() {
     Serial.println(" °C");
 
     Serial.println("---"); // Separator for readability
+#endif
   }
 }
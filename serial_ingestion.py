@@ -0,0 +1,238 @@
+import os
+import selectors
+import sys
+import threading
+import time
+
+from sensor_frames import BinaryFrameParser
+
+try:
+    import termios
+    import tty
+except ImportError:  # Windows: solo se admiten archivos como fuente
+    termios = None
+    tty = None
+
+# Etiquetas del protocolo de texto de sensor_simulation.ino y su señal en el almacén
+TEXT_LABELS = {
+    b"BloodPressure": "blood_pressure",
+    b"HeartRate": "heart_rate",
+    b"OxygenLevel": "oxygen_level",
+    b"Temperature": "temperature",
+}
+TEXT_UNITS = {
+    "blood_pressure": "mmHg",
+    "heart_rate": "BPM",
+    "oxygen_level": "%",
+    "temperature": "°C",
+}
+TEXT_SEPARATOR = b"---"
+
+BAUD_RATES = {
+    9600: "B9600",
+    19200: "B19200",
+    38400: "B38400",
+    57600: "B57600",
+    115200: "B115200",
+}
+
+
+# Formatea una lectura {señal: valor} igual que sensor_simulation.ino
+def format_text_record(readings):
+    labels = {signal: label.decode() for label, signal in TEXT_LABELS.items()}
+    lines = [f"{labels[signal]}: {value:.2f} {TEXT_UNITS[signal]}" for signal, value in readings.items()]
+    lines.append(TEXT_SEPARATOR.decode())
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+
+# Parser incremental del protocolo de texto. Recibe bloques de bytes de
+# cualquier tamaño y devuelve las lecturas completas (cerradas por "---") como
+# tuplas (timestamp, {señal: valor}), con la hora de recepción del bloque.
+# Cada línea se separa con bytes.partition, sin expresiones regulares.
+class TextRecordParser:
+    def __init__(self):
+        self._pending = b""
+        self._record = {}
+        self.errors = 0
+
+    def feed(self, data, received_at=None):
+        lines = (self._pending + data).split(b"\n")
+        self._pending = lines.pop()
+        records = []
+        record = self._record
+        for line in lines:
+            label, separator, rest = line.partition(b":")
+            if not separator:
+                if line.strip() == TEXT_SEPARATOR and record:
+                    records.append(record)
+                    record = {}
+                continue
+            signal = TEXT_LABELS.get(label.strip())
+            if signal is None:
+                continue
+            try:
+                record[signal] = float(rest.split(None, 1)[0])
+            except (IndexError, ValueError):
+                self.errors += 1
+        self._record = record
+        if not records:
+            return records
+        received_at = time.time() if received_at is None else received_at
+        return [(received_at, record) for record in records]
+
+
+# Parser de cada protocolo admitido por sensor_simulation.ino
+PARSERS = {
+    "text": TextRecordParser,
+    "binary": BinaryFrameParser,
+}
+
+
+# Fuente de datos: un puerto serie, un pty o un archivo de reemplazo para pruebas
+class SerialSource:
+    def __init__(self, responder_id, path, baud_rate=9600, parser=None):
+        self.responder_id = responder_id
+        self.path = path
+        self.baud_rate = baud_rate
+        self.parser = parser or TextRecordParser()
+        self.fd = None
+
+    def open(self):
+        self.fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK | getattr(os, "O_NOCTTY", 0))
+        if termios is not None and os.isatty(self.fd):
+            # Modo crudo (sin eco ni procesamiento de líneas) y velocidad del puerto
+            tty.setraw(self.fd, termios.TCSANOW)
+            attributes = termios.tcgetattr(self.fd)
+            speed = getattr(termios, BAUD_RATES.get(self.baud_rate, "B9600"))
+            attributes[4] = attributes[5] = speed
+            termios.tcsetattr(self.fd, termios.TCSANOW, attributes)
+        return self.fd
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+# Lee muchas fuentes desde un solo hilo (multiplexado con selectors), parsea
+# las lecturas de forma incremental y las entrega al almacén de signos vitales
+# en lotes, con un solo bloqueo por lote
+class SerialIngestor:
+    def __init__(self, store, sources, flush_interval=0.25, max_batch=2000, read_size=4096):
+        self.store = store
+        self.sources = list(sources)
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.read_size = read_size
+        self.records = 0
+        self.batches = 0
+        self._pending = []
+        self._thread = None
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._finished.clear()
+        self._thread = threading.Thread(target=self.run, name="serial-ingestor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2 * self.flush_interval + 1)
+
+    # Espera a que todas las fuentes lleguen al final (útil con archivos y pruebas)
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+    def _read(self, source, selector):
+        try:
+            data = os.read(source.fd, self.read_size)
+        except BlockingIOError:
+            return
+        except OSError:
+            # EIO: el otro extremo del pty o el dispositivo USB se desconectó
+            data = b""
+        if not data:
+            selector.unregister(source.fd)
+            source.close()
+            return
+        records = source.parser.feed(data)
+        if records:
+            responder_id = source.responder_id
+            self._pending.extend((responder_id, timestamp, record) for timestamp, record in records)
+
+    def flush(self):
+        if self._pending:
+            batch, self._pending = self._pending, []
+            self.store.append_batch(batch)
+            self.records += len(batch)
+            self.batches += 1
+
+    def run(self):
+        # poll() también acepta archivos regulares; epoll no
+        selector = selectors.PollSelector() if hasattr(selectors, "PollSelector") else selectors.DefaultSelector()
+        try:
+            for source in self.sources:
+                try:
+                    selector.register(source.open(), selectors.EVENT_READ, source)
+                except OSError as e:
+                    print(f"Error opening serial source {source.path}: {e}")
+                    source.close()
+            next_flush = time.monotonic() + self.flush_interval
+            while not self._stop.is_set() and selector.get_map():
+                for key, _ in selector.select(timeout=self.flush_interval):
+                    self._read(key.data, selector)
+                    if len(self._pending) >= self.max_batch:
+                        self.flush()
+                if time.monotonic() >= next_flush:
+                    self.flush()
+                    next_flush = time.monotonic() + self.flush_interval
+        finally:
+            self.flush()
+            for source in self.sources:
+                source.close()
+            selector.close()
+            self._finished.set()
+
+
+# Interpreta "responder_1=/dev/ttyACM0,responder_2=/dev/ttyACM1" (o solo rutas);
+# `protocol` es "text" o "binary" según cómo se compiló el sketch
+def parse_source_spec(spec, baud_rate=9600, protocol="text"):
+    sources = []
+    for i, item in enumerate(part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        responder_id, separator, path = item.partition("=")
+        if not separator:
+            responder_id, path = f"responder_{i}", item
+        sources.append(SerialSource(responder_id, path, baud_rate, PARSERS[protocol]()))
+    return sources
+
+
+if __name__ == "__main__":
+    # Lee los puertos indicados y muestra las estadísticas de cada responder
+    from vitals_store import VitalsStore
+
+    arguments = sys.argv[1:]
+    protocol = "text"
+    if arguments and arguments[0] in ("--binary", "--text"):
+        protocol = arguments.pop(0)[2:]
+    if not arguments:
+        print("Usage: python serial_ingestion.py [--binary] responder_1=/dev/ttyACM0[,responder_2=/dev/ttyACM1 ...]")
+        sys.exit(1)
+
+    store = VitalsStore()
+    ingestor = SerialIngestor(store, parse_source_spec(",".join(arguments), protocol=protocol))
+    ingestor.start()
+    try:
+        while not ingestor.wait(5):
+            for responder_id in store.responders():
+                print(responder_id, store.stats(responder_id, "heart_rate", seconds=60))
+    except KeyboardInterrupt:
+        print("Serial ingestion stopped by user.")
+    finally:
+        ingestor.stop()
@@ -0,0 +1,394 @@
+import os
+import threading
+import time
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from vitals_store import SIGNALS, ResponderBuffer, VitalsStore
+
+# Bytes reservados para el id de cada responder en la memoria compartida
+NAME_SIZE = 64
+
+
+# Buffer circular de un responder dentro de la memoria compartida. Reutiliza la
+# lógica de ResponderBuffer; el contador de muestras y la posición de escritura
+# también viven en la memoria compartida para que los vean los demás procesos.
+class SharedResponderBuffer(ResponderBuffer):
+    def __init__(self, store, row):
+        self.capacity = store.capacity
+        self.signals = store.signals
+        self.signal_index = {signal: i for i, signal in enumerate(store.signals)}
+        self.times = store._times[row]
+        self.values = store._values[row]
+        self._counters = store._counters[row]
+
+    @property
+    def count(self):
+        return int(self._counters[0])
+
+    @count.setter
+    def count(self, value):
+        self._counters[0] = value
+
+    @property
+    def _next(self):
+        return int(self._counters[1])
+
+    @_next.setter
+    def _next(self, value):
+        self._counters[1] = value
+
+
+# VitalsStore en un segmento de multiprocessing.shared_memory, visible para
+# todos los procesos del servidor. Un solo proceso escribe (el principal, que
+# corre la ingesta) y los demás leen sin bloqueos ni copias: las muestras se
+# escriben antes de avanzar la posición, así un lector nunca ve una a medias.
+# El segmento tiene lugar para `max_responders` responders y sobrevive al
+# reinicio del proceso principal; se borra con `unlink`. Las muestras de los
+# responders que no caben se descartan y se avisa una vez por responder.
+class SharedVitalsStore(VitalsStore):
+    def __init__(self, name, retention_seconds=2 * 3600, sample_rate=1.0, signals=SIGNALS, max_responders=256):
+        self.name = name
+        self.signals = signals
+        self.capacity = max(1, int(retention_seconds * sample_rate))
+        self.max_responders = max_responders
+        self.dropped = 0
+        self._rejected = set()
+        self._lock = threading.Lock()
+        self._local = {}
+
+        shapes = self._shapes(max_responders, self.capacity, len(signals))
+        size = sum(np.dtype(dtype).itemsize * int(np.prod(shape)) for _, dtype, shape in shapes)
+        try:
+            self._memory = SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            self._memory = SharedMemory(name)
+        except OSError as e:
+            raise ValueError(f"Cannot create the {size / 2**20:.0f} MiB shared vitals store {name!r}: {e}") from e
+        # El segmento lo administra la aplicación: que el resource tracker no lo
+        # borre cuando termina un proceso que solo lo abrió
+        resource_tracker.unregister(self._memory._name, "shared_memory")
+        if self._memory.size < size:
+            raise ValueError(f"Shared memory segment {name!r} is smaller than the configured vitals store")
+
+        offset = 0
+        for attribute, dtype, shape in shapes:
+            array = np.ndarray(shape, dtype=dtype, buffer=self._memory.buf, offset=offset)
+            setattr(self, attribute, array)
+            offset += array.nbytes
+        layout = (max_responders, self.capacity, len(signals))
+        if self._header[1] == 0:
+            self._header[1:] = layout
+        elif tuple(self._header[1:]) != layout:
+            raise ValueError(f"Shared memory segment {name!r} has a different vitals layout")
+
+    @staticmethod
+    def _shapes(max_responders, capacity, signals):
+        return [
+            ("_header", np.int64, (4,)),
+            ("_names", np.uint8, (max_responders, NAME_SIZE)),
+            ("_counters", np.int64, (max_responders, 2)),
+            ("_times", np.float64, (max_responders, 2 * capacity)),
+            ("_values", np.float32, (max_responders, signals, 2 * capacity)),
+        ]
+
+    # Bytes del segmento para una configuración, para validarla antes de crearlo
+    @classmethod
+    def segment_size(cls, retention_seconds, sample_rate, signals=SIGNALS, max_responders=256):
+        capacity = max(1, int(retention_seconds * sample_rate))
+        shapes = cls._shapes(max_responders, capacity, len(signals))
+        return sum(np.dtype(dtype).itemsize * int(np.prod(shape)) for _, dtype, shape in shapes)
+
+    # Responders registrados por cualquier proceso, incluidos los nuevos
+    @property
+    def _buffers(self):
+        for row in range(len(self._local), int(self._header[0])):
+            responder_id = bytes(self._names[row]).rstrip(b"\0").decode("utf-8")
+            self._local[responder_id] = SharedResponderBuffer(self, row)
+        return self._local
+
+    # Buffer de un responder; lo registra si es nuevo. None si no queda lugar.
+    def _buffer(self, responder_id):
+        buffer = self._buffers.get(responder_id)
+        if buffer is not None:
+            return buffer
+        row = int(self._header[0])
+        name = responder_id.encode("utf-8")
+        if row >= self.max_responders or len(name) > NAME_SIZE:
+            if responder_id not in self._rejected:
+                self._rejected.add(responder_id)
+                reason = "its id is too long" if len(name) > NAME_SIZE else f"all {self.max_responders} slots are taken"
+                print(f"Dropping vitals of {responder_id!r}: {reason} in the shared vitals store")
+            return None
+        self._names[row] = 0
+        self._names[row, :len(name)] = np.frombuffer(name, dtype=np.uint8)
+        self._counters[row] = 0
+        # Se publica al final, cuando el registro está completo
+        self._header[0] = row + 1
+        return self._buffers[responder_id]
+
+    def append(self, responder_id, readings, timestamp=None):
+        with self._lock:
+            buffer = self._buffer(responder_id)
+            if buffer is None:
+                self.dropped += 1
+                return
+            buffer.append(time.time() if timestamp is None else timestamp, readings)
+
+    def append_batch(self, records):
+        with self._lock:
+            for responder_id, timestamp, readings in records:
+                buffer = self._buffer(responder_id)
+                if buffer is None:
+                    self.dropped += 1
+                    continue
+                buffer.append(timestamp, readings)
+
+    def close(self):
+        self._local = {}
+        self._header = self._names = self._counters = self._times = self._values = None
+        self._memory.close()
+
+    def unlink(self):
+        resource_tracker.register(self._memory._name, "shared_memory")
+        self._memory.unlink()
+
+
+# Interfaz del estado compartido entre procesos del servidor. Las operaciones
+# que modifican estado (chat, posiciones) o que necesitan un recurso único (la
+# cámara) se piden por nombre con `call` y `stream`; el proceso principal las
+# ejecuta y los demás se las delegan.
+class StateBackend:
+    role = "primary"
+
+    def call(self, name, *args):
+        raise NotImplementedError
+
+    # Generador con los resultados de una operación continua (p. ej. el video)
+    def stream(self, name, *args):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# Estado en el mismo proceso: las operaciones se ejecutan directamente
+class LocalState(StateBackend):
+    def __init__(self, handlers, streams):
+        self.handlers = handlers
+        self.streams = streams
+
+    def call(self, name, *args):
+        return self.handlers[name](*args)
+
+    def stream(self, name, *args):
+        return self.streams[name](*args)
+
+
+# Parte del proceso principal que atiende a los demás por un socket local
+# (multiprocessing.connection, con clave compartida). Cada conexión pide un
+# modo al abrirse: "call" para operaciones, "relay" para recibir todos los
+# eventos del EventBroker o "stream" para una operación continua.
+class StateServer:
+    def __init__(self, address, authkey, state, broker):
+        self.address = address
+        self.authkey = authkey
+        self.state = state
+        self.broker = broker
+        self.connections = 0
+        self._listener = None
+
+    # Intenta ocupar la dirección; False si otro proceso ya es el principal.
+    # Las conexiones esperan hasta `start`, cuando el principal ya está listo
+    def listen(self):
+        try:
+            self._listener = Listener(self.address, authkey=self.authkey)
+        except OSError:
+            return False
+        return True
+
+    def start(self):
+        threading.Thread(target=self._accept, name="state-server", daemon=True).start()
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                return
+            except Exception as e:
+                print(f"Rejected state connection: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(connection,), name="state-connection", daemon=True).start()
+
+    def _serve(self, connection):
+        self.connections += 1
+        try:
+            mode, *request = connection.recv()
+            if mode == "call":
+                self._serve_calls(connection, request)
+            elif mode == "relay":
+                self._serve_relay(connection)
+            elif mode == "stream":
+                self._serve_stream(connection, *request)
+        except (EOFError, OSError):
+            pass
+        finally:
+            self.connections -= 1
+            connection.close()
+
+    def _serve_calls(self, connection, request):
+        while True:
+            name, args = request
+            try:
+                reply = ("ok", self.state.call(name, *args))
+            except Exception as e:
+                reply = ("error", f"{type(e).__name__}: {e}")
+            connection.send(reply)
+            request = connection.recv()
+
+    def _serve_relay(self, connection):
+        relay = self.broker.relay()
+        try:
+            while True:
+                events = relay.take(timeout=15.0)
+                if events is None:
+                    return
+                # Una lista vacía mantiene viva la conexión
+                connection.send(events)
+        finally:
+            relay.close()
+
+    def _serve_stream(self, connection, name, args):
+        chunks = self.state.stream(name, *args)
+        try:
+            for chunk in chunks:
+                connection.send_bytes(chunk)
+        finally:
+            chunks.close()
+
+
+# Estado de un proceso secundario: delega las operaciones al principal y
+# republica en su EventBroker local los eventos que este publica, llamando
+# antes a `on_event(tema, datos)` para que el proceso actualice sus copias
+# (marcadores, alertas). `on_connect` se llama en cada (re)conexión.
+# Cada operación usa su propia conexión, tomada de un pool de hasta
+# `max_idle` conexiones libres, para que una llamada lenta no frene al resto.
+class SharedState(StateBackend):
+    role = "worker"
+
+    def __init__(self, address, authkey, broker, on_event=None, on_connect=None, retry_interval=1.0, max_idle=8):
+        self.address = address
+        self.authkey = authkey
+        self.broker = broker
+        self.on_event = on_event
+        self.on_connect = on_connect
+        self.retry_interval = retry_interval
+        self.max_idle = max_idle
+        self.connected = False
+        self._idle = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._relay, name="state-relay", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def call(self, name, *args):
+        for attempt in range(2):
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            try:
+                if connection is None:
+                    connection = Client(self.address, authkey=self.authkey)
+                    connection.send(("call", name, args))
+                else:
+                    connection.send((name, args))
+                status, result = connection.recv()
+                break
+            except (EOFError, OSError):
+                # El principal se reinició: las conexiones libres también quedaron
+                # cerradas, así que se descartan y se reintenta una vez con una nueva
+                if connection is not None:
+                    connection.close()
+                with self._lock:
+                    stale, self._idle = self._idle, []
+                for connection in stale:
+                    connection.close()
+                connection = None
+                if attempt:
+                    raise ConnectionError(f"State server at {self.address} is not available")
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                connection = None
+        if connection is not None:
+            connection.close()
+        if status == "error":
+            raise RuntimeError(result)
+        return result
+
+    def stream(self, name, *args):
+        try:
+            connection = Client(self.address, authkey=self.authkey)
+        except OSError:
+            return
+        try:
+            connection.send(("stream", name, args))
+            while True:
+                try:
+                    yield connection.recv_bytes()
+                except (EOFError, OSError):
+                    return
+        finally:
+            connection.close()
+
+    def _relay(self):
+        while not self._stop.is_set():
+            try:
+                connection = Client(self.address, authkey=self.authkey)
+            except OSError:
+                self._stop.wait(self.retry_interval)
+                continue
+            try:
+                connection.send(("relay",))
+                self.connected = True
+                if self.on_connect is not None:
+                    self.on_connect()
+                while not self._stop.is_set():
+                    for topic, data, channel in connection.recv():
+                        if self.on_event is not None:
+                            self.on_event(topic, data)
+                        self.broker.publish(topic, data, channel=channel)
+            except (EOFError, OSError):
+                pass
+            except Exception as e:
+                print(f"Error relaying shared state: {e}")
+            finally:
+                self.connected = False
+                connection.close()
+            self._stop.wait(self.retry_interval)
+
+
+# Dirección "host:puerto" del servidor de estado
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
@@ -0,0 +1,102 @@
+import time
+
+import cv2
+import numpy as np
+
+
+# Marca el ritmo de lectura de una fuente para imitar una cámara en vivo
+class _Pacer:
+    def __init__(self, fps):
+        self.interval = 1.0 / fps if fps else 0.0
+        self._next = None
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next is None or now - self._next > 1.0:
+            self._next = now
+        elif self._next > now:
+            time.sleep(self._next - now)
+        self._next += self.interval
+
+
+# Video grabado que reemplaza a la cámara: misma interfaz que cv2.VideoCapture
+# (isOpened, read, release), entregando los cuadros al ritmo del archivo y
+# volviendo al inicio al terminar si `loop` está activo
+class VideoFileSource:
+    def __init__(self, path, loop=True, realtime=True, fps=None):
+        self.path = path
+        self.loop = loop
+        self.capture = cv2.VideoCapture(path)
+        fps = fps or self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self._pacer = _Pacer(fps if realtime else None)
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self):
+        self._pacer.wait()
+        success, image = self.capture.read()
+        if not success and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, image = self.capture.read()
+        return success, image
+
+    def release(self):
+        self.capture.release()
+
+
+# Escena sintética para pruebas sin cámara ni video: un fondo fijo con ruido de
+# sensor, una persona que camina y un foco de fuego que aparece durante
+# `fire_seconds` de cada `period` segundos
+class SyntheticVideoSource:
+    def __init__(self, width=640, height=480, fps=30.0, frames=None, period=10.0, fire_seconds=4.0, seed=0, realtime=True):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frames = frames
+        self.period = period
+        self.fire_seconds = fire_seconds
+        self._rng = np.random.default_rng(seed)
+        gradient = np.linspace(60, 160, height, dtype=np.float32)[:, None, None]
+        self._background = np.broadcast_to(gradient, (height, width, 3)).astype(np.uint8)
+        self._count = 0
+        self._opened = True
+        self._pacer = _Pacer(fps if realtime else None)
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened or (self.frames is not None and self._count >= self.frames):
+            return False, None
+        self._pacer.wait()
+        t = self._count / self.fps
+        self._count += 1
+        noise = self._rng.integers(-6, 7, (self.height, self.width, 1), dtype=np.int16)
+        image = np.clip(self._background.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+        # Persona: rectángulo oscuro que cruza la escena
+        x = int((t * 40) % self.width)
+        top = self.height // 2
+        image[top:top + self.height // 4, x:x + self.width // 20] = (40, 40, 50)
+
+        # Fuego: mancha rojo-anaranjada que titila
+        if t % self.period < self.fire_seconds:
+            radius = int(self.height / 10 * (1 + 0.2 * np.sin(t * 12)))
+            cv2.circle(image, (self.width * 3 // 4, self.height * 3 // 4), radius, (20, 120, 240), -1)
+        return True, image
+
+    def release(self):
+        self._opened = False
+
+
+# Abre la fuente de video indicada: el índice de una cámara ("0"), la ruta de
+# un video grabado o "synthetic" para la escena de prueba
+def open_video_source(spec="0"):
+    if spec == "synthetic":
+        return SyntheticVideoSource()
+    if spec.isdigit():
+        return cv2.VideoCapture(int(spec))
+    return VideoFileSource(spec)
@@ -0,0 +1,215 @@
+import threading
+import time
+
+import numpy as np
+
+from vitals_store import SIGNALS
+
+# Umbrales con histéresis por señal: (valor que activa, valor que desactiva).
+# La alerta "high" se activa por encima del primero y se desactiva por debajo
+# del segundo; "low" al revés. La banda intermedia evita alertas intermitentes.
+DEFAULT_THRESHOLDS = {
+    "heart_rate": {"high": (190.0, 180.0), "low": (40.0, 45.0)},
+    "oxygen_level": {"low": (90.0, 92.0)},
+    "temperature": {"high": (39.0, 38.5), "low": (35.0, 35.5)},
+    "blood_pressure": {"high": (180.0, 170.0), "low": (85.0, 90.0)},
+}
+
+ALERT_MESSAGES = {
+    "high": "{signal} too high ({value:.1f})",
+    "low": "{signal} too low ({value:.1f})",
+    "spike": "sudden {signal} change ({value:.1f})",
+}
+
+SIGNAL_NAMES = {
+    "heart_rate": "heart rate",
+    "oxygen_level": "oxygen level",
+    "temperature": "temperature",
+    "blood_pressure": "blood pressure",
+}
+
+
+# Detector de anomalías en línea para los signos vitales de todos los
+# responders. El estado es una matriz (responders x señales): media y varianza
+# exponenciales (EWMA) para el z-score de cada muestra nueva y el estado de
+# cada alerta. Cada llamada a `update` procesa una muestra de muchos responders
+# con operaciones vectorizadas y devuelve solo las transiciones (alertas que
+# se activan o desactivan).
+class VitalsAnomalyEngine:
+    def __init__(
+        self,
+        signals=SIGNALS,
+        thresholds=DEFAULT_THRESHOLDS,
+        alpha=0.05,
+        z_raise=5.0,
+        z_clear=2.0,
+        warmup=30,
+        capacity=64,
+    ):
+        self.signals = signals
+        self.alpha = alpha
+        self.z_raise = z_raise
+        self.z_clear = z_clear
+        self.warmup = warmup
+        self.processed = 0
+        self._index = {}
+        self._ids = []
+        self._last_time = {}
+        count = len(signals)
+        self._high_raise = np.full(count, np.inf)
+        self._high_clear = np.full(count, np.inf)
+        self._low_raise = np.full(count, -np.inf)
+        self._low_clear = np.full(count, -np.inf)
+        for column, signal in enumerate(signals):
+            rules = thresholds.get(signal, {})
+            if "high" in rules:
+                self._high_raise[column], self._high_clear[column] = rules["high"]
+            if "low" in rules:
+                self._low_raise[column], self._low_clear[column] = rules["low"]
+        self._mean = np.zeros((capacity, count))
+        self._var = np.zeros((capacity, count))
+        self._count = np.zeros((capacity, count), dtype=np.int64)
+        self._state = {kind: np.zeros((capacity, count), dtype=bool) for kind in ALERT_MESSAGES}
+        self._lock = threading.Lock()
+
+    def _rows(self, responder_ids):
+        rows = []
+        for responder_id in responder_ids:
+            row = self._index.get(responder_id)
+            if row is None:
+                row = self._index[responder_id] = len(self._ids)
+                self._ids.append(responder_id)
+                if row == len(self._mean):
+                    self._grow()
+            rows.append(row)
+        return np.asarray(rows, dtype=np.int64)
+
+    def _grow(self):
+        size = 2 * len(self._mean)
+
+        def grow(array, fill):
+            grown = np.full((size,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self._mean = grow(self._mean, 0.0)
+        self._var = grow(self._var, 0.0)
+        self._count = grow(self._count, 0)
+        self._state = {kind: grow(state, False) for kind, state in self._state.items()}
+
+    # Procesa una muestra por responder: `values` tiene forma (responders, señales)
+    # con NaN en las lecturas que faltan. Devuelve las transiciones de alertas.
+    def update(self, responder_ids, values, timestamps=None):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return []
+        with self._lock:
+            rows = self._rows(responder_ids)
+            valid = ~np.isnan(values)
+            mean = self._mean[rows]
+            var = self._var[rows]
+            count = self._count[rows]
+
+            # z-score de la muestra frente a la historia previa a ella
+            difference = np.where(valid, values - mean, 0.0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                z = np.abs(difference) / np.sqrt(var)
+            z = np.where(valid & (count >= self.warmup) & (var > 0), z, 0.0)
+
+            # Actualización EWMA; la primera muestra inicializa la media
+            first = valid & (count == 0)
+            updated_mean = np.where(first, values, mean + self.alpha * difference)
+            updated_var = np.where(first, 0.0, (1 - self.alpha) * (var + self.alpha * difference ** 2))
+            self._mean[rows] = np.where(valid, updated_mean, mean)
+            self._var[rows] = np.where(valid, updated_var, var)
+            self._count[rows] = count + valid
+
+            # Reglas con histéresis: cada alerta se activa y se desactiva con umbrales distintos
+            conditions = {
+                "high": (values > self._high_raise, values < self._high_clear),
+                "low": (values < self._low_raise, values > self._low_clear),
+                "spike": (z > self.z_raise, valid & (z < self.z_clear)),
+            }
+            events = []
+            now = time.time()
+            for kind, (raise_condition, clear_condition) in conditions.items():
+                state = self._state[kind][rows]
+                raised = valid & ~state & raise_condition
+                cleared = state & clear_condition
+                if not (raised.any() or cleared.any()):
+                    continue
+                self._state[kind][rows] = (state | raised) & ~cleared
+                for active, transitions in ((True, raised), (False, cleared)):
+                    for i, column in zip(*np.nonzero(transitions)):
+                        signal = self.signals[column]
+                        value = float(values[i, column])
+                        message = ALERT_MESSAGES[kind].format(signal=SIGNAL_NAMES.get(signal, signal), value=value)
+                        events.append({
+                            "responder": responder_ids[i],
+                            "signal": signal,
+                            "kind": kind,
+                            "active": active,
+                            "value": value,
+                            "message": message,
+                            "timestamp": float(timestamps[i]) if timestamps is not None else now,
+                        })
+            self.processed += int(valid.any(axis=1).sum())
+        return events
+
+    # Procesa todas las muestras que llegaron al almacén desde la última llamada
+    # (como máximo las últimas `max_backlog` de cada responder). Las muestras se
+    # agrupan por posición (la primera nueva de cada responder, luego la
+    # segunda...) y cada grupo se evalúa de una vez para todos.
+    def process_store(self, store, max_backlog=100):
+        pending = []
+        for responder_id in store.responders():
+            times, values = store.window(
+                responder_id, None, last=max_backlog, after=self._last_time.get(responder_id)
+            )
+            if len(times):
+                self._last_time[responder_id] = float(times[-1])
+                pending.append((responder_id, times, values))
+        events = []
+        depth = max((len(times) for _, times, _ in pending), default=0)
+        for position in range(depth):
+            group = [(responder_id, times, values) for responder_id, times, values in pending if len(times) > position]
+            events.extend(self.update(
+                [responder_id for responder_id, _, _ in group],
+                np.stack([values[:, position] for _, _, values in group]),
+                [times[position] for _, times, _ in group],
+            ))
+        return events
+
+    # Alertas activas de un responder: lista de (señal, tipo)
+    def active_alerts(self, responder_id):
+        row = self._index.get(responder_id)
+        if row is None:
+            return []
+        with self._lock:
+            return [
+                (self.signals[column], kind)
+                for kind, state in self._state.items()
+                for column in np.flatnonzero(state[row])
+            ]
+
+    # Alertas activas de todos los responders: {responder: [(señal, tipo), ...]}
+    def alerts(self):
+        with self._lock:
+            active = np.zeros(self._mean.shape, dtype=bool)
+            states = {kind: state.copy() for kind, state in self._state.items()}
+        for state in states.values():
+            active |= state
+        return {
+            self._ids[row]: [
+                (self.signals[column], kind)
+                for kind, state in states.items()
+                for column in np.flatnonzero(state[row])
+            ]
+            for row in np.flatnonzero(active.any(axis=1))
+        }
+
+    def has_alert(self, responder_id):
+        row = self._index.get(responder_id)
+        if row is None:
+            return False
+        return any(state[row].any() for state in self._state.values())
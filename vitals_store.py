@@ -0,0 +1,156 @@
+import threading
+import time
+
+import numpy as np
+
+# Señales vitales registradas por cada responder
+SIGNALS = ("heart_rate", "oxygen_level", "temperature", "blood_pressure")
+
+
+# Buffer circular preasignado con las muestras de un responder. Cada muestra se
+# escribe dos veces (posición i e i + capacidad), así cualquier ventana de hasta
+# `capacity` muestras es un slice contiguo del arreglo y se entrega sin copiar.
+# Las señales son filas de `values`; las que faltan en una muestra quedan en NaN.
+class ResponderBuffer:
+    def __init__(self, capacity, signals=SIGNALS):
+        self.capacity = capacity
+        self.signals = signals
+        self.signal_index = {signal: i for i, signal in enumerate(signals)}
+        self.times = np.zeros(2 * capacity, dtype=np.float64)
+        self.values = np.full((len(signals), 2 * capacity), np.nan, dtype=np.float32)
+        self.count = 0
+        self._next = 0
+
+    def append(self, timestamp, readings):
+        i = self._next
+        j = i + self.capacity
+        self.times[i] = self.times[j] = timestamp
+        self.values[:, i] = self.values[:, j] = np.nan
+        for signal, value in readings.items():
+            row = self.signal_index.get(signal)
+            if row is not None:
+                self.values[row, i] = self.values[row, j] = value
+        self._next = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    # Agrega varias muestras de una vez; `values` tiene forma (señales, n)
+    def extend(self, timestamps, values):
+        timestamps = np.asarray(timestamps, dtype=np.float64)[-self.capacity:]
+        values = np.asarray(values, dtype=np.float32)[:, -self.capacity:]
+        n = len(timestamps)
+        if n == 0:
+            return
+        positions = (self._next + np.arange(n)) % self.capacity
+        for offset in (0, self.capacity):
+            self.times[positions + offset] = timestamps
+            self.values[:, positions + offset] = values
+        self._next = (self._next + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    # Slice [inicio, fin) de las últimas n muestras dentro del arreglo duplicado
+    def _span(self, last=None):
+        n = self.count if last is None else min(last, self.count)
+        end = self._next + self.capacity
+        return end - n, end
+
+    # Vistas de solo lectura (tiempos, valores) de las últimas muestras, sin copiar.
+    # Se pueden filtrar por cantidad (`last`), por antigüedad (`seconds`) o
+    # quedarse solo con las posteriores a un instante (`after`).
+    # Las vistas siguen siendo válidas hasta que lleguen capacity - n muestras nuevas.
+    def window(self, signal=None, last=None, seconds=None, after=None):
+        start, end = self._span(last)
+        times = self.times[start:end]
+        if seconds is not None and len(times):
+            start += int(np.searchsorted(times, times[-1] - seconds, side="left"))
+            times = self.times[start:end]
+        if after is not None and len(times):
+            start += int(np.searchsorted(times, after, side="right"))
+            times = self.times[start:end]
+        if signal is None:
+            values = self.values[:, start:end]
+        else:
+            values = self.values[self.signal_index[signal], start:end]
+        times = times.view()
+        values = values.view()
+        times.flags.writeable = False
+        values.flags.writeable = False
+        return times, values
+
+
+# Almacén de series de tiempo de signos vitales, indexado por responder y señal.
+# La retención se define en horas y la memoria se asigna una sola vez por
+# responder, cuando llega su primera muestra.
+class VitalsStore:
+    def __init__(self, retention_seconds=2 * 3600, sample_rate=1.0, signals=SIGNALS):
+        self.signals = signals
+        self.capacity = max(1, int(retention_seconds * sample_rate))
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def _buffer(self, responder_id):
+        buffer = self._buffers.get(responder_id)
+        if buffer is None:
+            buffer = self._buffers[responder_id] = ResponderBuffer(self.capacity, self.signals)
+        return buffer
+
+    # Registra una lectura {señal: valor} de un responder
+    def append(self, responder_id, readings, timestamp=None):
+        with self._lock:
+            self._buffer(responder_id).append(time.time() if timestamp is None else timestamp, readings)
+
+    # Registra muchas lecturas (responder_id, timestamp, {señal: valor}) bajo un solo bloqueo
+    def append_batch(self, records):
+        with self._lock:
+            for responder_id, timestamp, readings in records:
+                self._buffer(responder_id).append(timestamp, readings)
+
+    # Copia bajo el bloqueo: la ingesta puede agregar responders mientras tanto
+    def responders(self):
+        with self._lock:
+            return list(self._buffers)
+
+    def __contains__(self, responder_id):
+        return responder_id in self._buffers
+
+    # Tiempos y valores de una señal de un responder (vistas sin copia)
+    def window(self, responder_id, signal, last=None, seconds=None, after=None):
+        buffer = self._buffers.get(responder_id)
+        if buffer is None:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty.astype(np.float32)
+        return buffer.window(signal, last=last, seconds=seconds, after=after)
+
+    # Últimas `last` muestras de una señal de varios responders (todos por
+    # defecto) en una sola consulta: (ids, tiempos, valores), ambos de forma
+    # (responders, last), alineados a la derecha y con NaN donde faltan muestras
+    def latest(self, signal, last, responder_ids=None):
+        with self._lock:
+            if responder_ids is None:
+                responder_ids = list(self._buffers)
+            else:
+                responder_ids = [responder_id for responder_id in responder_ids if responder_id in self._buffers]
+            times = np.full((len(responder_ids), last), np.nan)
+            values = np.full((len(responder_ids), last), np.nan, dtype=np.float32)
+            for row, responder_id in enumerate(responder_ids):
+                window_times, window_values = self._buffers[responder_id].window(signal, last=last)
+                count = len(window_times)
+                if count:
+                    times[row, last - count:] = window_times
+                    values[row, last - count:] = window_values
+        return responder_ids, times, values
+
+    # Mínimo, máximo, promedio y percentiles de una señal en la ventana pedida
+    def stats(self, responder_id, signal, last=None, seconds=None, percentiles=(5, 50, 95)):
+        _, values = self.window(responder_id, signal, last=last, seconds=seconds)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return None
+        result = {
+            "count": int(len(values)),
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "mean": float(values.mean()),
+        }
+        for percentile, value in zip(percentiles, np.percentile(values, percentiles)):
+            result[f"p{percentile}"] = float(value)
+        return result